@@ -0,0 +1,102 @@
+"""
+Compare GSC delay post parsing before and after the single-pass parser.
+
+before: BeautifulSoup tree, `<br>` removal, then a regex over every serialized paragraph.
+after: `parse_delay_products`, one walk over the anchors and text nodes of the lxml tree.
+
+Both parsers must find the same products in the fixture corpus (tests/fixtures/gsc_delay_posts)
+before anything is timed. The timing runs on a generated post listing `--products` products.
+
+Usage:
+    python benchmarks/delay_post_parsing.py [--products 300] [--runs 20]
+"""
+import argparse
+import pathlib
+import re
+import sys
+import timeit
+
+from bs4 import BeautifulSoup
+from scrapy.http import HtmlResponse
+
+ROOT = pathlib.Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT.joinpath("hook_crawlers")))
+
+from product_crawler.libs.delay_post import parse_delay_products  # noqa: E402
+
+FIXTURES = ROOT.joinpath("tests", "fixtures", "gsc_delay_posts")
+
+
+def make_delay_post(products: int) -> bytes:
+    lines = "".join(
+        f'「<a href="https://www.goodsmile.info/ja/product/{10000 + n}/product-{n}.html">'
+        f"ねんどろいど サンプル{n}</a>」JAN：{4580000000000 + n}<br>\n"
+        f"2021年{n % 12 + 1}月 → 2022年{n % 12 + 1}月<br>\n"
+        for n in range(products)
+    )
+    return (
+        '<html><head><meta charset="utf-8"></head><body><div class="content">'
+        "<p>下記商品につきまして、発売月が変更となりました。</p>"
+        f"<p>■発売月変更<br>\n{lines}</p>"
+        "<p>お客様には大変ご迷惑をおかけいたします。</p>"
+        "</div></body></html>"
+    ).encode("utf-8")
+
+
+def make_response(body: bytes) -> HtmlResponse:
+    return HtmlResponse(
+        url="https://www.goodsmile.info/ja/post/1/", body=body, encoding="utf-8"
+    )
+
+
+def before(body: bytes):
+    page = BeautifulSoup(make_response(body).text, "lxml")
+    products_delayed = {}
+    for e in page.findAll("br"):
+        e.extract()
+
+    for c in page.select(".content > p, .content > center"):
+        if "JAN" in c.get_text():
+            results = re.findall(
+                r"「.*href=\"(.*\/product\/(\d+)\/.*)\".*」JAN：(\d+)", str(c)
+            )
+            for url, maker_id, jan in results:
+                products_delayed[maker_id] = {"url": url, "jan": jan}
+    page.decompose()
+    return products_delayed
+
+
+def after(body: bytes):
+    products = parse_delay_products(make_response(body).selector.root)
+    # The previous parser didn't read release dates.
+    return {
+        maker_id: {"url": product["url"], "jan": product["jan"]}
+        for maker_id, product in products.items()
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--products", type=int, default=300)
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+
+    for path in sorted(FIXTURES.glob("*.html")):
+        body = path.read_bytes()
+        assert before(body) == after(body), f"Results differ on {path.name}."
+
+    body = make_delay_post(args.products)
+    assert before(body) == after(body), "Results differ on the generated post."
+    assert len(after(body)) == args.products
+
+    results = {}
+    for name, func in (("before", before), ("after", after)):
+        results[name] = min(
+            timeit.repeat(lambda: func(body), number=args.runs, repeat=5)
+        )
+        print(f"{name:>6}: {results[name] / args.runs * 1000:.3f} ms per post")
+    print(f"speedup: {results['before'] / results['after']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Measure how long a fresh interpreter takes to get a job ready to crawl:
+loading every module of `SPIDER_MODULES`, the spider class and the item pipelines.
+
+Usage:
+    python benchmarks/import_time.py [--spider gsc_new_delay_post] [--runs 10] [--top 15]
+"""
+import argparse
+import os
+import pathlib
+import statistics
+import subprocess
+import sys
+
+PROJECT_DIR = pathlib.Path(__file__).parent.parent.joinpath("hook_crawlers").absolute()
+
+STARTUP_SCRIPT = """
+import time
+
+begin = time.perf_counter()
+from scrapy.spiderloader import SpiderLoader
+from scrapy.utils.misc import load_object
+from scrapy.utils.project import get_project_settings
+
+settings = get_project_settings()
+spidercls = SpiderLoader.from_settings(settings).load({spider!r})
+for pipeline in settings.getdict("ITEM_PIPELINES"):
+    load_object(pipeline)
+spidercls()
+print(time.perf_counter() - begin)
+"""
+
+
+def run_once(spider: str, *python_options: str) -> subprocess.CompletedProcess:
+    return subprocess.run(
+        [sys.executable, *python_options, "-c", STARTUP_SCRIPT.format(spider=spider)],
+        cwd=PROJECT_DIR,
+        env={**os.environ, "SCRAPY_SETTINGS_MODULE": "product_crawler.settings"},
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+
+def print_slowest_imports(spider: str, top: int):
+    result = run_once(spider, "-X", "importtime")
+    imports = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, package = line[len("import time:") :].split("|")
+        if cumulative.strip().isdigit():
+            imports.append((int(cumulative), package.rstrip()))
+
+    print(f"\nSlowest imports (cumulative, top {top}):")
+    for cumulative, package in sorted(imports, reverse=True)[:top]:
+        print(f"{cumulative / 1000:10.1f} ms {package}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--spider", default="gsc_new_delay_post")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    durations = [float(run_once(args.spider).stdout) for _ in range(args.runs)]
+    print(
+        f"Startup of {args.spider!r} over {args.runs} runs: "
+        f"median {statistics.median(durations) * 1000:.1f} ms, "
+        f"min {min(durations) * 1000:.1f} ms, "
+        f"max {max(durations) * 1000:.1f} ms"
+    )
+    print_slowest_imports(args.spider, args.top)
+
+
+if __name__ == "__main__":
+    main()
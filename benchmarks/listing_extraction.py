@@ -0,0 +1,80 @@
+"""
+Compare listing page extraction before and after `ListingExtractor`.
+
+before: a new `LinkExtractor` per response and a BeautifulSoup parse for the metadata.
+after: shared, precompiled `ListingExtractor` reading links and metadata from one lxml tree.
+
+Usage:
+    python benchmarks/listing_extraction.py [--items 60] [--runs 200]
+"""
+import argparse
+import pathlib
+import sys
+import timeit
+
+from bs4 import BeautifulSoup
+from scrapy.http import HtmlResponse
+from scrapy.linkextractors import LinkExtractor
+
+sys.path.insert(0, str(pathlib.Path(__file__).parent.parent.joinpath("hook_crawlers")))
+
+from product_crawler.libs.listing import ListingExtractor  # noqa: E402
+
+NATIVE_LISTING = ListingExtractor("section > a", metadata={"pages": ".pages"})
+
+
+def make_native_listing_page(items: int) -> bytes:
+    sections = "".join(
+        f'<section><a href="/creators/{n}/"><img src="/img/{n}.jpg">'
+        f"<h3>Product {n}</h3><p>2023年{n % 12 + 1}月発売 ¥{n * 100}</p></a></section>"
+        for n in range(items)
+    )
+    return (
+        "<html><head><title>creators</title></head><body>"
+        f'<div id="main">{sections}</div>'
+        '<div class="wp-pagenavi"><span class="pages">1 / 42</span></div>'
+        "</body></html>"
+    ).encode("utf-8")
+
+
+def make_response(body: bytes) -> HtmlResponse:
+    return HtmlResponse(
+        url="https://www.native-web.jp/creators/", body=body, encoding="utf-8"
+    )
+
+
+def before(body: bytes):
+    response = make_response(body)
+    page = BeautifulSoup(response.text, "lxml")
+    pages = page.select_one(".pages").text
+    links = LinkExtractor(restrict_css="section > a").extract_links(response)
+    return pages, links
+
+
+def after(body: bytes):
+    response = make_response(body)
+    pages = NATIVE_LISTING.extract_text(response, "pages")
+    links = NATIVE_LISTING.extract_links(response)
+    return pages, links
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--items", type=int, default=60)
+    parser.add_argument("--runs", type=int, default=200)
+    args = parser.parse_args()
+
+    body = make_native_listing_page(args.items)
+    assert before(body) == after(body), "Extraction results differ."
+
+    results = {}
+    for name, func in (("before", before), ("after", after)):
+        results[name] = min(
+            timeit.repeat(lambda: func(body), number=args.runs, repeat=5)
+        )
+        print(f"{name:>6}: {results[name] / args.runs * 1000:.3f} ms per listing page")
+    print(f"speedup: {results['before'] / results['after']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Compare the per-item work of `S3ImagePipeline` around the images pipeline
+before and after `ProductBaseAdapter`.
+
+before: `item.dict()` for the images pipeline, then `ProductBase.parse_obj` on completion,
+        validating the whole product again.
+after: the images field of the product read and written in place through `ItemAdapter`.
+
+Usage:
+    python benchmarks/product_images_adapter.py [--images 8] [--runs 2000]
+"""
+import argparse
+import pathlib
+import sys
+import timeit
+import tracemalloc
+
+from figure_parser import ProductBase
+from itemadapter import ItemAdapter
+from pydantic_factories import ModelFactory
+
+sys.path.insert(0, str(pathlib.Path(__file__).parent.parent.joinpath("hook_crawlers")))
+
+from product_crawler.items import ProductBaseAdapter  # noqa: E402,F401
+
+IMAGES_FIELD = "images"
+
+
+class ProductFactory(ModelFactory):
+    __model__ = ProductBase
+
+
+def make_results(product: ProductBase) -> list:
+    return [
+        f"https://bucket.s3.amazonaws.com/full/{n}.jpg"
+        for n in range(len(product.images))
+    ]
+
+
+def before(product: ProductBase, results: list) -> ProductBase:
+    item = product.dict()
+    ItemAdapter(item).get(IMAGES_FIELD, [])
+    ItemAdapter(item)[IMAGES_FIELD] = results
+    return ProductBase.parse_obj(item)
+
+
+def after(product: ProductBase, results: list) -> ProductBase:
+    ItemAdapter(product).get(IMAGES_FIELD, [])
+    ItemAdapter(product)[IMAGES_FIELD] = results
+    return product
+
+
+def peak_allocated(func, product: ProductBase, results: list) -> int:
+    tracemalloc.start()
+    func(product, results)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--images", type=int, default=8)
+    parser.add_argument("--runs", type=int, default=2000)
+    args = parser.parse_args()
+
+    product = ProductFactory.build(
+        images=[f"https://example.com/images/{n}.jpg" for n in range(args.images)]
+    )
+    results = make_results(product)
+
+    timings = {}
+    for name, func in (("before", before), ("after", after)):
+        timings[name] = min(
+            timeit.repeat(
+                lambda: func(product.copy(), results), number=args.runs, repeat=5
+            )
+        )
+        peak = peak_allocated(func, product.copy(), results)
+        print(
+            f"{name:>6}: {timings[name] / args.runs * 1e6:.1f} µs, "
+            f"{peak / 1024:.1f} KiB peak allocated per item"
+        )
+    print(f"speedup: {timings['before'] / timings['after']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+import os
+
+from scrapy.commands import ScrapyCommand
+from scrapy.utils.project import data_path
+
+from ..httpcache import ResponseArchive
+
+
+class Command(ScrapyCommand):
+    requires_project = True
+
+    def syntax(self):
+        return "[options] [<spider> ...]"
+
+    def short_desc(self):
+        return "Compact the response archive of HTTPCACHE_DIR"
+
+    def add_options(self, parser):
+        super().add_options(parser)
+        parser.add_argument(
+            "--retention-days",
+            type=int,
+            default=None,
+            help="drop responses older than this (default: HTTPCACHE_ARCHIVE_RETENTION_DAYS)",
+        )
+        parser.add_argument(
+            "--keep-runs",
+            type=int,
+            default=0,
+            help="keep at most this many responses of every request",
+        )
+        parser.add_argument(
+            "--max-bytes",
+            type=int,
+            default=None,
+            help="evict the oldest runs until bodies fit (default: HTTPCACHE_ARCHIVE_MAX_BYTES)",
+        )
+
+    def run(self, args, opts):
+        cachedir = data_path(self.settings["HTTPCACHE_DIR"])
+        retention_days = opts.retention_days
+        if retention_days is None:
+            retention_days = self.settings.getint("HTTPCACHE_ARCHIVE_RETENTION_DAYS")
+        max_bytes = opts.max_bytes
+        if max_bytes is None:
+            max_bytes = self.settings.getint("HTTPCACHE_ARCHIVE_MAX_BYTES")
+
+        spider_names = args
+        if not spider_names and os.path.isdir(cachedir):
+            spider_names = sorted(
+                name
+                for name in os.listdir(cachedir)
+                if os.path.isfile(os.path.join(cachedir, name, "index.sqlite"))
+            )
+        for name in spider_names:
+            archive = ResponseArchive(
+                os.path.join(cachedir, name),
+                self.settings.getint("HTTPCACHE_ARCHIVE_COMPRESS_LEVEL", 6),
+            )
+            try:
+                result = archive.compact(
+                    retention_secs=retention_days * 24 * 60 * 60,
+                    keep_runs=opts.keep_runs,
+                )
+                if max_bytes:
+                    result["evicted_runs"] = archive.evict(max_bytes)
+                result["size_bytes"] = archive.total_size()
+            finally:
+                archive.close()
+
+            summary = ", ".join(f"{key}={value}" for key, value in result.items())
+            print(f"[{name}] {summary}")
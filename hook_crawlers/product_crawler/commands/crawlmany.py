@@ -0,0 +1,112 @@
+import json
+from typing import Dict, Iterable, List
+
+from scrapy.commands import BaseRunSpiderCommand
+from scrapy.crawler import Crawler
+from scrapy.exceptions import UsageError
+
+DEFAULT_SPIDERS = [
+    "gsc_product",
+    "alter_product",
+    "native_product",
+    "amakuni_product",
+    "gsc_new_delay_post",
+]
+
+REPORTED_STATS = [
+    "finish_reason",
+    "elapsed_time_seconds",
+    "downloader/request_count",
+    "downloader/response_count",
+    "item_scraped_count",
+    "item_dropped_count",
+    "log_count/ERROR",
+]
+
+SpiderArgs = Dict[str, Dict[str, str]]
+
+
+def split_spider_args(
+    spider_names: Iterable[str], spargs: Dict[str, str]
+) -> SpiderArgs:
+    """
+    Route `-a` arguments to spiders.
+
+    `-a gsc_product:begin_year=2021` only goes to `gsc_product`,
+    `-a force_update=1` goes to every spider.
+    """
+    spider_names = list(spider_names)
+    routed: SpiderArgs = {name: {} for name in spider_names}
+    for key, value in spargs.items():
+        spider_name, sep, arg_name = key.partition(":")
+        if not sep:
+            for name in spider_names:
+                routed[name][key] = value
+            continue
+
+        if spider_name not in routed:
+            raise UsageError(
+                f'Argument "{key}" targets spider "{spider_name}" which is not going to run.',
+                print_help=False,
+            )
+        routed[spider_name][arg_name] = value
+    return routed
+
+
+class Command(BaseRunSpiderCommand):
+    requires_project = True
+
+    def syntax(self):
+        return "[options] [<spider> ...]"
+
+    def short_desc(self):
+        return "Run several spiders in one process"
+
+    def long_desc(self):
+        return (
+            "Run several spiders in one process so they share the Hook API client, "
+            "the product index and the proxy pool. "
+            f"Runs {', '.join(DEFAULT_SPIDERS)} when no spider is given. "
+            "Use -a SPIDER:NAME=VALUE to pass an argument to one spider only."
+        )
+
+    def add_options(self, parser):
+        super().add_options(parser)
+        parser.add_argument(
+            "--stats-file",
+            metavar="FILE",
+            default=None,
+            help="dump the stats of every spider to FILE as json",
+        )
+
+    def run(self, args, opts):
+        spider_names: List[str] = args or DEFAULT_SPIDERS
+        spider_args = split_spider_args(spider_names, opts.spargs)
+
+        crawlers: List[Crawler] = []
+        for name in spider_names:
+            crawler = self.crawler_process.create_crawler(name)
+            crawlers.append(crawler)
+            self.crawler_process.crawl(crawler, **spider_args[name])
+
+        self.crawler_process.start()
+
+        self.report_stats(crawlers, opts.stats_file)
+        if self.crawler_process.bootstrap_failed or any(
+            crawler.stats.get_value("finish_reason") != "finished"
+            for crawler in crawlers
+        ):
+            self.exitcode = 1
+
+    def report_stats(self, crawlers: List[Crawler], stats_file=None):
+        all_stats = {}
+        for crawler in crawlers:
+            stats = crawler.stats.get_stats()
+            spider_name = crawler.spidercls.name
+            all_stats[spider_name] = stats
+            summary = ", ".join(f"{key}={stats.get(key, 0)}" for key in REPORTED_STATS)
+            print(f"[{spider_name}] {summary}")
+
+        if stats_file:
+            with open(stats_file, "w") as f:
+                json.dump(all_stats, f, default=str, indent=2)
@@ -0,0 +1,70 @@
+from scrapy.commands import ScrapyCommand
+from scrapy.exceptions import UsageError
+
+from ..replay import Replayer, ReplayFilter
+
+
+class Command(ScrapyCommand):
+    requires_project = True
+
+    def syntax(self):
+        return "[options] <spider> [<spider> ...]"
+
+    def short_desc(self):
+        return "Re-parse archived responses without network access"
+
+    def long_desc(self):
+        return (
+            "Feed the responses archived by the http cache through the spiders' "
+            "callbacks and the item pipelines. Media pipelines are skipped."
+        )
+
+    def add_options(self, parser):
+        super().add_options(parser)
+        parser.add_argument(
+            "--archived-in",
+            metavar="YEAR",
+            type=int,
+            default=None,
+            help="only responses archived in YEAR",
+        )
+        parser.add_argument(
+            "--url-pattern",
+            metavar="REGEX",
+            default=None,
+            help="only responses whose url matches REGEX",
+        )
+        parser.add_argument(
+            "--callback",
+            default="parse_product",
+            help="only responses handled by this callback (default: parse_product)",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=None,
+            help="parsing processes (default: cpu count)",
+        )
+        parser.add_argument("--chunk-size", type=int, default=50)
+
+    def run(self, args, opts):
+        if not args:
+            raise UsageError()
+
+        replayer = Replayer(self.settings, opts.workers, opts.chunk_size)
+        replay_filter = ReplayFilter(
+            callback=opts.callback,
+            archived_in=opts.archived_in,
+            url_pattern=opts.url_pattern,
+        )
+        for spider_name in args:
+            result = replayer.replay(spider_name, replay_filter)
+            print(
+                f"[{spider_name}] parsed={result.parsed_count}, "
+                f"items={result.item_count}, failures={len(result.failures)}"
+            )
+            for url, error in result.failures:
+                print(f'[{spider_name}] Failed to replay "{url}". ({error})')
+
+            if result.failures:
+                self.exitcode = 1
@@ -0,0 +1,131 @@
+import logging
+import tracemalloc
+from typing import Optional
+
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+from twisted.internet import task
+
+from .logs import BackgroundLogging, JsonFormatter, SamplingFilter
+
+logger = logging.getLogger(__name__)
+
+# Crawlers of one process (`crawlmany`) share the tracing,
+# it stops when the last one that started it closes.
+_tracing_users = 0
+# Same for the root logger handlers, the first crawler moves them to the background thread
+# and the last one to stop moves them back.
+_background_logging: Optional[BackgroundLogging] = None
+_background_logging_users = 0
+
+
+class TracemallocStats:
+    """
+    Take a tracemalloc snapshot every `TRACEMALLOC_INTERVAL` seconds and keep
+    the `TRACEMALLOC_TOP` biggest allocation sites in the crawl stats.
+    """
+
+    def __init__(self, crawler, interval: float, top: int, frames: int) -> None:
+        self.stats = crawler.stats
+        self.interval = interval
+        self.top = top
+        self.frames = frames
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool("TRACEMALLOC_ENABLED"):
+            raise NotConfigured
+
+        ext = cls(
+            crawler,
+            interval=crawler.settings.getfloat("TRACEMALLOC_INTERVAL", 60),
+            top=crawler.settings.getint("TRACEMALLOC_TOP", 10),
+            frames=crawler.settings.getint("TRACEMALLOC_FRAMES", 1),
+        )
+        crawler.signals.connect(ext.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(ext.spider_closed, signal=signals.spider_closed)
+        return ext
+
+    def spider_opened(self, spider):
+        global _tracing_users
+        # Tracing started outside of the crawlers is left alone.
+        self._shares_tracing = _tracing_users > 0 or not tracemalloc.is_tracing()
+        if self._shares_tracing:
+            if not _tracing_users:
+                tracemalloc.start(self.frames)
+            _tracing_users += 1
+        self.task = task.LoopingCall(self.take_snapshot, spider)
+        self.task.start(self.interval, now=False)
+
+    def spider_closed(self, spider):
+        global _tracing_users
+        if self.task.running:
+            self.task.stop()
+        self.take_snapshot(spider)
+        if self._shares_tracing:
+            _tracing_users -= 1
+            if not _tracing_users:
+                tracemalloc.stop()
+
+    def take_snapshot(self, spider):
+        snapshot = tracemalloc.take_snapshot().filter_traces(
+            (
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+                tracemalloc.Filter(False, "<unknown>"),
+            )
+        )
+        current, peak = tracemalloc.get_traced_memory()
+        self.stats.set_value("tracemalloc/current_bytes", current, spider=spider)
+        self.stats.max_value("tracemalloc/peak_bytes", peak, spider=spider)
+
+        for rank, stat in enumerate(snapshot.statistics("lineno")[: self.top]):
+            frame = stat.traceback[0]
+            allocator = (
+                f"{frame.filename}:{frame.lineno} size={stat.size} count={stat.count}"
+            )
+            self.stats.set_value(f"tracemalloc/top/{rank}", allocator, spider=spider)
+            logger.debug(
+                f"Top allocator #{rank}: {allocator}", extra={"spider": spider}
+            )
+
+
+class StructuredLogging:
+    """
+    With `LOG_JSON_ENABLED`, write the logs as JSON lines from a background thread
+    and keep `LOG_SAMPLE_RATE` of the per-item messages starting with `LOG_SAMPLED_MESSAGES`.
+    Warnings and errors are always written.
+    The crawlers of a process share it, with the settings of the first one.
+    """
+
+    def __init__(self, logging_: BackgroundLogging) -> None:
+        self.logging = logging_
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        global _background_logging, _background_logging_users
+        settings = crawler.settings
+        if not settings.getbool("LOG_JSON_ENABLED"):
+            raise NotConfigured
+
+        if _background_logging is None:
+            sampling = SamplingFilter(
+                settings.getfloat("LOG_SAMPLE_RATE", 1),
+                settings.getlist("LOG_SAMPLED_MESSAGES"),
+            )
+            logging_ = BackgroundLogging(JsonFormatter(), filters=[sampling])
+            if not logging_.install():
+                raise NotConfigured("No log handler to write from a background thread.")
+            _background_logging = logging_
+        _background_logging_users += 1
+
+        ext = cls(_background_logging)
+        crawler.signals.connect(ext.engine_stopped, signal=signals.engine_stopped)
+        return ext
+
+    def engine_stopped(self):
+        global _background_logging, _background_logging_users
+        _background_logging_users -= 1
+        if not _background_logging_users:
+            self.logging.uninstall()
+            _background_logging = None
@@ -0,0 +1,34 @@
+"""
+Request fingerprints keyed by the canonical url of product pages.
+
+Every variant of a product url (slug, query string) gets one fingerprint,
+so the dupefilter and the http cache see one request per product page across spiders.
+Requests with `dont_canonicalize` in their meta are fingerprinted by their own url.
+"""
+from weakref import WeakKeyDictionary
+
+from scrapy.http import Request
+from scrapy.utils.request import RequestFingerprinter
+
+from .libs.product_urls import canonical_product_url
+
+
+class CanonicalUrlRequestFingerprinter:
+    def __init__(self, crawler=None) -> None:
+        self._fingerprinter = RequestFingerprinter(crawler)
+        self._cache: "WeakKeyDictionary[Request, bytes]" = WeakKeyDictionary()
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler)
+
+    def fingerprint(self, request: Request) -> bytes:
+        canonical_url = canonical_product_url(request.url)
+        if canonical_url == request.url or request.meta.get("dont_canonicalize"):
+            return self._fingerprinter.fingerprint(request)
+
+        if request not in self._cache:
+            self._cache[request] = self._fingerprinter.fingerprint(
+                request.replace(url=canonical_url)
+            )
+        return self._cache[request]
@@ -0,0 +1,347 @@
+"""
+Content-addressed archive of crawled responses, usable as `HTTPCACHE_STORAGE`.
+
+Layout of `HTTPCACHE_DIR/<spider name>/`:
+    blobs/ab/<sha256>.gz    compressed response body, written once per content hash
+    index.sqlite            one row per request fingerprint and crawl run, pointing to a blob
+
+Pages which didn't change between runs only cost one index row.
+"""
+import gzip
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import tempfile
+import time
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Optional, Pattern, Tuple
+
+from scrapy.http import Headers
+from scrapy.responsetypes import responsetypes
+from scrapy.utils.project import data_path
+from w3lib.http import headers_dict_to_raw, headers_raw_to_dict
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS blobs (
+    hash TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS responses (
+    fingerprint TEXT NOT NULL,
+    run_id TEXT NOT NULL,
+    url TEXT NOT NULL,
+    method TEXT NOT NULL,
+    status INTEGER NOT NULL,
+    response_url TEXT NOT NULL,
+    headers BLOB NOT NULL,
+    blob TEXT NOT NULL REFERENCES blobs(hash),
+    callback TEXT,
+    cb_kwargs TEXT,
+    timestamp REAL NOT NULL,
+    PRIMARY KEY (fingerprint, run_id)
+);
+CREATE INDEX IF NOT EXISTS responses_by_timestamp ON responses (timestamp);
+CREATE INDEX IF NOT EXISTS responses_by_blob ON responses (blob);
+"""
+
+
+@dataclass
+class ArchivedResponse:
+    fingerprint: str
+    run_id: str
+    url: str
+    method: str
+    status: int
+    response_url: str
+    headers: bytes
+    blob: str
+    callback: Optional[str]
+    cb_kwargs: Optional[str]
+    timestamp: float
+
+
+class ResponseArchive:
+    """Blob store and index of one spider's archived responses."""
+
+    def __init__(self, path: str, compress_level: int = 6) -> None:
+        self.path = path
+        self.blob_dir = os.path.join(path, "blobs")
+        self.compress_level = compress_level
+        os.makedirs(self.blob_dir, exist_ok=True)
+        self.db = sqlite3.connect(os.path.join(path, "index.sqlite"), timeout=30)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(_SCHEMA)
+
+    def close(self):
+        self.db.commit()
+        self.db.close()
+
+    def _blob_path(self, blob_hash: str) -> str:
+        return os.path.join(self.blob_dir, blob_hash[:2], f"{blob_hash}.gz")
+
+    def put_blob(self, body: bytes) -> str:
+        blob_hash = hashlib.sha256(body).hexdigest()
+        blob_path = self._blob_path(blob_hash)
+        if not os.path.exists(blob_path):
+            os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+            with tempfile.NamedTemporaryFile(
+                dir=os.path.dirname(blob_path), delete=False
+            ) as f:
+                f.write(gzip.compress(body, compresslevel=self.compress_level))
+            os.replace(f.name, blob_path)
+
+        self.db.execute(
+            "INSERT OR IGNORE INTO blobs (hash, size, created_at) VALUES (?, ?, ?)",
+            (blob_hash, os.path.getsize(blob_path), time.time()),
+        )
+        return blob_hash
+
+    def read_blob(self, blob_hash: str) -> bytes:
+        with gzip.open(self._blob_path(blob_hash), "rb") as f:
+            return f.read()
+
+    def put(self, entry: ArchivedResponse):
+        self.db.execute(
+            "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                entry.fingerprint,
+                entry.run_id,
+                entry.url,
+                entry.method,
+                entry.status,
+                entry.response_url,
+                entry.headers,
+                entry.blob,
+                entry.callback,
+                entry.cb_kwargs,
+                entry.timestamp,
+            ),
+        )
+        self.db.commit()
+
+    def latest(self, fingerprint: str) -> Optional[ArchivedResponse]:
+        row = self.db.execute(
+            "SELECT * FROM responses WHERE fingerprint = ? ORDER BY timestamp DESC LIMIT 1",
+            (fingerprint,),
+        ).fetchone()
+        return ArchivedResponse(*row) if row else None
+
+    def entries(
+        self,
+        *,
+        callback: Optional[str] = None,
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+        latest_only: bool = True,
+    ) -> Iterator[ArchivedResponse]:
+        """Iterate archived responses, the latest one of every request by default."""
+        conditions: List[str] = []
+        params: List = []
+        if callback is not None:
+            conditions.append("callback = ?")
+            params.append(callback)
+        if since is not None:
+            conditions.append("timestamp >= ?")
+            params.append(since)
+        if until is not None:
+            conditions.append("timestamp < ?")
+            params.append(until)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        query = f"SELECT * FROM responses {where} ORDER BY fingerprint, timestamp DESC"
+        last_fingerprint = None
+        for row in self.db.execute(query, params):
+            entry = ArchivedResponse(*row)
+            if latest_only and entry.fingerprint == last_fingerprint:
+                continue
+            last_fingerprint = entry.fingerprint
+            yield entry
+
+    def total_size(self) -> int:
+        (size,) = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()
+        return size
+
+    def runs(self) -> List[str]:
+        """Run ids from the oldest to the newest."""
+        rows = self.db.execute(
+            "SELECT run_id FROM responses GROUP BY run_id ORDER BY MIN(timestamp)"
+        )
+        return [run_id for (run_id,) in rows]
+
+    def collect_garbage(self) -> int:
+        """Remove blobs no response points to, return the freed bytes."""
+        orphans = self.db.execute(
+            "SELECT hash, size FROM blobs WHERE hash NOT IN (SELECT blob FROM responses)"
+        ).fetchall()
+        freed = 0
+        for blob_hash, size in orphans:
+            try:
+                os.remove(self._blob_path(blob_hash))
+            except FileNotFoundError:
+                pass
+            self.db.execute("DELETE FROM blobs WHERE hash = ?", (blob_hash,))
+            freed += size
+        self.db.commit()
+        return freed
+
+    def evict(self, max_bytes: int, keep_run: Optional[str] = None) -> int:
+        """Drop the oldest runs until the blobs fit in `max_bytes`, return the dropped run count."""
+        dropped = 0
+        for run_id in self.runs():
+            if self.total_size() <= max_bytes:
+                break
+            if run_id == keep_run:
+                continue
+            self.db.execute("DELETE FROM responses WHERE run_id = ?", (run_id,))
+            self.collect_garbage()
+            dropped += 1
+        return dropped
+
+    def compact(self, *, retention_secs: int = 0, keep_runs: int = 0) -> Dict[str, int]:
+        """
+        Drop responses older than `retention_secs` and all but the latest `keep_runs`
+        responses of every request (0 disables either rule). The latest response of
+        a request is always kept. Orphaned blob files are removed and the index is vacuumed.
+        """
+        deleted = 0
+        if retention_secs:
+            deleted += self.db.execute(
+                """
+                DELETE FROM responses WHERE timestamp < ? AND timestamp < (
+                    SELECT MAX(latest.timestamp) FROM responses AS latest
+                    WHERE latest.fingerprint = responses.fingerprint
+                )
+                """,
+                (time.time() - retention_secs,),
+            ).rowcount
+        if keep_runs:
+            deleted += self.db.execute(
+                """
+                DELETE FROM responses WHERE (
+                    SELECT COUNT(*) FROM responses AS newer
+                    WHERE newer.fingerprint = responses.fingerprint
+                    AND newer.timestamp > responses.timestamp
+                ) >= ?
+                """,
+                (keep_runs,),
+            ).rowcount
+        self.db.commit()
+
+        freed = self.collect_garbage()
+        freed += self._remove_untracked_blob_files()
+        self.db.execute("VACUUM")
+        return {"deleted_responses": deleted, "freed_bytes": freed}
+
+    def _remove_untracked_blob_files(self) -> int:
+        known = {
+            blob_hash for (blob_hash,) in self.db.execute("SELECT hash FROM blobs")
+        }
+        freed = 0
+        for dirpath, _, filenames in os.walk(self.blob_dir):
+            for filename in filenames:
+                if filename.split(".")[0] in known:
+                    continue
+                file_path = os.path.join(dirpath, filename)
+                freed += os.path.getsize(file_path)
+                os.remove(file_path)
+        return freed
+
+
+class ContentAddressedCacheStorage:
+    """
+    `HTTPCACHE_STORAGE` backed by `ResponseArchive`.
+
+    Settings:
+        HTTPCACHE_EXPIRATION_SECS: default freshness of archived responses.
+        HTTPCACHE_ARCHIVE_TTL: {url regex: secs} overriding the freshness of matching urls.
+        HTTPCACHE_ARCHIVE_MAX_BYTES: size bound of the compressed bodies, checked when the spider closes.
+        HTTPCACHE_ARCHIVE_COMPRESS_LEVEL: gzip level of the bodies.
+    """
+
+    archive: ResponseArchive
+    run_id: str
+
+    def __init__(self, settings):
+        self.cachedir = data_path(settings["HTTPCACHE_DIR"])
+        self.expiration_secs = settings.getint("HTTPCACHE_EXPIRATION_SECS")
+        self.ttl_rules: List[Tuple[Pattern, int]] = [
+            (re.compile(pattern), int(secs))
+            for pattern, secs in settings.getdict("HTTPCACHE_ARCHIVE_TTL").items()
+        ]
+        self.max_bytes = settings.getint("HTTPCACHE_ARCHIVE_MAX_BYTES")
+        self.compress_level = settings.getint("HTTPCACHE_ARCHIVE_COMPRESS_LEVEL", 6)
+
+    def open_spider(self, spider):
+        self._fingerprinter = spider.crawler.request_fingerprinter
+        self.archive = ResponseArchive(
+            os.path.join(self.cachedir, spider.name), self.compress_level
+        )
+        self.run_id = getattr(spider, "_job", None) or time.strftime(
+            "%Y%m%dT%H%M%S", time.gmtime()
+        )
+        logger.debug(
+            f'Using content-addressed cache storage. (dir: "{self.archive.path}", run: "{self.run_id}")',
+            extra={"spider": spider},
+        )
+
+    def close_spider(self, spider):
+        if self.max_bytes:
+            dropped = self.archive.evict(self.max_bytes, keep_run=self.run_id)
+            if dropped:
+                logger.info(
+                    f"Evicted {dropped} old runs from the response archive.",
+                    extra={"spider": spider},
+                )
+        self.archive.close()
+
+    def _expiration_secs(self, url: str) -> int:
+        for pattern, secs in self.ttl_rules:
+            if pattern.search(url):
+                return secs
+        return self.expiration_secs
+
+    def retrieve_response(self, spider, request):
+        entry = self.archive.latest(self._fingerprinter.fingerprint(request).hex())
+        if entry is None:
+            return None
+
+        expiration_secs = self._expiration_secs(request.url)
+        if 0 < expiration_secs < time.time() - entry.timestamp:
+            return None
+
+        return build_response(entry, self.archive.read_blob(entry.blob))
+
+    def store_response(self, spider, request, response):
+        callback = request.callback
+        self.archive.put(
+            ArchivedResponse(
+                fingerprint=self._fingerprinter.fingerprint(request).hex(),
+                run_id=self.run_id,
+                url=request.url,
+                method=request.method,
+                status=response.status,
+                response_url=response.url,
+                headers=headers_dict_to_raw(response.headers),
+                blob=self.archive.put_blob(response.body),
+                callback=getattr(callback, "__name__", callback),
+                cb_kwargs=json.dumps(request.cb_kwargs, default=str),
+                timestamp=time.time(),
+            )
+        )
+
+
+def build_response(entry: ArchivedResponse, body: bytes):
+    headers = Headers(headers_raw_to_dict(entry.headers))
+    respcls = responsetypes.from_args(
+        headers=headers, url=entry.response_url, body=body
+    )
+    return respcls(
+        url=entry.response_url, headers=headers, status=entry.status, body=body
+    )
@@ -0,0 +1,154 @@
+"""
+Derivatives of the product images: resized copies and WebP/AVIF encodings.
+
+Images are encoded by `make_derivatives` on a process pool, `ByteBudget` bounds
+the bytes of the original images waiting for or being encoded.
+`dhash` tells near-identical images apart from different ones, `fingerprint` adds
+the size that confirms them, it runs on the process pool as well.
+"""
+from collections import deque
+from concurrent.futures import Future
+from io import BytesIO
+from typing import Deque, Dict, List, Sequence, Tuple
+
+from twisted.internet.defer import Deferred
+
+Derivative = Tuple[str, str, bytes]
+
+CONTENT_TYPES = {"jpeg": "image/jpeg", "webp": "image/webp", "avif": "image/avif"}
+
+
+def available_formats(formats: Sequence[str]) -> List[str]:
+    """`formats` Pillow can write, AVIF depends on how Pillow was built."""
+    from PIL import Image
+
+    Image.init()
+    return [fmt.upper() for fmt in formats if fmt.upper() in Image.SAVE]
+
+
+def make_derivatives(
+    body: bytes, sizes: Dict[str, int], formats: Sequence[str], quality: int = 80
+) -> List[Derivative]:
+    """
+    Encode the image in every format, at full size and fitted into every `sizes` box.
+    Returns (variant name, file extension, encoded bytes) tuples.
+    """
+    from PIL import Image
+
+    derivatives: List[Derivative] = []
+    with Image.open(BytesIO(body)) as original:
+        image = original.convert("RGBA" if "A" in original.getbands() else "RGB")
+
+    variants = {"full": image}
+    for name, size in sizes.items():
+        resized = image.copy()
+        resized.thumbnail((size, size), Image.Resampling.LANCZOS)
+        variants[name] = resized
+
+    for name, variant in variants.items():
+        for fmt in formats:
+            buf = BytesIO()
+            variant.save(buf, fmt, quality=quality)
+            derivatives.append((name, fmt.lower(), buf.getvalue()))
+    return derivatives
+
+
+def dhash(body: bytes) -> int:
+    """
+    64 bits difference hash: whether each pixel of a 9x8 grayscale thumbnail
+    is brighter than its right neighbour. Re-encoded or resized copies of an image
+    differ by a few bits at most.
+    """
+    from PIL import Image
+
+    with Image.open(BytesIO(body)) as image:
+        # Decoding a reduced JPEG is enough for a 9x8 thumbnail.
+        image.draft("L", (64, 64))
+        pixels = list(
+            image.convert("L").resize((9, 8), Image.Resampling.LANCZOS).getdata()
+        )
+
+    bits = 0
+    for row in range(8):
+        for col in range(8):
+            left, right = pixels[row * 9 + col], pixels[row * 9 + col + 1]
+            bits = (bits << 1) | (left > right)
+    return bits
+
+
+def deferred_from_future(future: Future) -> Deferred:
+    """Fire a `Deferred` in the reactor thread when the `concurrent.futures.Future` is done."""
+    from twisted.internet import reactor
+
+    deferred: Deferred = Deferred()
+
+    def on_done(done: Future):
+        exception = done.exception()
+        if exception is not None:
+            reactor.callFromThread(deferred.errback, exception)
+        else:
+            reactor.callFromThread(deferred.callback, done.result())
+
+    future.add_done_callback(on_done)
+    return deferred
+
+
+class ByteBudget:
+    """
+    Hand out at most `limit` bytes at once. A request bigger than the whole budget
+    is served alone once everything else has been released.
+    """
+
+    def __init__(self, limit: int) -> None:
+        self.limit = limit
+        self.used = 0
+        self.waiting: Deque[Tuple[int, Deferred]] = deque()
+
+    def _fits(self, size: int) -> bool:
+        return self.used == 0 or self.used + size <= self.limit
+
+    def acquire(self, size: int) -> Deferred:
+        deferred: Deferred = Deferred()
+        if not self.waiting and self._fits(size):
+            self.used += size
+            deferred.callback(None)
+        else:
+            self.waiting.append((size, deferred))
+        return deferred
+
+    def release(self, size: int):
+        self.used -= size
+        while self.waiting and self._fits(self.waiting[0][0]):
+            waiting_size, deferred = self.waiting.popleft()
+            self.used += waiting_size
+            deferred.callback(None)
+
+
+def upload_to_s3(store, path: str, buf: BytesIO, content_type: str, chunk_size: int):
+    """
+    Stream `buf` to the S3 files store, with a multipart upload above `chunk_size` bytes.
+    Runs in a thread.
+    """
+    from boto3.s3.inject import upload_fileobj
+    from boto3.s3.transfer import TransferConfig
+
+    buf.seek(0)
+    upload_fileobj(
+        store.s3_client,
+        buf,
+        store.bucket,
+        f"{store.prefix}{path}",
+        ExtraArgs={"ContentType": content_type, "ACL": store.POLICY},
+        Config=TransferConfig(
+            multipart_threshold=chunk_size, multipart_chunksize=chunk_size
+        ),
+    )
+
+
+def fingerprint(body: bytes) -> Tuple[int, Tuple[int, int]]:
+    """`dhash` and (width, height) of the image."""
+    from PIL import Image
+
+    with Image.open(BytesIO(body)) as image:
+        size = image.size
+    return dhash(body), size
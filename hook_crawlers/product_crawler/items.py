@@ -0,0 +1,45 @@
+# Items other than the `ProductBase` built by figure_parser.
+#
+# See documentation in:
+# https://docs.scrapy.org/en/latest/topics/items.html
+from dataclasses import dataclass
+from datetime import date
+from typing import Any
+
+from figure_parser import ProductBase
+from itemadapter import ItemAdapter
+from itemadapter.adapter import PydanticAdapter
+
+
+@dataclass
+class ReleaseDelay:
+    """New release date of a product, announced in a post of the brand."""
+
+    url: str
+    jan: str
+    release_date: date
+
+
+class ProductBaseAdapter(PydanticAdapter):
+    """
+    `ItemAdapter` for `ProductBase` assigning the fields in place without validation,
+    like `BaseModel.construct`. The media pipelines write the fields they download
+    without dumping and re-validating the whole product.
+    """
+
+    @classmethod
+    def is_item_class(cls, item_class: type) -> bool:
+        return isinstance(item_class, type) and issubclass(item_class, ProductBase)
+
+    def __setitem__(self, field_name: str, value: Any) -> None:
+        if field_name not in self.item.__fields__:
+            raise KeyError(
+                f"{self.item.__class__.__name__} does not support field: {field_name}"
+            )
+        self.item.__dict__[field_name] = value
+        self.item.__fields_set__.add(field_name)
+
+
+# Ahead of `PydanticAdapter`, which assigns through the validating `__setattr__`.
+if ProductBaseAdapter not in ItemAdapter.ADAPTER_CLASSES:
+    ItemAdapter.ADAPTER_CLASSES.appendleft(ProductBaseAdapter)
@@ -0,0 +1,99 @@
+import os
+import sqlite3
+import time
+from typing import Any, Mapping, Tuple
+from urllib.parse import urlencode
+
+
+def job_key(spider_name: str, spider_args: Mapping[str, Any]) -> str:
+    """
+    The spider name and its arguments, e.g. `gsc_product?begin_year=2021&category=scale`,
+    so crawls of other years or categories don't resume from each other.
+    Private arguments like the `_job` id scrapyd passes change every run, they're left out.
+    """
+    args = sorted(
+        (name, str(value))
+        for name, value in spider_args.items()
+        if not name.startswith("_") and name != "checkpoint"
+    )
+    return f"{spider_name}?{urlencode(args)}" if args else spider_name
+
+
+class CrawlCheckpoint:
+    """
+    Progress of the crawls that didn't finish, keyed by the job (see `job_key`).
+
+    A unit is a listing page (a year, a page or a category of a listing)
+    whose every product was processed, a product is the canonical url of a product page
+    that went through the item pipelines. The progress of a job is cleared once it finishes.
+    """
+
+    def __init__(self, path: str) -> None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.db = sqlite3.connect(path, timeout=30)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS checkpoint_units (
+                job TEXT NOT NULL,
+                unit TEXT NOT NULL,
+                completed_at REAL NOT NULL,
+                PRIMARY KEY (job, unit)
+            )
+            """
+        )
+        self.db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS checkpoint_products (
+                job TEXT NOT NULL,
+                url TEXT NOT NULL,
+                completed_at REAL NOT NULL,
+                PRIMARY KEY (job, url)
+            )
+            """
+        )
+        self.db.commit()
+
+    def is_unit_done(self, job: str, unit: str) -> bool:
+        row = self.db.execute(
+            "SELECT 1 FROM checkpoint_units WHERE job = ? AND unit = ?", (job, unit)
+        ).fetchone()
+        return row is not None
+
+    def complete_unit(self, job: str, unit: str):
+        self.db.execute(
+            "INSERT OR REPLACE INTO checkpoint_units (job, unit, completed_at) VALUES (?, ?, ?)",
+            (job, unit, time.time()),
+        )
+        self.db.commit()
+
+    def is_product_done(self, job: str, url: str) -> bool:
+        row = self.db.execute(
+            "SELECT 1 FROM checkpoint_products WHERE job = ? AND url = ?", (job, url)
+        ).fetchone()
+        return row is not None
+
+    def complete_product(self, job: str, url: str):
+        self.db.execute(
+            "INSERT OR REPLACE INTO checkpoint_products (job, url, completed_at) VALUES (?, ?, ?)",
+            (job, url, time.time()),
+        )
+        self.db.commit()
+
+    def progress(self, job: str) -> Tuple[int, int]:
+        """Completed (units, products) of `job`."""
+        units = self.db.execute(
+            "SELECT COUNT(*) FROM checkpoint_units WHERE job = ?", (job,)
+        ).fetchone()[0]
+        products = self.db.execute(
+            "SELECT COUNT(*) FROM checkpoint_products WHERE job = ?", (job,)
+        ).fetchone()[0]
+        return units, products
+
+    def clear(self, job: str):
+        self.db.execute("DELETE FROM checkpoint_units WHERE job = ?", (job,))
+        self.db.execute("DELETE FROM checkpoint_products WHERE job = ?", (job,))
+        self.db.commit()
+
+    def close(self):
+        self.db.close()
@@ -0,0 +1,117 @@
+"""
+Products listed in the release-date change paragraphs of a GSC delay post.
+
+A paragraph reads like:
+    「<a href="/ja/product/1234/...">name</a>」JAN：4580000000001
+    2021年1月 → 2021年3月
+
+The paragraph is walked once, anchors and text nodes in document order,
+without serializing the tree back to html.
+"""
+import re
+from datetime import date
+from typing import Dict, List, Optional, TypedDict
+
+from lxml import etree
+from parsel.csstranslator import HTMLTranslator
+
+
+class DelayedProduct(TypedDict, total=False):
+    url: str
+    jan: str
+    release_date: date
+
+
+DelayTag = Dict[str, DelayedProduct]
+
+PRODUCT_HREF = re.compile(r"/product/(\d+)/")
+JAN = re.compile(r"」JAN：(\d+)")
+RELEASE_MONTH = re.compile(r"(\d{4})年\s*(\d{1,2})月")
+MONTH = re.compile(r"\d{1,2}\s*月")
+NEW_RELEASE_MARKER = re.compile(r"→|⇒|変更後|新発売")
+
+DELAY_PARAGRAPHS = etree.XPath(
+    HTMLTranslator().css_to_xpath(".content > p, .content > center")
+)
+
+
+def parse_new_release_date(text: str) -> Optional[date]:
+    """
+    Release month written after the last change marker (→, 変更後...) of a text.
+    `None` when the text doesn't name exactly one new month.
+    """
+    markers = list(NEW_RELEASE_MARKER.finditer(text))
+    if not markers:
+        return None
+
+    text = text[markers[-1].end() :]
+    # A range like "2022年7月～8月" doesn't tell the month either.
+    if len(MONTH.findall(text)) != 1:
+        return None
+    result = RELEASE_MONTH.search(text)
+    if result is None:
+        return None
+    return date(int(result.group(1)), int(result.group(2)), 1)
+
+
+class _ParagraphParser:
+    def __init__(self, products: DelayTag) -> None:
+        self.products = products
+        # Product anchor waiting for its JAN.
+        self.anchor: Optional[tuple] = None
+        # Product whose new release date is being read.
+        self.current: Optional[str] = None
+        self.texts: List[str] = []
+
+    def on_anchor(self, href: str):
+        result = PRODUCT_HREF.search(href)
+        if result is None:
+            return
+        self.close_current()
+        self.anchor = (result.group(1), href)
+        self.texts = []
+
+    def on_text(self, text: Optional[str]):
+        if not text:
+            return
+        self.texts.append(text)
+        if self.anchor is None:
+            return
+
+        buffered = "".join(self.texts)
+        result = JAN.search(buffered)
+        if result is None:
+            return
+
+        maker_id, url = self.anchor
+        self.products[maker_id] = {"url": url, "jan": result.group(1)}
+        self.anchor = None
+        self.current = maker_id
+        self.texts = [buffered[result.end() :]]
+
+    def close_current(self):
+        if self.current is not None:
+            release_date = parse_new_release_date("".join(self.texts))
+            if release_date:
+                self.products[self.current]["release_date"] = release_date
+        self.current = None
+
+
+def parse_delay_products(root: etree._Element) -> DelayTag:
+    products: DelayTag = {}
+    for paragraph in DELAY_PARAGRAPHS(root):
+        parser = _ParagraphParser(products)
+        for event, element in etree.iterwalk(paragraph, events=("start", "end")):
+            if not isinstance(element.tag, str):
+                # Comments and processing instructions only carry their tail.
+                if event == "end":
+                    parser.on_text(element.tail)
+                continue
+            if event == "start":
+                if element.tag == "a":
+                    parser.on_anchor(element.get("href", ""))
+                parser.on_text(element.text)
+            elif element is not paragraph:
+                parser.on_text(element.tail)
+        parser.close_current()
+    return products
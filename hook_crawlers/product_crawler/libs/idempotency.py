@@ -0,0 +1,52 @@
+"""
+Idempotency keys of the api writes. A write sent again with the same key,
+a retry of a timed out request or a racing job saving the same product,
+gets the response of the first one instead of creating a duplicate.
+"""
+import hashlib
+import json
+from typing import TYPE_CHECKING, Any, Optional
+
+from figure_parser import Release
+
+from .product_urls import canonical_product_url
+
+if TYPE_CHECKING:  # pragma: no cover
+    from figure_hook_client import AuthenticatedClient
+
+IDEMPOTENCY_KEY_HEADER = "Idempotency-Key"
+
+
+def _key(kind: str, *parts: Any) -> str:
+    digest = hashlib.sha256(
+        json.dumps(parts, default=str, ensure_ascii=False).encode("utf-8")
+    ).hexdigest()
+    return f"{kind}-{digest[:40]}"
+
+
+def product_idempotency_key(url: str) -> str:
+    return _key("product", canonical_product_url(url))
+
+
+def release_idempotency_key(url: str, index: int, release: Release) -> str:
+    """
+    The `index`-th release of the product at `url`. `announced_at` isn't part of it,
+    it's the crawl date for announcement spiders and would change between retries.
+    """
+    return _key(
+        "release",
+        canonical_product_url(url),
+        index,
+        release.release_date,
+        release.price,
+        release.tax_including,
+    )
+
+
+def with_idempotency_key(
+    api_client: "AuthenticatedClient", idempotency_key: Optional[str]
+) -> "AuthenticatedClient":
+    """A copy of the client sending `idempotency_key`, the client itself without a key."""
+    if idempotency_key is None:
+        return api_client
+    return api_client.with_headers({IDEMPOTENCY_KEY_HEADER: idempotency_key})
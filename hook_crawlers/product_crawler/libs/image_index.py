@@ -0,0 +1,163 @@
+import os
+import sqlite3
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+# A 64 bits perceptual hash is split in 8 bands of 8 bits. Hashes within 7 bits
+# of each other share at least one band, so candidates are found by exact band matches.
+DHASH_BANDS = 8
+DHASH_BAND_BITS = 8
+
+
+@dataclass
+class IndexedImage:
+    url: str
+    checksum: str
+    path: str
+    stored_at: float
+
+
+class ImageIndex:
+    """
+    Source image url -> checksum -> key of the stored image.
+    Stored keys are content-addressed, so identical images share one key.
+    """
+
+    def __init__(self, path: str) -> None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.db = sqlite3.connect(path, timeout=30)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS stored_files (
+                path TEXT PRIMARY KEY,
+                stored_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS images (
+                url TEXT PRIMARY KEY,
+                checksum TEXT NOT NULL,
+                path TEXT NOT NULL,
+                stored_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS perceptual_hashes (
+                path TEXT PRIMARY KEY,
+                dhash TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS dhash_bands (
+                band INTEGER NOT NULL,
+                value INTEGER NOT NULL,
+                path TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS dhash_bands_by_value ON dhash_bands (band, value);
+            CREATE TABLE IF NOT EXISTS image_sizes (
+                path TEXT PRIMARY KEY,
+                width INTEGER NOT NULL,
+                height INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS derivatives (
+                path TEXT NOT NULL,
+                variant TEXT NOT NULL,
+                derivative_path TEXT NOT NULL,
+                PRIMARY KEY (path, variant)
+            );
+            """
+        )
+
+    def get(self, url: str, max_age_secs: float = 0) -> Optional[IndexedImage]:
+        """The indexed image of `url`, ignored when older than `max_age_secs` (0 never expires)."""
+        row = self.db.execute(
+            "SELECT url, checksum, path, stored_at FROM images WHERE url = ?", (url,)
+        ).fetchone()
+        if row is None:
+            return None
+
+        image = IndexedImage(*row)
+        if max_age_secs and time.time() - image.stored_at > max_age_secs:
+            return None
+        return image
+
+    def put(self, url: str, checksum: str, path: str):
+        self.db.execute(
+            "INSERT OR REPLACE INTO images (url, checksum, path, stored_at) VALUES (?, ?, ?, ?)",
+            (url, checksum, path, time.time()),
+        )
+        self.db.commit()
+
+    def is_stored(self, path: str) -> bool:
+        row = self.db.execute(
+            "SELECT 1 FROM stored_files WHERE path = ?", (path,)
+        ).fetchone()
+        return row is not None
+
+    def mark_stored(self, path: str):
+        self.db.execute(
+            "INSERT OR REPLACE INTO stored_files (path, stored_at) VALUES (?, ?)",
+            (path, time.time()),
+        )
+        self.db.commit()
+
+    def get_derivatives(self, path: str) -> Dict[str, str]:
+        """{variant: stored path} of the derivatives of the image stored at `path`."""
+        rows = self.db.execute(
+            "SELECT variant, derivative_path FROM derivatives WHERE path = ?", (path,)
+        )
+        return dict(rows)
+
+    def put_derivatives(self, path: str, derivatives: Dict[str, str]):
+        self.db.executemany(
+            "INSERT OR REPLACE INTO derivatives (path, variant, derivative_path) VALUES (?, ?, ?)",
+            [(path, variant, key) for variant, key in derivatives.items()],
+        )
+        self.db.commit()
+
+    def put_dhash(self, path: str, dhash: int, size: Tuple[int, int]):
+        self.db.execute(
+            "INSERT OR REPLACE INTO perceptual_hashes (path, dhash) VALUES (?, ?)",
+            (path, f"{dhash:016x}"),
+        )
+        self.db.execute(
+            "INSERT OR REPLACE INTO image_sizes (path, width, height) VALUES (?, ?, ?)",
+            (path, *size),
+        )
+        self.db.execute("DELETE FROM dhash_bands WHERE path = ?", (path,))
+        self.db.executemany(
+            "INSERT INTO dhash_bands (band, value, path) VALUES (?, ?, ?)",
+            [(band, value, path) for band, value in enumerate(_bands(dhash))],
+        )
+        self.db.commit()
+
+    def nearest(
+        self, dhash: int, max_distance: int, size: Tuple[int, int]
+    ) -> Optional[Tuple[str, int]]:
+        """
+        (path, hamming distance) of the stored image of the same `size` with the closest
+        perceptual hash, `None` when none is within `max_distance` bits (at most DHASH_BANDS - 1).
+        A few bits also tell apart crops or edits, the size keeps them from matching.
+        """
+        conditions = " OR ".join(["(b.band = ? AND b.value = ?)"] * DHASH_BANDS)
+        params = [x for pair in enumerate(_bands(dhash)) for x in pair]
+        rows = self.db.execute(
+            f"""
+            SELECT DISTINCT p.path, p.dhash FROM dhash_bands AS b
+            JOIN perceptual_hashes AS p ON p.path = b.path
+            JOIN image_sizes AS s ON s.path = b.path
+            WHERE s.width = ? AND s.height = ? AND ({conditions})
+            """,
+            [*size, *params],
+        )
+
+        best: Optional[Tuple[str, int]] = None
+        for path, other in rows:
+            distance = bin(dhash ^ int(other, 16)).count("1")
+            if distance <= max_distance and (best is None or distance < best[1]):
+                best = (path, distance)
+        return best
+
+    def close(self):
+        self.db.close()
+
+
+def _bands(dhash: int):
+    mask = (1 << DHASH_BAND_BITS) - 1
+    return [(dhash >> (band * DHASH_BAND_BITS)) & mask for band in range(DHASH_BANDS)]
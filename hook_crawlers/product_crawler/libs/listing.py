@@ -0,0 +1,75 @@
+import hashlib
+from typing import Dict, Iterable, List, Optional, Union
+
+from lxml import etree
+from parsel.csstranslator import HTMLTranslator
+from scrapy.http import TextResponse
+from scrapy.link import Link
+from scrapy.linkextractors import LinkExtractor
+from w3lib.url import safe_url_string
+
+_translator = HTMLTranslator()
+
+
+class ListingExtractor:
+    """
+    Links and metadata of one kind of listing page.
+
+    The link extractor and the metadata xpaths are compiled once and run on the
+    lxml tree cached by `response.selector`, so a listing page is parsed only once
+    no matter how many things are read from it.
+    """
+
+    link_extractor: Optional[LinkExtractor]
+    metadata_xpaths: Dict[str, etree.XPath]
+    summary_items_xpath: Optional[etree.XPath]
+
+    def __init__(
+        self,
+        restrict_css: Optional[str] = None,
+        deny: Union[str, Iterable[str]] = (),
+        metadata: Optional[Dict[str, str]] = None,
+        summary_items_xpath: Optional[str] = None,
+    ) -> None:
+        self.link_extractor = (
+            LinkExtractor(restrict_css=restrict_css, deny=deny)
+            if restrict_css
+            else None
+        )
+        self.metadata_xpaths = {
+            key: etree.XPath(_translator.css_to_xpath(css))
+            for key, css in (metadata or {}).items()
+        }
+        self.summary_items_xpath = (
+            etree.XPath(summary_items_xpath) if summary_items_xpath else None
+        )
+
+    def extract_links(self, response: TextResponse) -> List[Link]:
+        if self.link_extractor is None:
+            return []
+        return self.link_extractor.extract_links(response)
+
+    def extract_text(self, response: TextResponse, key: str) -> Optional[str]:
+        """Text of the first element matching the metadata `key`."""
+        elements = self.metadata_xpaths[key](response.selector.root)
+        if not elements:
+            return None
+        return "".join(elements[0].itertext())
+
+    def extract_summaries(self, response: TextResponse) -> Dict[str, str]:
+        """
+        Checksum of what the listing shows about each product (name, price, release month...),
+        keyed by the product url. Every element matched by `summary_items_xpath` is one product.
+        """
+        if self.summary_items_xpath is None:
+            return {}
+
+        summaries = {}
+        for item in self.summary_items_xpath(response.selector.root):
+            hrefs = item.xpath(".//a/@href")
+            if not hrefs:
+                continue
+            url = safe_url_string(response.urljoin(str(hrefs[0]).strip()))
+            text = " ".join("".join(item.itertext()).split())
+            summaries[url] = hashlib.md5(text.encode("utf-8")).hexdigest()
+        return summaries
@@ -0,0 +1,55 @@
+import os
+import sqlite3
+import time
+
+
+class ListingSummaryStore:
+    """Last seen listing summary checksum of every product url."""
+
+    def __init__(self, path: str) -> None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.db = sqlite3.connect(path, timeout=30)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS listing_summaries (
+                url TEXT PRIMARY KEY,
+                checksum TEXT NOT NULL,
+                fetched_at REAL NOT NULL
+            )
+            """
+        )
+
+    def should_fetch(self, url: str, checksum: str, recrawl_secs: float) -> bool:
+        """
+        The detail page needs fetching when it was never fetched,
+        its listing summary changed, or it was fetched longer than `recrawl_secs` ago.
+        """
+        row = self.db.execute(
+            "SELECT checksum, fetched_at FROM listing_summaries WHERE url = ?", (url,)
+        ).fetchone()
+        if row is None:
+            return True
+
+        last_checksum, fetched_at = row
+        if last_checksum != checksum:
+            return True
+        return time.time() - fetched_at > recrawl_secs
+
+    def is_unchanged(self, url: str, checksum: str) -> bool:
+        """The product was fetched before with the same listing summary."""
+        row = self.db.execute(
+            "SELECT 1 FROM listing_summaries WHERE url = ? AND checksum = ?",
+            (url, checksum),
+        ).fetchone()
+        return row is not None
+
+    def record(self, url: str, checksum: str):
+        self.db.execute(
+            "INSERT OR REPLACE INTO listing_summaries (url, checksum, fetched_at) VALUES (?, ?, ?)",
+            (url, checksum, time.time()),
+        )
+        self.db.commit()
+
+    def close(self):
+        self.db.close()
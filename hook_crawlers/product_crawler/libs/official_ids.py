@@ -0,0 +1,81 @@
+import os
+import re
+import sqlite3
+import threading
+from typing import Dict, Iterable, Optional, Pattern, Tuple
+from urllib.parse import urlparse
+
+from figure_parser.enums import BrandHost
+
+OFFICIAL_ID_PATTERNS: Dict[str, Pattern] = {
+    BrandHost.GSC: re.compile(r"/product/(?P<official_id>\d+)"),
+}
+
+
+def parse_official_id(url: str) -> Optional[Tuple[str, str]]:
+    """(host, official id) of a product url, `None` for brands without official ids."""
+    host = urlparse(url).netloc
+    pattern = OFFICIAL_ID_PATTERNS.get(host)
+    if pattern is None:
+        return None
+
+    result = pattern.search(url)
+    if result is None:
+        return None
+    return host, result.group("official_id")
+
+
+class OfficialIdIndex:
+    """Official ids of the products saved in the database, by brand host."""
+
+    def __init__(self, path: str) -> None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        # Also written by the save threads of `SaveProductInDatabasePipeline`,
+        # the connection is shared so every use of it holds `_lock`.
+        self.db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._lock = threading.Lock()
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS official_ids (
+                host TEXT NOT NULL,
+                official_id TEXT NOT NULL,
+                url TEXT NOT NULL,
+                PRIMARY KEY (host, official_id)
+            )
+            """
+        )
+
+    def add(self, url: str) -> bool:
+        parsed = parse_official_id(url)
+        if parsed is None:
+            return False
+
+        host, official_id = parsed
+        with self._lock:
+            self.db.execute(
+                "INSERT OR REPLACE INTO official_ids (host, official_id, url) VALUES (?, ?, ?)",
+                (host, official_id, url),
+            )
+            self.db.commit()
+        return True
+
+    def find(self, host: str, official_ids: Iterable[str]) -> Dict[str, str]:
+        """{official id: product url} of the known ids among `official_ids`."""
+        official_ids = list(dict.fromkeys(official_ids))
+        found: Dict[str, str] = {}
+        # Keep below SQLITE_MAX_VARIABLE_NUMBER.
+        for begin in range(0, len(official_ids), 500):
+            chunk = official_ids[begin : begin + 500]
+            placeholders = ", ".join("?" * len(chunk))
+            with self._lock:
+                rows = self.db.execute(
+                    f"SELECT official_id, url FROM official_ids WHERE host = ? AND official_id IN ({placeholders})",
+                    (host, *chunk),
+                ).fetchall()
+            found.update(rows)
+        return found
+
+    def close(self):
+        with self._lock:
+            self.db.close()
@@ -0,0 +1,160 @@
+"""
+Validate api payloads against the component schemas of the api's OpenAPI spec,
+the same spec the mock server runs on (`bin/start_api_mock_server.sh`).
+
+Only the keywords the api's schemas use are checked. Like the api,
+`null` is accepted for the properties that aren't required.
+"""
+import json
+from datetime import date, datetime
+from typing import Any, Dict, List, Tuple
+from urllib.parse import urlparse
+
+SchemaError = Tuple[str, str]
+
+_TYPES = {
+    "string": lambda v: isinstance(v, str),
+    "integer": lambda v: isinstance(v, int) and not isinstance(v, bool),
+    "number": lambda v: isinstance(v, (int, float)) and not isinstance(v, bool),
+    "boolean": lambda v: isinstance(v, bool),
+    "array": lambda v: isinstance(v, list),
+    "object": lambda v: isinstance(v, dict),
+    "null": lambda v: v is None,
+}
+
+
+def _is_datetime(value: str) -> bool:
+    try:
+        datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return False
+    return True
+
+
+def _is_date(value: str) -> bool:
+    try:
+        date.fromisoformat(value)
+    except ValueError:
+        return False
+    return True
+
+
+def _is_uri(value: str) -> bool:
+    parsed = urlparse(value)
+    return bool(parsed.scheme and parsed.netloc)
+
+
+_FORMATS = {"date-time": _is_datetime, "date": _is_date, "uri": _is_uri}
+
+
+class OpenApiSchemas:
+    def __init__(self, spec: Dict[str, Any]) -> None:
+        self.schemas: Dict[str, Any] = spec.get("components", {}).get("schemas", {})
+
+    @classmethod
+    def from_file(cls, path: str) -> "OpenApiSchemas":
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def __contains__(self, schema_name: str) -> bool:
+        return schema_name in self.schemas
+
+    def validate(self, schema_name: str, payload: Any) -> List[SchemaError]:
+        """(field path, message) of every violation of `payload`, empty when it's valid."""
+        errors: List[SchemaError] = []
+        self._validate(self.schemas[schema_name], payload, "", errors)
+        return errors
+
+    def _resolve(self, schema: Dict[str, Any]) -> Dict[str, Any]:
+        while "$ref" in schema:
+            schema = self.schemas[schema["$ref"].rsplit("/", 1)[-1]]
+        return schema
+
+    def _validate(self, schema, value, path: str, errors: List[SchemaError]):
+        schema = self._resolve(schema)
+        if value is None and schema.get("nullable"):
+            return
+
+        for sub_schema in schema.get("allOf", []):
+            self._validate(sub_schema, value, path, errors)
+
+        for keyword in ("anyOf", "oneOf"):
+            if keyword in schema and not any(
+                not self._errors(sub_schema, value, path)
+                for sub_schema in schema[keyword]
+            ):
+                errors.append((path, f"doesn't match any schema of {keyword}"))
+
+        expected = schema.get("type")
+        if expected:
+            types = expected if isinstance(expected, list) else [expected]
+            if not any(_TYPES[t](value) for t in types if t in _TYPES):
+                errors.append((path, f"expected {' or '.join(types)}"))
+                return
+
+        if "enum" in schema and value not in schema["enum"]:
+            errors.append((path, f"not one of {schema['enum']}"))
+
+        if isinstance(value, str):
+            self._validate_string(schema, value, path, errors)
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            if "minimum" in schema and value < schema["minimum"]:
+                errors.append((path, f"less than {schema['minimum']}"))
+            if "maximum" in schema and value > schema["maximum"]:
+                errors.append((path, f"greater than {schema['maximum']}"))
+        elif isinstance(value, list):
+            self._validate_array(schema, value, path, errors)
+        elif isinstance(value, dict):
+            self._validate_object(schema, value, path, errors)
+
+    def _errors(self, schema, value, path: str) -> List[SchemaError]:
+        errors: List[SchemaError] = []
+        self._validate(schema, value, path, errors)
+        return errors
+
+    @staticmethod
+    def _validate_string(schema, value: str, path: str, errors: List[SchemaError]):
+        if "minLength" in schema and len(value) < schema["minLength"]:
+            errors.append((path, f"shorter than {schema['minLength']}"))
+        if "maxLength" in schema and len(value) > schema["maxLength"]:
+            errors.append((path, f"longer than {schema['maxLength']}"))
+        is_format = _FORMATS.get(schema.get("format", ""))
+        if is_format and not is_format(value):
+            errors.append((path, f"not a valid {schema['format']}"))
+
+    def _validate_array(
+        self, schema, value: list, path: str, errors: List[SchemaError]
+    ):
+        if "minItems" in schema and len(value) < schema["minItems"]:
+            errors.append((path, f"fewer than {schema['minItems']} items"))
+        if "maxItems" in schema and len(value) > schema["maxItems"]:
+            errors.append((path, f"more than {schema['maxItems']} items"))
+        if "items" in schema:
+            for index, item in enumerate(value):
+                self._validate(schema["items"], item, f"{path}[{index}]", errors)
+
+    def _validate_object(
+        self, schema, value: dict, path: str, errors: List[SchemaError]
+    ):
+        required = schema.get("required", [])
+        for name in required:
+            if name not in value:
+                errors.append((_join(path, name), "required"))
+
+        properties = schema.get("properties", {})
+        for name, item in value.items():
+            if name in properties:
+                if item is None and name not in required:
+                    continue
+                self._validate(properties[name], item, _join(path, name), errors)
+            elif schema.get("additionalProperties") is False:
+                errors.append((_join(path, name), "unexpected property"))
+
+
+def _join(path: str, name: str) -> str:
+    return f"{path}.{name}" if path else name
+
+
+def field_name(path: str) -> str:
+    """Top-level field of an error path, `releases[0].price` -> `releases`."""
+    return path.split(".", 1)[0].split("[", 1)[0] or "<root>"
@@ -0,0 +1,11 @@
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:  # pragma: no cover
+    from bs4 import BeautifulSoup
+
+
+def parse_html(text: str) -> "BeautifulSoup":
+    """Build the soup of a page, `bs4` is only imported by the first call."""
+    from bs4 import BeautifulSoup
+
+    return BeautifulSoup(text, "lxml")
@@ -0,0 +1,84 @@
+import os
+import sqlite3
+import time
+from typing import Iterable, List, Optional, Tuple
+
+Validators = Tuple[Optional[str], Optional[str]]
+
+
+class PostSnapshotStore:
+    """
+    Post urls seen on a watched index page, and the HTTP validators of the index.
+    Only the newest `max_posts` urls are kept.
+    """
+
+    def __init__(self, path: str, max_posts: int = 1000) -> None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.max_posts = max_posts
+        self.db = sqlite3.connect(path, timeout=30)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS seen_posts (
+                url TEXT PRIMARY KEY,
+                seen_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS validators (
+                url TEXT PRIMARY KEY,
+                etag TEXT,
+                last_modified TEXT
+            );
+            """
+        )
+
+    def is_empty(self) -> bool:
+        return self.db.execute("SELECT 1 FROM seen_posts LIMIT 1").fetchone() is None
+
+    def new_posts(self, urls: Iterable[str]) -> List[str]:
+        """`urls` not in the snapshot, in their original order."""
+        new = []
+        for url in dict.fromkeys(urls):
+            row = self.db.execute(
+                "SELECT 1 FROM seen_posts WHERE url = ?", (url,)
+            ).fetchone()
+            if row is None:
+                new.append(url)
+        return new
+
+    def add(self, urls: Iterable[str]):
+        now = time.time()
+        self.db.executemany(
+            "INSERT OR IGNORE INTO seen_posts (url, seen_at) VALUES (?, ?)",
+            [(url, now) for url in urls],
+        )
+        self.db.execute(
+            """
+            DELETE FROM seen_posts WHERE url NOT IN (
+                SELECT url FROM seen_posts ORDER BY seen_at DESC, rowid DESC LIMIT ?
+            )
+            """,
+            (self.max_posts,),
+        )
+        self.db.commit()
+
+    def __len__(self) -> int:
+        (count,) = self.db.execute("SELECT COUNT(*) FROM seen_posts").fetchone()
+        return count
+
+    def get_validators(self, url: str) -> Validators:
+        row = self.db.execute(
+            "SELECT etag, last_modified FROM validators WHERE url = ?", (url,)
+        ).fetchone()
+        return row if row else (None, None)
+
+    def set_validators(
+        self, url: str, etag: Optional[str], last_modified: Optional[str]
+    ):
+        self.db.execute(
+            "INSERT OR REPLACE INTO validators (url, etag, last_modified) VALUES (?, ?, ?)",
+            (url, etag, last_modified),
+        )
+        self.db.commit()
+
+    def close(self):
+        self.db.close()
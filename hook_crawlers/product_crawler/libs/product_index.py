@@ -0,0 +1,62 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Generic, Optional, Tuple, TypeVar
+
+ProductType = TypeVar("ProductType")
+
+
+class ProductIndex(Generic[ProductType]):
+    """
+    Products already fetched from or written to the API, keyed by source url.
+
+    One index lives per process, so spiders running together
+    don't look up the same product twice.
+    At most `max_size` products are kept, the least recently used go first,
+    and a product is looked up again after `ttl` seconds. 0 means no limit.
+    """
+
+    _products: "OrderedDict[str, Tuple[float, ProductType]]"
+
+    def __init__(
+        self,
+        max_size: int = 0,
+        ttl: float = 0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.max_size = max_size
+        self.ttl = ttl
+        self.clock = clock
+        self._products = OrderedDict()
+        # Used by the save threads of the pipelines.
+        self._lock = threading.Lock()
+
+    def get(self, source_url: str) -> Optional[ProductType]:
+        with self._lock:
+            entry = self._products.get(source_url)
+            if entry is None:
+                return None
+            stored_at, product = entry
+            if self.ttl and self.clock() - stored_at >= self.ttl:
+                del self._products[source_url]
+                return None
+            self._products.move_to_end(source_url)
+            return product
+
+    def put(self, source_url: str, product: ProductType) -> None:
+        with self._lock:
+            self._products[source_url] = (self.clock(), product)
+            self._products.move_to_end(source_url)
+            if self.max_size:
+                while len(self._products) > self.max_size:
+                    self._products.popitem(last=False)
+
+    def discard(self, source_url: str) -> None:
+        with self._lock:
+            self._products.pop(source_url, None)
+
+    def __contains__(self, source_url: str) -> bool:
+        return self.get(source_url) is not None
+
+    def __len__(self) -> int:
+        return len(self._products)
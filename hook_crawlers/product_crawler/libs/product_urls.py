@@ -0,0 +1,49 @@
+import re
+from typing import Dict, Pattern, Tuple
+from urllib.parse import urlparse
+
+from figure_parser.enums import BrandHost, NativeCategory
+
+# {brand host: (product path pattern, canonical url template)}
+CANONICAL_PRODUCT_URLS: Dict[str, Tuple[Pattern, str]] = {
+    # The slug and the query string don't change the product page. The language does,
+    # every language is saved as its own product, the pages without one are Japanese.
+    BrandHost.GSC: (
+        re.compile(r"^(?:/(?P<lang>[a-z]{2}))?/product/(?P<official_id>\d+)(?:/|$)"),
+        "https://{host}/{lang}/product/{official_id}",
+    ),
+    BrandHost.ALTER: (
+        re.compile(r"^/products/(?P<product_id>\d+)(?:/|$)"),
+        "https://{host}/products/{product_id}/",
+    ),
+    BrandHost.NATIVE: (
+        re.compile(
+            rf"^/(?P<category>{'|'.join(c.value for c in NativeCategory)})/(?P<product_id>\d+)(?:/|$)"
+        ),
+        "https://{host}/{category}/{product_id}/",
+    ),
+}
+# Values of the optional parts missing from a url.
+CANONICAL_DEFAULTS = {"lang": "ja"}
+
+
+def canonical_product_url(url: str) -> str:
+    """
+    The one url of a product page among its variants, see `CANONICAL_PRODUCT_URLS`.
+    Other urls are returned as is.
+    """
+    parsed = urlparse(url)
+    host = parsed.netloc.lower()
+    rule = CANONICAL_PRODUCT_URLS.get(host)
+    if rule is None:
+        return url
+
+    pattern, template = rule
+    result = pattern.search(parsed.path)
+    if result is None:
+        return url
+    parts = {
+        name: value if value is not None else CANONICAL_DEFAULTS[name]
+        for name, value in result.groupdict().items()
+    }
+    return template.format(host=host, **parts)
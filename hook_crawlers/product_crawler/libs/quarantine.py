@@ -0,0 +1,138 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, Optional
+
+
+@dataclass
+class QuarantinedItem:
+    url: str
+    stage: str
+    spider: str
+    error: str
+    payload: Optional[str]
+    quarantined_at: float
+    callback: Optional[str] = None
+    cb_kwargs: Optional[str] = None
+
+
+class Quarantine:
+    """
+    Urls that failed a stage of the crawl (parsing, validation, saving), with why.
+    One row per url and stage, the latest failure wins.
+    The raw response body is kept zlib compressed when given.
+    """
+
+    # Columns added after the table was first created.
+    _ADDED_COLUMNS = {"callback": "TEXT", "cb_kwargs": "TEXT", "body": "BLOB"}
+
+    def __init__(self, path: str) -> None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        # Also written by the save threads of `SaveProductInDatabasePipeline`,
+        # the connection is shared so every use of it holds `_lock`.
+        self.db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._lock = threading.Lock()
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS quarantine (
+                url TEXT NOT NULL,
+                stage TEXT NOT NULL,
+                spider TEXT NOT NULL,
+                error TEXT NOT NULL,
+                payload TEXT,
+                quarantined_at REAL NOT NULL,
+                PRIMARY KEY (url, stage)
+            )
+            """
+        )
+        columns = {row[1] for row in self.db.execute("PRAGMA table_info(quarantine)")}
+        for name, column_type in self._ADDED_COLUMNS.items():
+            if name not in columns:
+                self.db.execute(
+                    f"ALTER TABLE quarantine ADD COLUMN {name} {column_type}"
+                )
+        self.db.commit()
+
+    def add(
+        self,
+        url: str,
+        stage: str,
+        spider: str,
+        error: Any,
+        payload: Optional[Any] = None,
+        *,
+        callback: Optional[str] = None,
+        cb_kwargs: Optional[Dict[str, Any]] = None,
+        body: Optional[bytes] = None,
+    ):
+        with self._lock:
+            self.db.execute(
+                """
+                INSERT OR REPLACE INTO quarantine
+                (url, stage, spider, error, payload, quarantined_at, callback, cb_kwargs, body)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (
+                    url,
+                    stage,
+                    spider,
+                    error if isinstance(error, str) else json.dumps(error, default=str),
+                    None if payload is None else json.dumps(payload, default=str),
+                    time.time(),
+                    callback,
+                    None if cb_kwargs is None else json.dumps(cb_kwargs, default=str),
+                    None if body is None else zlib.compress(body),
+                ),
+            )
+            self.db.commit()
+
+    def entries(
+        self, stage: Optional[str] = None, spider: Optional[str] = None
+    ) -> Iterator[QuarantinedItem]:
+        query = (
+            "SELECT url, stage, spider, error, payload, quarantined_at, callback, cb_kwargs"
+            " FROM quarantine"
+        )
+        conditions, params = [], []
+        if stage:
+            conditions.append("stage = ?")
+            params.append(stage)
+        if spider:
+            conditions.append("spider = ?")
+            params.append(spider)
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        with self._lock:
+            rows = self.db.execute(
+                query + " ORDER BY quarantined_at", params
+            ).fetchall()
+        for row in rows:
+            yield QuarantinedItem(*row)
+
+    def body(self, url: str, stage: str) -> Optional[bytes]:
+        with self._lock:
+            row = self.db.execute(
+                "SELECT body FROM quarantine WHERE url = ? AND stage = ?", (url, stage)
+            ).fetchone()
+        if row is None or row[0] is None:
+            return None
+        return zlib.decompress(row[0])
+
+    def discard(self, url: str):
+        """Forget every failure of `url`."""
+        with self._lock:
+            self.db.execute("DELETE FROM quarantine WHERE url = ?", (url,))
+            self.db.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self.db.execute("SELECT COUNT(*) FROM quarantine").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self.db.close()
@@ -0,0 +1,130 @@
+"""
+JSON log lines written from a background thread, installed by `extensions.StructuredLogging`.
+
+The stream and file handlers of the root logger move behind a `QueueListener`,
+the reactor thread only puts the records in a queue. Other handlers,
+like the one counting the records for the `log_count/*` stats, stay where they are.
+"""
+import copy
+import json
+import logging
+import queue
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, List, Optional, Sequence
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(
+                timespec="milliseconds"
+            ),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        spider = getattr(record, "spider", None)
+        if spider is not None:
+            entry["spider"] = getattr(spider, "name", str(spider))
+        sample_rate = getattr(record, "sample_rate", None)
+        if sample_rate is not None:
+            entry["sample_rate"] = sample_rate
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc_info"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keep one in `1 / rate` of the records whose message starts with one of `prefixes`,
+    per prefix. Warnings and errors are always kept.
+    """
+
+    def __init__(self, rate: float, prefixes: Sequence[str]) -> None:
+        super().__init__()
+        self.rate = rate
+        self.every = round(1 / rate) if rate > 0 else 0
+        self.prefixes = tuple(prefixes)
+        self.counts: Dict[str, int] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or not isinstance(record.msg, str):
+            return True
+        prefix = next((p for p in self.prefixes if record.msg.startswith(p)), None)
+        if prefix is None:
+            return True
+        if not self.every:
+            return False
+
+        count = self.counts.get(prefix, 0)
+        self.counts[prefix] = count + 1
+        if count % self.every:
+            return False
+        record.sample_rate = self.rate
+        return True
+
+
+class LocalQueueHandler(QueueHandler):
+    """
+    The queue stays in the process, so the record isn't formatted here
+    like `QueueHandler` does, the handlers of the listener format it in its thread.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # The arguments may change before the listener gets to the record.
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+class BackgroundLogging:
+    def __init__(
+        self, formatter: logging.Formatter, filters: Sequence[logging.Filter] = ()
+    ) -> None:
+        self.formatter = formatter
+        self.filters = filters
+        self.logger: Optional[logging.Logger] = None
+        self.handlers: List[logging.Handler] = []
+        self.formatters: List[Optional[logging.Formatter]] = []
+        self.queue_handler: Optional[LocalQueueHandler] = None
+        self.listener: Optional[QueueListener] = None
+
+    def install(self, logger: Optional[logging.Logger] = None) -> bool:
+        """Move the stream handlers of `logger` (the root logger) to the background thread."""
+        logger = logger or logging.getLogger()
+        handlers = [h for h in logger.handlers if isinstance(h, logging.StreamHandler)]
+        if not handlers:
+            return False
+
+        self.logger = logger
+        self.handlers = handlers
+        self.formatters = [h.formatter for h in handlers]
+        log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+        self.queue_handler = LocalQueueHandler(log_queue)
+        # Don't queue the records every handler would drop.
+        self.queue_handler.setLevel(min(h.level for h in handlers))
+        for log_filter in self.filters:
+            self.queue_handler.addFilter(log_filter)
+        for handler in handlers:
+            handler.setFormatter(self.formatter)
+            logger.removeHandler(handler)
+
+        self.listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+        self.listener.start()
+        logger.addHandler(self.queue_handler)
+        return True
+
+    def uninstall(self):
+        """Write the queued records and put the handlers back."""
+        if self.logger is None or self.listener is None:
+            return
+        self.logger.removeHandler(self.queue_handler)
+        self.listener.stop()
+        for handler, formatter in zip(self.handlers, self.formatters):
+            handler.setFormatter(formatter)  # type: ignore
+            self.logger.addHandler(handler)
+        self.logger = self.listener = self.queue_handler = None
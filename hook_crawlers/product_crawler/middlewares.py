@@ -4,7 +4,14 @@
 # https://docs.scrapy.org/en/latest/topics/spider-middleware.html
 
 # useful for handling different item types with a single interface
+from typing import Any, Dict, Tuple
+
 from scrapy import signals
+from scrapy_proxies import RandomProxy
+
+from .services import get_quarantine
+
+_proxy_pools: Dict[Tuple[int, str], Dict[str, str]] = {}
 
 
 class GscCrawlerSpiderMiddleware:
@@ -99,3 +106,72 @@ class GscCrawlerDownloaderMiddleware:
 
     def spider_opened(self, spider):
         spider.logger.info("Spider opened: %s" % spider.name)
+
+
+class SharedRandomProxy(RandomProxy):
+    """
+    `RandomProxy` whose proxy pool is shared by every crawler in the process,
+    so a proxy removed by one spider is not retried by the others.
+    """
+
+    def __init__(self, settings):
+        super().__init__(settings)
+        pool_key = (self.mode, str(self.proxy_list))
+        self.proxies = _proxy_pools.setdefault(pool_key, self.proxies)
+
+
+class QuarantineFailedResponses:
+    """
+    Quarantine the responses a spider callback failed on (stage "parse"),
+    with the callback, its arguments and, with QUARANTINE_STORE_BODY, the raw body.
+    The `retry_failed` spider parses them again.
+    """
+
+    def __init__(self, quarantine, store_body: bool) -> None:
+        self.quarantine = quarantine
+        self.store_body = store_body
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(
+            get_quarantine(crawler.settings),
+            crawler.settings.getbool("QUARANTINE_STORE_BODY"),
+        )
+
+    def process_spider_exception(self, response, exception, spider):
+        origin = getattr(spider, "failure_origin", None)
+        if origin:
+            spider_name, callback, cb_kwargs = origin(response)
+        else:
+            spider_name, callback, cb_kwargs = self.callback_of(response, spider)
+
+        self.quarantine.add(
+            response.url,
+            stage="parse",
+            spider=spider_name,
+            error=repr(exception),
+            callback=callback,
+            cb_kwargs=cb_kwargs,
+            body=response.body if self.store_body else None,
+        )
+        spider.crawler.stats.inc_value("quarantine/parse", spider=spider)
+
+    @staticmethod
+    def callback_of(response, spider) -> Tuple[str, str, Dict[str, Any]]:
+        request = response.request
+        callback = request.callback if request else None
+        callback_name = getattr(callback, "__name__", callback) or "parse"
+        cb_kwargs = dict(request.cb_kwargs) if request else {}
+
+        # `CrawlSpider` schedules the rule requests with its `_callback`,
+        # which needs the rule index in the meta, so record the rule's own callback instead.
+        if (
+            callback_name == "_callback"
+            and "rule" in request.meta
+            and hasattr(spider, "_rules")
+        ):
+            rule = spider._rules[request.meta["rule"]]
+            callback_name = getattr(rule.callback, "__name__", None) or "parse"
+            cb_kwargs = {**rule.cb_kwargs, **cb_kwargs}
+
+        return spider.name, callback_name, cb_kwargs
@@ -3,70 +3,509 @@
 # Don't forget to add your pipeline to the ITEM_PIPELINES setting
 # See: https://docs.scrapy.org/en/latest/topics/item-pipeline.html
 
+import hashlib
 import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from contextlib import suppress
-from typing import Optional
+from io import BytesIO
+from typing import Dict, List, Optional
 
-from figure_hook_client import AuthenticatedClient
-from figure_hook_client.models import ProductReleaseInfoInDB
+from figure_hook_client.models import ProductInDBRich, ProductReleaseInfoInDB
 from figure_parser import ProductBase, Release
 from itemadapter import ItemAdapter
 from scrapy.exceptions import DropItem
+from scrapy.pipelines.files import S3FilesStore
 from scrapy.pipelines.images import ImagesPipeline
-
+from scrapy.settings import Settings
+from scrapy.utils.misc import md5sum
+from twisted.internet import threads
+from twisted.internet.defer import DeferredList, maybeDeferred
+
+from .images import (
+    CONTENT_TYPES,
+    ByteBudget,
+    Derivative,
+    available_formats,
+    deferred_from_future,
+    fingerprint,
+    make_derivatives,
+    upload_to_s3,
+)
+from .items import ReleaseDelay
 from .libs.checksums import generate_item_checksum
 from .libs.helpers import JapanDatetimeHelper
+from .libs.idempotency import product_idempotency_key, release_idempotency_key
+from .libs.image_index import DHASH_BANDS, ImageIndex
+from .libs.locks import KeyedLocks
+from .libs.official_ids import OfficialIdIndex
+from .libs.openapi import field_name
+from .libs.product_index import ProductIndex
+from .libs.product_urls import canonical_product_url
+from .libs.quarantine import Quarantine
+from .repositories.exceptions import (
+    CircuitOpenError,
+    HookApiException,
+    PayloadValidationError,
+)
 from .repositories.product_repository import ProductRepository
 from .repositories.release_repository import ReleaseRepository
-from .settings import HOOK_API_ACCESS_TOKEN, HOOK_API_HOST
+from .services import (
+    get_image_index,
+    get_official_id_index,
+    get_product_index,
+    get_product_repository,
+    get_quarantine,
+    get_release_repository,
+    get_url_locks,
+)
 from .usecases.release_usecase import (
     ReleaseComparingResult,
     ReleaseInfoGroupStatus,
     ReleaseUsecase,
 )
 
-api_client = AuthenticatedClient(
-    base_url=HOOK_API_HOST,
-    token=HOOK_API_ACCESS_TOKEN,
-    prefix="",
-    auth_header_name="x-api-token",
-)  # type: ignore
-
+logger = logging.getLogger(__name__)
+
+
+class S3ImagePipeline(ImagesPipeline):
+    """
+    Images are stored under the hash of their content, so identical images are uploaded once.
+    Images indexed by url in `ImageIndex` are neither downloaded nor checked in the store again
+    until IMAGES_EXPIRES days passed. Indexed images already in the `official_images` saved
+    in the database are left alone even then, only the images that changed are downloaded.
+
+    With IMAGES_DHASH_MAX_DISTANCE, an image whose perceptual hash is within that many bits
+    of an already stored image of the same size is stored as that image.
+
+    Derivatives (IMAGES_DERIVATIVE_SIZES x IMAGES_DERIVATIVE_FORMATS) are encoded
+    on a process pool of IMAGES_DERIVATIVE_WORKERS processes, with at most
+    IMAGES_DERIVATIVE_MAX_PENDING_MB of original images in flight.
+    The perceptual hashes are computed on that pool too.
+    Their paths are recorded in the `derivatives` of every image result.
+
+    The images of the product are replaced by the urls of the stored images,
+    the images failed to download keep their source url.
+    """
+
+    image_index: ImageIndex
+    product_repo: ProductRepository
+    product_index: ProductIndex[ProductInDBRich]
+    image_pool: Optional[ProcessPoolExecutor] = None
+
+    def __init__(self, store_uri, download_func=None, settings=None):
+        super().__init__(store_uri, download_func=download_func, settings=settings)
+        self.store_uri = store_uri
+        if isinstance(settings, dict) or settings is None:
+            settings = Settings(settings)
+        self.image_index = get_image_index(settings)
+        self.product_repo = get_product_repository(settings)
+        self.product_index = get_product_index(settings)
+
+        formats = settings.getlist("IMAGES_DERIVATIVE_FORMATS")
+        self.derivative_formats = available_formats(formats)
+        for fmt in set(f.upper() for f in formats) - set(self.derivative_formats):
+            logger.warning(f"Pillow can't write {fmt}, skip the {fmt} derivatives.")
+        self.derivative_sizes: Dict[str, int] = settings.getdict(
+            "IMAGES_DERIVATIVE_SIZES"
+        )
+        self.derivative_quality = settings.getint("IMAGES_DERIVATIVE_QUALITY", 80)
+        self.derivative_workers = settings.getint("IMAGES_DERIVATIVE_WORKERS", 2)
+        self.derivative_budget = ByteBudget(
+            settings.getint("IMAGES_DERIVATIVE_MAX_PENDING_MB", 64) * 1024 * 1024
+        )
+        self.multipart_chunk_size = (
+            settings.getint("IMAGES_MULTIPART_CHUNK_MB", 8) * 1024 * 1024
+        )
+        self.dhash_max_distance = min(
+            settings.getint("IMAGES_DHASH_MAX_DISTANCE", 0), DHASH_BANDS - 1
+        )
 
-product_repo = ProductRepository(api_client)
-release_repo = ReleaseRepository(api_client)
+    def open_spider(self, spider):
+        super().open_spider(spider)
+        if self.derivative_formats or self.dhash_max_distance:
+            self.image_pool = ProcessPoolExecutor(max_workers=self.derivative_workers)
 
+    def close_spider(self, spider):
+        # Every image is processed before the spider closes, don't wait on the reactor
+        # for the worker processes to exit.
+        if self.image_pool:
+            self.image_pool.shutdown(wait=False)
+            self.image_pool = None
 
-class S3ImagePipeline(ImagesPipeline):  # pragma: no cover
     def process_item(self, item: ProductBase, spider):
+        if isinstance(item, ReleaseDelay):
+            return item
+
         if not isinstance(item, ProductBase):
             raise DropItem(f"Type of item: {type(item)}, expected type: {ProductBase}.")
 
-        return super().process_item(item.dict(), spider)
+        # The saved product is looked up off the reactor, the api calls may be throttled.
+        dfd = threads.deferToThread(self.get_saved_product, item.url, spider)
+        # `ProductBaseAdapter` lets the images pipeline work on the product itself.
+        dfd.addCallback(
+            lambda _: super(S3ImagePipeline, self).process_item(item, spider)
+        )
+        return dfd
+
+    def get_saved_product(self, source_url: str, spider) -> Optional[ProductInDBRich]:
+        """
+        The product saved in the database, kept in the product index
+        for `SaveProductInDatabasePipeline`. `None` when it can't be told.
+        """
+        canonical_url = canonical_product_url(source_url)
+        product = self.product_index.get(canonical_url)
+        if product is not None:
+            return product
+
+        try:
+            product = self.product_repo.get_product_by_url(source_url=source_url)
+        except Exception as e:
+            # The images are checked against the index alone.
+            spider.logger.warning(
+                f'Failed to look up the saved images of the product. (source: "{source_url}")'
+            )
+            spider.logger.warning(e)
+            return None
+        if product is not None:
+            self.product_index.put(canonical_url, product)
+        return product
+
+    def saved_images(self, item) -> List[str]:
+        """`official_images` of the product saved in the database."""
+        if item is None:
+            return []
+        product = self.product_index.get(canonical_product_url(item.url))
+        if product is None:
+            return []
+        return product.official_images or []
+
+    def media_to_download(self, request, info, *, item=None):
+        # The content-addressed path is only known after the download,
+        # images missing from the index are downloaded without checking the store.
+        indexed = self.image_index.get(request.url)
+        if indexed is None:
+            return None
+
+        max_age_secs = self.expires * 24 * 60 * 60
+        if (
+            max_age_secs
+            and time.time() - indexed.stored_at > max_age_secs
+            and self.stored_url(indexed.path) not in self.saved_images(item)
+        ):
+            return None
+
+        self.inc_stats(info.spider, "indexed")
+        return {
+            "url": request.url,
+            "path": indexed.path,
+            "checksum": indexed.checksum,
+            "status": "uptodate",
+            "derivatives": self.image_index.get_derivatives(indexed.path),
+        }
+
+    def media_downloaded(self, response, request, info, *, item=None):
+        if not self.dhash_max_distance or self.image_pool is None:
+            return self.store_downloaded(response, request, info, item=item)
+
+        dfd = deferred_from_future(self.image_pool.submit(fingerprint, response.body))
+        dfd.addCallback(self.match_near_duplicate, request)
+        dfd.addCallback(
+            lambda _: self.store_downloaded(response, request, info, item=item)
+        )
+        return dfd
+
+    def match_near_duplicate(self, image_fingerprint, request):
+        """Name the image after a stored image of the same size and a near perceptual hash."""
+        image_dhash, size = image_fingerprint
+        request.meta["image_dhash"] = image_dhash
+        request.meta["image_size"] = size
+        nearest = self.image_index.nearest(image_dhash, self.dhash_max_distance, size)
+        if nearest:
+            nearest_path, _ = nearest
+            request.meta["image_content_key"] = os.path.splitext(
+                os.path.basename(nearest_path)
+            )[0]
+            request.meta["image_near_duplicate"] = True
+
+    def store_downloaded(self, response, request, info, *, item=None):
+        result = super().media_downloaded(response, request, info, item=item)
+        if self.image_pool is None or not self.derivative_formats:
+            return result
+
+        # Near-duplicates share the derivatives of the stored image.
+        derivatives = self.image_index.get_derivatives(result["path"])
+        if derivatives:
+            result["derivatives"] = derivatives
+            return result
+
+        body = response.body
+        dfd = self.derivative_budget.acquire(len(body))
+        dfd.addCallback(
+            lambda _: deferred_from_future(
+                self.image_pool.submit(  # type: ignore
+                    make_derivatives,
+                    body,
+                    self.derivative_sizes,
+                    self.derivative_formats,
+                    self.derivative_quality,
+                )
+            )
+        )
+
+        def release(value):
+            self.derivative_budget.release(len(body))
+            return value
+
+        def on_failure(failure):
+            logger.error(
+                f'Failed to make the image derivatives. (url: "{request.url}")',
+                exc_info=(failure.type, failure.value, failure.getTracebackObject()),
+                extra={"spider": info.spider},
+            )
+            return result
+
+        dfd.addBoth(release)
+        dfd.addCallback(self.store_derivatives, result, info)
+        dfd.addErrback(on_failure)
+        return dfd
+
+    def store_derivatives(self, derivatives: List[Derivative], result: dict, info):
+        digest = os.path.splitext(os.path.basename(result["path"]))[0]
+        paths: Dict[str, str] = {}
+        uploads = []
+        for name, ext, data in derivatives:
+            path = f"derivatives/{digest}/{name}.{ext}"
+            paths[f"{name}.{ext}"] = path
+            if not self.image_index.is_stored(path):
+                uploads.append(
+                    self.persist_derivative(
+                        path, BytesIO(data), info, CONTENT_TYPES[ext]
+                    )
+                )
+
+        def on_stored(_):
+            for path in paths.values():
+                self.image_index.mark_stored(path)
+            self.image_index.put_derivatives(result["path"], paths)
+            result["derivatives"] = paths
+            return result
+
+        dfd = DeferredList(uploads, fireOnOneErrback=True, consumeErrors=True)
+        dfd.addCallback(on_stored)
+        return dfd
+
+    def persist_derivative(self, path: str, buf: BytesIO, info, content_type: str):
+        if isinstance(self.store, S3FilesStore):
+            return threads.deferToThread(
+                upload_to_s3,
+                self.store,
+                path,
+                buf,
+                content_type,
+                self.multipart_chunk_size,
+            )
+        return maybeDeferred(
+            self.store.persist_file,
+            path,
+            buf,
+            info,
+            headers={"Content-Type": content_type},
+        )
+
+    def content_key(self, request, response) -> str:
+        """
+        Digest naming the stored image: the sha1 of the downloaded bytes,
+        or the digest of a stored near-identical image, see `match_near_duplicate`.
+        """
+        key = request.meta.get("image_content_key")
+        if key:
+            return key
+
+        key = hashlib.sha1(response.body).hexdigest()
+        request.meta["image_content_key"] = key
+        return key
+
+    def file_path(self, request, response=None, info=None, *, item=None):
+        if response is None:
+            return super().file_path(request, response, info, item=item)
+        return f"full/{self.content_key(request, response)}.jpg"
+
+    def thumb_path(self, request, thumb_id, response=None, info=None, *, item=None):
+        if response is None:
+            return super().thumb_path(request, thumb_id, response, info, item=item)
+        return f"thumbs/{thumb_id}/{self.content_key(request, response)}.jpg"
+
+    def image_downloaded(self, response, request, info, *, item=None):
+        checksum = None
+        for path, image, buf in self.get_images(response, request, info, item=item):
+            if checksum is None:
+                buf.seek(0)
+                checksum = md5sum(buf)
+                if request.meta.get("image_near_duplicate"):
+                    self.inc_stats(info.spider, "near_duplicate")
+                elif "image_dhash" in request.meta:
+                    self.image_index.put_dhash(
+                        path, request.meta["image_dhash"], request.meta["image_size"]
+                    )
+            if self.image_index.is_stored(path):
+                self.inc_stats(info.spider, "deduplicated")
+                continue
+
+            width, height = image.size
+            self.store.persist_file(
+                path,
+                buf,
+                info,
+                meta={"width": width, "height": height},
+                headers={"Content-Type": "image/jpeg"},
+            )
+            self.image_index.mark_stored(path)
+        return checksum
+
+    def stored_url(self, path: str) -> str:
+        """Url of a stored image, the S3 objects are public-read."""
+        if isinstance(self.store, S3FilesStore):
+            return f"https://{self.store.bucket}.s3.amazonaws.com/{self.store.prefix}{path}"
+        return f'{self.store_uri.rstrip("/")}/{path}'
 
     def item_completed(self, results, item, info) -> ProductBase:
         """
         Replace the images url in place.
         """
+        for ok, result in results:
+            if ok and result["status"] == "downloaded":
+                self.image_index.put(result["url"], result["checksum"], result["path"])
+
         with suppress(KeyError):
-            ItemAdapter(item)[self.images_urls_field] = [x for ok, x in results if ok]  # type: ignore
-        return ProductBase.parse_obj(item)
+            adapter = ItemAdapter(item)
+            # The results are in the order of the requests, one for each image url.
+            adapter[self.images_urls_field] = [
+                self.stored_url(result["path"]) if ok else url
+                for url, (ok, result) in zip(adapter[self.images_urls_field], results)
+            ]
+        return item
 
 
 class SaveProductInDatabasePipeline:
+    """
+    Products whose payload breaks the api's schema are quarantined without calling the api,
+    the rejected fields are counted in the `validation/rejected/<field>` stats.
+    Products the api failed to save are quarantined too, for the `retry_failed` spider.
+
+    The api calls wait while they're throttled or backed off, so the items are saved in
+    `HOOK_API_WRITE_CONCURRENCY` threads instead of the reactor thread, 0 saves them
+    on the calling thread for the replays, where no reactor runs.
+    The items of one product url are saved one at a time, and every create is sent
+    with an idempotency key, so racing items or retried writes don't create duplicates.
+    """
+
+    product_repo: ProductRepository
+    release_repo: ReleaseRepository
+    product_index: ProductIndex[ProductInDBRich]
+    official_id_index: OfficialIdIndex
+    quarantine: Quarantine
+    url_locks: KeyedLocks
+    executor: Optional[ThreadPoolExecutor]
+
+    def __init__(
+        self,
+        product_repo: ProductRepository,
+        release_repo: ReleaseRepository,
+        product_index: ProductIndex[ProductInDBRich],
+        official_id_index: OfficialIdIndex,
+        quarantine: Quarantine,
+        write_concurrency: int = 1,
+        url_locks: Optional[KeyedLocks] = None,
+    ) -> None:
+        self.product_repo = product_repo
+        self.release_repo = release_repo
+        self.product_index = product_index
+        self.official_id_index = official_id_index
+        self.quarantine = quarantine
+        # `KeyedLocks` is falsy while nothing is held.
+        self.url_locks = KeyedLocks() if url_locks is None else url_locks
+        self.executor = None
+        if write_concurrency > 0:
+            self.executor = ThreadPoolExecutor(
+                write_concurrency, thread_name_prefix="save_product"
+            )
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(
+            product_repo=get_product_repository(crawler.settings),
+            release_repo=get_release_repository(crawler.settings),
+            product_index=get_product_index(crawler.settings),
+            official_id_index=get_official_id_index(crawler.settings),
+            quarantine=get_quarantine(crawler.settings),
+            write_concurrency=crawler.settings.getint("HOOK_API_WRITE_CONCURRENCY", 1),
+            url_locks=get_url_locks(),
+        )
+
+    def close_spider(self, spider):
+        # Every item is processed before the spider closes, the threads are idle.
+        if self.executor:
+            self.executor.shutdown(wait=False)
+
+    def quarantine_invalid_payload(
+        self, item: ProductBase, error: PayloadValidationError, spider
+    ):
+        self.quarantine.add(
+            item.url,
+            stage="validation",
+            spider=spider.name,
+            error=error.errors,
+            payload=item.dict(),
+        )
+        stats = spider.crawler.stats
+        stats.inc_value("validation/rejected", spider=spider)
+        for field in dict.fromkeys(field_name(path) for path, _ in error.errors):
+            stats.inc_value(f"validation/rejected/{field}", spider=spider)
+        spider.logger.warning(
+            f'Quarantined the product breaking the {error.schema} schema. (source: "{item.url}", errors: {error.errors})'
+        )
+
+    def quarantine_failure(self, item: ProductBase, error: Exception, spider):
+        self.quarantine.add(
+            item.url,
+            stage="save",
+            spider=spider.name,
+            error=repr(error),
+            payload=item.dict(),
+        )
+        spider.crawler.stats.inc_value("quarantine/save", spider=spider)
+
+    def get_product_in_db(self, source_url: str) -> Optional[ProductInDBRich]:
+        canonical_url = canonical_product_url(source_url)
+        product = self.product_index.get(canonical_url)
+        if product is None:
+            product = self.product_repo.get_product_by_url(source_url=source_url)
+            if product is not None:
+                self.product_index.put(canonical_url, product)
+                self.official_id_index.add(canonical_url)
+        return product
+
     def persist_product(self, item: ProductBase, checksum: str, spider):
-        created_product = product_repo.create_product(
-            product_base=item, checksum=checksum
+        created_product = self.product_repo.create_product(
+            product_base=item,
+            checksum=checksum,
+            idempotency_key=product_idempotency_key(item.url),
         )
+        self.product_index.put(item.url, created_product)
+        self.official_id_index.add(item.url)
         spider.log(
             "Successfully save data in database."
             f'(id: {created_product.id}, source: "{item.url}", name: "{created_product.name}")',
             logging.INFO,
         )
 
-        for release in item.releases:
-            created_release = release_repo.create_release_own_by_product(
-                product_id=created_product.id, release=release
+        for index, release in enumerate(item.releases):
+            created_release = self.release_repo.create_release_own_by_product(
+                product_id=created_product.id,
+                release=release,
+                idempotency_key=release_idempotency_key(item.url, index, release),
             )
             spider.log(
                 "Successfully save release-info in database."
@@ -75,18 +514,21 @@ class SaveProductInDatabasePipeline:
             )
 
     def update_product(self, product_id: int, item: ProductBase, checksum: str, spider):
-        updated_product = product_repo.update_product(
+        updated_product = self.product_repo.update_product(
             product_id=product_id,
             product_base=item,
             checksum=checksum,
         )
+        self.product_index.put(item.url, updated_product)
         spider.log(
             f'Successfully update data in database. (source: "{item.url}", id: {updated_product.id})',
             logging.INFO,
         )
 
     def update_releases(self, product_id: int, item: ProductBase, spider):
-        db_releases = release_repo.get_releases_by_product_id(product_id=product_id)
+        db_releases = self.release_repo.get_releases_by_product_id(
+            product_id=product_id
+        )
 
         group_status = ReleaseUsecase.get_release_group_comparing_result(
             incoming_releases=item.releases, existing_releases=db_releases
@@ -101,10 +543,15 @@ class SaveProductInDatabasePipeline:
 
         elif group_status is not ReleaseInfoGroupStatus.SAME:
             if group_status is ReleaseInfoGroupStatus.NEW_RELEASE:
-                for release in item.releases[len(db_releases) :]:
+                for index, release in enumerate(
+                    item.releases[len(db_releases) :], start=len(db_releases)
+                ):
                     self.persist_new_release(
                         product_id=product_id,
                         release=release,
+                        idempotency_key=release_idempotency_key(
+                            item.url, index, release
+                        ),
                     )
 
             elif group_status is ReleaseInfoGroupStatus.CHANGE:
@@ -115,9 +562,11 @@ class SaveProductInDatabasePipeline:
                         db_release=existing_release,
                     )
 
-    def persist_new_release(self, product_id: int, release: Release):
-        release_repo.create_release_own_by_product(
-            product_id=product_id, release=release
+    def persist_new_release(
+        self, product_id: int, release: Release, idempotency_key: Optional[str] = None
+    ):
+        self.release_repo.create_release_own_by_product(
+            product_id=product_id, release=release, idempotency_key=idempotency_key
         )
 
     def sync_release(
@@ -136,19 +585,39 @@ class SaveProductInDatabasePipeline:
             incoming_release=in_release,
             status_indicator=status_indicator,
         )
-        release_repo.update_release(
+        self.release_repo.update_release(
             product_id=product_id,
             release_id=db_release.id,
             release=release_update,
         )
 
     def process_item(self, item: ProductBase, spider):
-        assert isinstance(item, ProductBase)
+        if not isinstance(item, ProductBase):
+            return item
+
+        if self.executor is None:
+            return self.save_item(item, spider)
+        return deferred_from_future(self.executor.submit(self.save_item, item, spider))
+
+    def save_item(self, item: ProductBase, spider):
+        with self.url_locks.hold(canonical_product_url(item.url)):
+            return self._save_item(item, spider)
+
+    def _save_item(self, item: ProductBase, spider):
         if is_announcement_spider(spider):
             item = fill_announced_date(item)
 
+        try:
+            product_in_db = self.get_product_in_db(item.url)
+        except Exception as e:
+            self.quarantine_failure(item, e, spider)
+            raise
+        canonical_url = canonical_product_url(item.url)
+        if canonical_url != item.url:
+            # Products are saved under their canonical url,
+            # the products saved under another url move to it on their next update.
+            item.url = canonical_url
         product_meta_checksum = generate_item_checksum(item)
-        product_in_db = product_repo.get_product_by_url(source_url=item.url)
 
         if not product_in_db:
             try:
@@ -156,14 +625,23 @@ class SaveProductInDatabasePipeline:
                     item=item, checksum=product_meta_checksum, spider=spider
                 )
 
+            except PayloadValidationError as e:
+                self.quarantine_invalid_payload(item, e, spider)
+                raise DropItem(f'Invalid product. (source: "{item.url}")')
+
             except Exception as e:
                 spider.logger.error(
                     f'Exception when saving new product to database. (source: "{item.url}")'
                 )
                 spider.logger.error(e)
+                self.quarantine_failure(item, e, spider)
+                raise DropItem(f'Failed to save the product. (source: "{item.url}")')
 
             return item
 
+        # Failed products are dropped once the releases are synced,
+        # their listing summary isn't recorded so the next crawl fetches them again.
+        failed = False
         if product_in_db.checksum != product_meta_checksum:
             try:
                 self.update_product(
@@ -176,11 +654,17 @@ class SaveProductInDatabasePipeline:
                     product_id=product_in_db.id, item=item, spider=spider
                 )
 
+            except PayloadValidationError as e:
+                self.quarantine_invalid_payload(item, e, spider)
+                failed = True
+
             except Exception as e:
                 spider.logger.error(
                     f'Exception when updating product in database. (source: "{item.url}")'
                 )
                 spider.logger.error(e)
+                self.quarantine_failure(item, e, spider)
+                failed = True
 
         try:
             self.update_releases(product_id=product_in_db.id, item=item, spider=spider)
@@ -190,9 +674,148 @@ class SaveProductInDatabasePipeline:
                 f'(source: "{item.url}", product_id: {product_in_db.id})'
             )
             spider.logger.error(e)
+            self.quarantine_failure(item, e, spider)
+            failed = True
+
+        if failed:
+            raise DropItem(f'Failed to update the product. (source: "{item.url}")')
+        return item
+
+
+class ApplyReleaseDelayPipeline:
+    """
+    Patch the release date announced by a `ReleaseDelay` without fetching the product page.
+    The product page is requested instead when the delayed release can't be told
+    or the api fails, and the JAN is filled in when the stored product has none.
+
+    The delays are applied in a thread like `SaveProductInDatabasePipeline` saves products,
+    unless `HOOK_API_WRITE_CONCURRENCY` is 0.
+    """
+
+    product_repo: ProductRepository
+    release_repo: ReleaseRepository
+    product_index: ProductIndex[ProductInDBRich]
+    executor: Optional[ThreadPoolExecutor]
+
+    def __init__(
+        self,
+        product_repo: ProductRepository,
+        release_repo: ReleaseRepository,
+        product_index: ProductIndex[ProductInDBRich],
+        write_concurrency: int = 1,
+    ) -> None:
+        self.product_repo = product_repo
+        self.release_repo = release_repo
+        self.product_index = product_index
+        self.executor = None
+        if write_concurrency > 0:
+            # One at a time, the delays of a post may patch the same release.
+            self.executor = ThreadPoolExecutor(
+                1, thread_name_prefix="apply_release_delay"
+            )
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(
+            product_repo=get_product_repository(crawler.settings),
+            release_repo=get_release_repository(crawler.settings),
+            product_index=get_product_index(crawler.settings),
+            write_concurrency=crawler.settings.getint("HOOK_API_WRITE_CONCURRENCY", 1),
+        )
 
+    def close_spider(self, spider):
+        # Every item is processed before the spider closes, the thread is idle.
+        if self.executor:
+            self.executor.shutdown(wait=False)
+
+    def process_item(self, item, spider):
+        if not isinstance(item, ReleaseDelay):
+            return item
+
+        if self.executor is None:
+            return self.fall_back_unless_applied(
+                self.apply_release_delay(item, spider), item, spider
+            )
+        return deferred_from_future(
+            self.executor.submit(self.apply_release_delay, item, spider)
+        ).addCallback(self.fall_back_unless_applied, item, spider)
+
+    def fall_back_unless_applied(self, applied: bool, item: ReleaseDelay, spider):
+        """Request the product page on the reactor thread when the delay wasn't applied."""
+        if not applied:
+            self.fall_back_to_product_page(item, spider)
+            raise DropItem(
+                f'The release delay isn\'t applied, fetch the product page instead. (source: "{item.url}")'
+            )
         return item
 
+    def apply_release_delay(self, item: ReleaseDelay, spider) -> bool:
+        """False when the delayed release can't be told, or the api failed on it."""
+        try:
+            return self._apply_release_delay(item, spider)
+        except (HookApiException, CircuitOpenError) as e:
+            # The product page goes through `SaveProductInDatabasePipeline`,
+            # which quarantines the product if the api keeps failing.
+            spider.logger.warning(
+                f'Failed to apply the release delay. (source: "{item.url}", error: {e!r})'
+            )
+            return False
+
+    def _apply_release_delay(self, item: ReleaseDelay, spider) -> bool:
+        canonical_url = canonical_product_url(item.url)
+        product = self.product_index.get(canonical_url)
+        if product is None:
+            product = self.product_repo.get_product_by_url(source_url=item.url)
+        if product is None:
+            raise DropItem(
+                f'The delayed product is not in database. (source: "{item.url}")'
+            )
+
+        if item.jan and not product.jan:
+            product = self.product_repo.update_product_jan(
+                product=product, jan=item.jan
+            )
+            self.product_index.put(canonical_url, product)
+            spider.logger.info(
+                f'Successfully fill in the JAN of the delayed product. (source: "{item.url}", jan: "{item.jan}")'
+            )
+
+        db_releases = self.release_repo.get_releases_by_product_id(
+            product_id=product.id
+        )
+        db_release = ReleaseUsecase.get_delayed_release(db_releases)
+        if db_release is None:
+            return False
+
+        in_release = Release(
+            release_date=item.release_date,
+            price=db_release.price,
+            tax_including=db_release.tax_including,
+        )
+        status_indicator = ReleaseUsecase.get_release_comparing_results(
+            in_release=in_release, db_release=db_release
+        )
+        if ReleaseComparingResult.IGNORE in status_indicator:
+            return True
+
+        release_update = ReleaseUsecase.build_release_patch_data_by_status(
+            incoming_release=in_release, status_indicator=status_indicator
+        )
+        self.release_repo.update_release(
+            product_id=product.id, release_id=db_release.id, release=release_update
+        )
+        spider.logger.info(
+            "Successfully apply the release delay. "
+            f'(source: "{item.url}", release_id: {db_release.id}, release_date: {item.release_date})'
+        )
+        return True
+
+    @staticmethod
+    def fall_back_to_product_page(item: ReleaseDelay, spider):
+        product_request = getattr(spider, "product_request", None)
+        if product_request and spider.crawler.engine:
+            spider.crawler.engine.crawl(product_request(item.url, item.jan))
+
 
 def get_last_release(product_item: ProductBase) -> Optional[Release]:
     releases = product_item.releases
@@ -0,0 +1,177 @@
+"""
+Re-parse archived responses with the spiders' callbacks, without any network access.
+
+Archived responses (see `product_crawler.httpcache`) are parsed on a process pool
+and the parsed items go through the item pipelines of this process.
+"""
+import json
+import logging
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Iterable, Iterator, List, Optional, Tuple
+
+from scrapy import Request
+from scrapy.crawler import Crawler
+from scrapy.pipelines import ItemPipelineManager
+from scrapy.pipelines.media import MediaPipeline
+from scrapy.settings import Settings
+from scrapy.spiderloader import SpiderLoader
+from scrapy.utils.misc import load_object
+from scrapy.utils.project import data_path, get_project_settings
+
+from .httpcache import ArchivedResponse, ResponseArchive, build_response
+
+logger = logging.getLogger(__name__)
+
+ReplayFailure = Tuple[str, str]
+
+
+@dataclass
+class ReplayFilter:
+    """
+    `archived_in` is the year the response was archived in, not a year of the product.
+    Narrow the products down with `url_pattern` instead.
+    """
+
+    callback: str = "parse_product"
+    archived_in: Optional[int] = None
+    url_pattern: Optional[str] = None
+
+    def select(self, archive: ResponseArchive) -> Iterator[ArchivedResponse]:
+        since = until = None
+        if self.archived_in:
+            since = datetime(self.archived_in, 1, 1).timestamp()
+            until = datetime(self.archived_in + 1, 1, 1).timestamp()
+
+        url_regex = re.compile(self.url_pattern) if self.url_pattern else None
+        for entry in archive.entries(callback=self.callback, since=since, until=until):
+            if url_regex and not url_regex.search(entry.url):
+                continue
+            yield entry
+
+
+@dataclass
+class ReplayResult:
+    spider_name: str
+    parsed_count: int = 0
+    item_count: int = 0
+    failures: List[ReplayFailure] = field(default_factory=list)
+
+
+# State of the pool workers, set by `_init_worker`.
+_worker_spider: Any = None
+_worker_archive: Optional[ResponseArchive] = None
+
+
+def _init_worker(spider_name: str, archive_path: str):
+    global _worker_spider, _worker_archive
+    settings = get_project_settings()
+    spidercls = SpiderLoader.from_settings(settings).load(spider_name)
+    _worker_spider = spidercls()
+    _worker_archive = ResponseArchive(archive_path)
+
+
+def _parse_entries(entries: List[ArchivedResponse]) -> Tuple[List, List[ReplayFailure]]:
+    assert _worker_archive is not None
+    items: List = []
+    failures: List[ReplayFailure] = []
+    for entry in entries:
+        try:
+            response = build_response(entry, _worker_archive.read_blob(entry.blob))
+            callback = getattr(_worker_spider, entry.callback or "parse")
+            cb_kwargs = json.loads(entry.cb_kwargs or "{}")
+            for output in callback(response, **cb_kwargs) or ():
+                # Follow-up requests would need the network.
+                if not isinstance(output, Request):
+                    items.append(output)
+        except Exception as e:
+            failures.append((entry.url, repr(e)))
+    return items, failures
+
+
+def _chunks(entries: Iterable[ArchivedResponse], size: int):
+    chunk: List[ArchivedResponse] = []
+    for entry in entries:
+        chunk.append(entry)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def offline_pipelines(settings: Settings) -> dict:
+    """`ITEM_PIPELINES` without the media pipelines, they download files."""
+    pipelines = {}
+    for path, order in settings.getdict("ITEM_PIPELINES").items():
+        if issubclass(load_object(path), MediaPipeline):
+            logger.warning(f'Skip "{path}" while replaying, it needs the network.')
+            continue
+        pipelines[path] = order
+    return pipelines
+
+
+class Replayer:
+    def __init__(
+        self, settings: Settings, workers: Optional[int] = None, chunk_size: int = 50
+    ) -> None:
+        self.settings = settings.copy()
+        self.settings.set("ITEM_PIPELINES", offline_pipelines(settings), "cmdline")
+        # No reactor runs, the items are saved on this thread and counted as they go.
+        self.settings.set("HOOK_API_WRITE_CONCURRENCY", 0, "cmdline")
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self.spider_loader = SpiderLoader.from_settings(self.settings)
+
+    def archive_path(self, spider_name: str) -> str:
+        return os.path.join(data_path(self.settings["HTTPCACHE_DIR"]), spider_name)
+
+    def replay(self, spider_name: str, replay_filter: ReplayFilter) -> ReplayResult:
+        result = ReplayResult(spider_name=spider_name)
+        archive_path = self.archive_path(spider_name)
+        if not os.path.isfile(os.path.join(archive_path, "index.sqlite")):
+            logger.warning(f'No archive for "{spider_name}". (path: "{archive_path}")')
+            return result
+
+        crawler = Crawler(self.spider_loader.load(spider_name), self.settings)
+        crawler.spider = crawler._create_spider()
+        pipelines = ItemPipelineManager.from_crawler(crawler)
+        pipelines.open_spider(crawler.spider)
+
+        archive = ResponseArchive(archive_path)
+        try:
+            with ProcessPoolExecutor(
+                max_workers=self.workers,
+                initializer=_init_worker,
+                initargs=(spider_name, archive_path),
+            ) as executor:
+                chunks = list(_chunks(replay_filter.select(archive), self.chunk_size))
+                for chunk, (items, failures) in zip(
+                    chunks, executor.map(_parse_entries, chunks)
+                ):
+                    result.parsed_count += len(chunk)
+                    result.failures.extend(failures)
+                    for item in items:
+                        self._process_item(pipelines, item, crawler.spider, result)
+        finally:
+            archive.close()
+            pipelines.close_spider(crawler.spider)
+        return result
+
+    @staticmethod
+    def _process_item(
+        pipelines: ItemPipelineManager, item, spider, result: ReplayResult
+    ):
+        # Without media pipelines and with the items saved on this thread,
+        # the deferred chain fires synchronously.
+        def on_success(_):
+            result.item_count += 1
+
+        def on_failure(failure):
+            url = getattr(item, "url", "")
+            result.failures.append((url, repr(failure.value)))
+
+        pipelines.process_item(item, spider).addCallbacks(on_success, on_failure)
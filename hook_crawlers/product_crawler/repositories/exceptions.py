@@ -1,4 +1,4 @@
-from typing import Any, Mapping
+from typing import Any, List, Mapping, Tuple
 
 
 class ApiException(Exception):
@@ -12,3 +12,20 @@ class HookApiException(ApiException):
     ) -> None:
         ext_info = {"request_id": headers.get("X-Request-ID")}
         super().__init__(status_code, detail, **ext_info)
+
+
+class PayloadValidationError(Exception):
+    """The payload breaks the api's schema, it wasn't sent."""
+
+    def __init__(self, schema: str, errors: List[Tuple[str, str]]) -> None:
+        super().__init__({"schema": schema, "errors": errors})
+        self.schema = schema
+        self.errors = errors
+
+
+class CircuitOpenError(Exception):
+    """The api kept failing, calls aren't sent until the circuit closes."""
+
+    def __init__(self, retry_in: float) -> None:
+        super().__init__({"retry_in": round(retry_in, 1)})
+        self.retry_in = retry_in
@@ -17,7 +17,11 @@ from figure_hook_client.models import (
 )
 from figure_parser import ProductBase
 
-from .exceptions import HookApiException
+from ..libs.idempotency import with_idempotency_key
+from ..libs.openapi import OpenApiSchemas
+from ..libs.product_urls import canonical_product_url
+from .exceptions import HookApiException, PayloadValidationError
+from .throttling import ApiCallPolicy, call_with_policy
 
 ProductType = TypeVar("ProductType", covariant=True)
 
@@ -27,7 +31,11 @@ class ProductRepositoryInterface(Protocol[ProductType]):
         ...
 
     def create_product(
-        self, *, product_base: ProductBase, checksum: str
+        self,
+        *,
+        product_base: ProductBase,
+        checksum: str,
+        idempotency_key: Optional[str] = None,
     ) -> ProductType:
         ...
 
@@ -36,17 +44,50 @@ class ProductRepositoryInterface(Protocol[ProductType]):
     ) -> ProductType:
         ...
 
+    def update_product_jan(self, *, product: ProductType, jan: str) -> ProductType:
+        ...
+
 
 class ProductRepository(ProductRepositoryInterface[ProductInDBRich]):
     api_client: AuthenticatedClient
+    schemas: Optional[OpenApiSchemas]
+    call_policy: Optional[ApiCallPolicy]
     logger: Logger
 
-    def __init__(self, api_client: AuthenticatedClient) -> None:
+    def __init__(
+        self,
+        api_client: AuthenticatedClient,
+        schemas: Optional[OpenApiSchemas] = None,
+        call_policy: Optional[ApiCallPolicy] = None,
+    ) -> None:
         self.api_client = api_client
+        self.schemas = schemas
+        self.call_policy = call_policy
+
+    def validate_payload(self, schema_name: str, payload) -> None:
+        """Raise `PayloadValidationError` before sending a payload the api would reject."""
+        if self.schemas is None or schema_name not in self.schemas:
+            return
+        errors = self.schemas.validate(schema_name, payload.to_dict())
+        if errors:
+            raise PayloadValidationError(schema_name, errors)
 
     def get_product_by_url(self, *, source_url: str) -> Optional[ProductInDBRich]:
-        resp = get_products_api_v1_products_get.sync_detailed(
-            client=self.api_client, source_url=source_url
+        """Look up the product by its canonical url, then by `source_url` as is."""
+        canonical_url = canonical_product_url(source_url)
+        product = self._get_product_by_url(canonical_url)
+        if product is None and canonical_url != source_url:
+            # Products saved before their urls were canonicalized.
+            product = self._get_product_by_url(source_url)
+        return product
+
+    def _get_product_by_url(self, source_url: str) -> Optional[ProductInDBRich]:
+        resp = call_with_policy(
+            self.call_policy,
+            lambda: get_products_api_v1_products_get.sync_detailed(
+                client=self.api_client, source_url=source_url
+            ),
+            idempotent=True,
         )
 
         products = resp.parsed
@@ -69,13 +110,23 @@ class ProductRepository(ProductRepositoryInterface[ProductInDBRich]):
         return None
 
     def create_product(
-        self, *, product_base: ProductBase, checksum: str
+        self,
+        *,
+        product_base: ProductBase,
+        checksum: str,
+        idempotency_key: Optional[str] = None,
     ) -> ProductInDBRich:
         product_create = product_base_to_product_create(
             product_base=product_base, product_checksum=checksum
         )
-        resp = create_product_api_v1_products_post.sync_detailed(
-            client=self.api_client, json_body=product_create
+        self.validate_payload("ProductCreate", product_create)
+        client = with_idempotency_key(self.api_client, idempotency_key)
+        resp = call_with_policy(
+            self.call_policy,
+            lambda: create_product_api_v1_products_post.sync_detailed(
+                client=client, json_body=product_create
+            ),
+            idempotent=idempotency_key is not None,
         )
 
         created_product = resp.parsed
@@ -99,8 +150,27 @@ class ProductRepository(ProductRepositoryInterface[ProductInDBRich]):
         product_update = product_base_to_product_update(
             product_base=product_base, product_checksum=checksum
         )
-        resp = update_product_api_v1_products_product_id_put.sync_detailed(
-            product_id, client=self.api_client, json_body=product_update
+        return self._put_product(product_id, product_update)
+
+    def update_product_jan(
+        self, *, product: ProductInDBRich, jan: str
+    ) -> ProductInDBRich:
+        """Fill in the JAN of a stored product, the checksum stays the stored one."""
+        product_update = ProductUpdate.from_dict(
+            {"jan": jan, "checksum": product.checksum}
+        )
+        return self._put_product(product.id, product_update)
+
+    def _put_product(
+        self, product_id: int, product_update: ProductUpdate
+    ) -> ProductInDBRich:
+        self.validate_payload("ProductUpdate", product_update)
+        resp = call_with_policy(
+            self.call_policy,
+            lambda: update_product_api_v1_products_product_id_put.sync_detailed(
+                product_id, client=self.api_client, json_body=product_update
+            ),
+            idempotent=True,
         )
 
         updated_product = resp.parsed
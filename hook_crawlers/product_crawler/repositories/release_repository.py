@@ -1,4 +1,4 @@
-from typing import List, Protocol, TypeVar
+from typing import List, Optional, Protocol, TypeVar
 
 from figure_hook_client import AuthenticatedClient
 from figure_hook_client.api.product import (
@@ -14,7 +14,9 @@ from figure_hook_client.models import (
 )
 from figure_parser import Release
 
+from ..libs.idempotency import with_idempotency_key
 from .exceptions import HookApiException
+from .throttling import ApiCallPolicy, call_with_policy
 
 ReleaseType = TypeVar("ReleaseType")
 ReleaseUpdateType = TypeVar("ReleaseUpdateType", contravariant=True)
@@ -25,7 +27,11 @@ class ReleaseRepositoryInterface(Protocol[ReleaseType, ReleaseUpdateType]):
         ...
 
     def create_release_own_by_product(
-        self, *, product_id: int, release: Release
+        self,
+        *,
+        product_id: int,
+        release: Release,
+        idempotency_key: Optional[str] = None,
     ) -> ReleaseType:
         ...
 
@@ -39,16 +45,26 @@ class ReleaseRepository(
     ReleaseRepositoryInterface[ProductReleaseInfoInDB, ProductReleaseInfoUpdate]
 ):
     api_client: AuthenticatedClient
+    call_policy: Optional[ApiCallPolicy]
 
-    def __init__(self, api_client: AuthenticatedClient) -> None:
+    def __init__(
+        self,
+        api_client: AuthenticatedClient,
+        call_policy: Optional[ApiCallPolicy] = None,
+    ) -> None:
         self.api_client = api_client
+        self.call_policy = call_policy
 
     def get_releases_by_product_id(
         self, *, product_id: int
     ) -> List[ProductReleaseInfoInDB]:
-        resp = get_product_release_infos_api_v1_products_product_id_release_infos_get.sync_detailed(
-            product_id=product_id,
-            client=self.api_client,
+        resp = call_with_policy(
+            self.call_policy,
+            lambda: get_product_release_infos_api_v1_products_product_id_release_infos_get.sync_detailed(
+                product_id=product_id,
+                client=self.api_client,
+            ),
+            idempotent=True,
         )
 
         releases = resp.parsed
@@ -67,11 +83,20 @@ class ReleaseRepository(
         )
 
     def create_release_own_by_product(
-        self, *, product_id: int, release: Release
+        self,
+        *,
+        product_id: int,
+        release: Release,
+        idempotency_key: Optional[str] = None,
     ) -> ProductReleaseInfoInDB:
         release_create = release_to_release_create(release)
-        resp = create_product_release_info_api_v1_products_product_id_release_infos_post.sync_detailed(
-            product_id=product_id, client=self.api_client, json_body=release_create
+        client = with_idempotency_key(self.api_client, idempotency_key)
+        resp = call_with_policy(
+            self.call_policy,
+            lambda: create_product_release_info_api_v1_products_product_id_release_infos_post.sync_detailed(
+                product_id=product_id, client=client, json_body=release_create
+            ),
+            idempotent=idempotency_key is not None,
         )
 
         created_release = resp.parsed
@@ -92,11 +117,16 @@ class ReleaseRepository(
     def update_release(
         self, *, product_id: int, release_id: int, release: ProductReleaseInfoUpdate
     ) -> ProductReleaseInfoInDB:
-        resp = patch_product_release_info_api_v1_products_product_id_release_infos_release_id_patch.sync_detailed(
-            client=self.api_client,
-            product_id=product_id,
-            release_id=release_id,
-            json_body=release,
+        resp = call_with_policy(
+            self.call_policy,
+            lambda: patch_product_release_info_api_v1_products_product_id_release_infos_release_id_patch.sync_detailed(
+                client=self.api_client,
+                product_id=product_id,
+                release_id=release_id,
+                json_body=release,
+            ),
+            # The patch sets fields to values, sending it twice changes nothing.
+            idempotent=True,
         )
         updated_release = resp.parsed
         if isinstance(updated_release, ProductReleaseInfoInDB):
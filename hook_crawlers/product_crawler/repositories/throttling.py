@@ -0,0 +1,216 @@
+"""
+Client side throttling of the Hook API calls, shared by every repository.
+
+Calls wait for a token of `TokenBucket` before being sent. A 429 or 503 answer pauses
+the bucket for its `Retry-After`, so every call backs off, not only the one rejected.
+A `Retry-After` longer than `retry_after_max` isn't waited for, the call fails instead.
+Idempotent calls are retried with jittered exponential backoff on server errors
+and transport errors, a 429 is retried for any call since the api didn't process it.
+`CircuitBreaker` fails the calls fast while the api keeps failing.
+"""
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from http import HTTPStatus
+from typing import Callable, Mapping, Optional, TypeVar
+
+from httpx import TransportError
+
+from .exceptions import CircuitOpenError
+
+ResponseType = TypeVar("ResponseType")
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+def parse_retry_after(headers: Mapping[str, str]) -> Optional[float]:
+    """Seconds to wait from a `Retry-After` header, in seconds or as an HTTP date."""
+    value = headers.get("Retry-After") or headers.get("retry-after")
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(retry_at.timestamp() - time.time(), 0.0)
+
+
+class TokenBucket:
+    """`rate` tokens a second, at most `burst` saved up. A rate of 0 means no limit."""
+
+    def __init__(
+        self,
+        rate: float,
+        burst: int,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ) -> None:
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.clock = clock
+        self.sleep = sleep
+        self.tokens = float(self.burst)
+        self.updated_at = clock()
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a token is available."""
+        while True:
+            with self.lock:
+                now = self.clock()
+                wait = self.paused_until - now
+                if wait <= 0:
+                    if not self.rate:
+                        return
+                    self.tokens = min(
+                        self.burst, self.tokens + (now - self.updated_at) * self.rate
+                    )
+                    self.updated_at = now
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+                    wait = (1 - self.tokens) / self.rate
+            self.sleep(wait)
+
+    def pause(self, secs: float):
+        """Hold every call for `secs`, e.g. for the `Retry-After` of a 429."""
+        with self.lock:
+            self.paused_until = max(self.paused_until, self.clock() + secs)
+
+
+class CircuitBreaker:
+    """
+    Open after `failure_threshold` failures in a row, calls fail fast for `reset_secs`.
+    Then one call is let through, its success closes the circuit, its failure opens it again.
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int,
+        reset_secs: float,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.failure_threshold = failure_threshold
+        self.reset_secs = reset_secs
+        self.clock = clock
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.trial_in_flight = False
+        self.lock = threading.Lock()
+
+    @property
+    def is_open(self) -> bool:
+        return self.opened_at is not None
+
+    def before_call(self):
+        """Raise `CircuitOpenError` when the call mustn't be sent."""
+        with self.lock:
+            if self.opened_at is None:
+                return
+            retry_in = self.opened_at + self.reset_secs - self.clock()
+            if retry_in > 0 or self.trial_in_flight:
+                raise CircuitOpenError(max(retry_in, 0.0))
+            self.trial_in_flight = True
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_in_flight = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            self.trial_in_flight = False
+            if self.opened_at is not None or (
+                self.failure_threshold and self.failures >= self.failure_threshold
+            ):
+                self.opened_at = self.clock()
+
+
+class ApiCallPolicy:
+    def __init__(
+        self,
+        bucket: TokenBucket,
+        breaker: CircuitBreaker,
+        retry_times: int = 3,
+        backoff_base: float = 0.5,
+        backoff_max: float = 30,
+        retry_after_max: float = 300,
+        sleep: Callable[[float], None] = time.sleep,
+    ) -> None:
+        self.bucket = bucket
+        self.breaker = breaker
+        self.retry_times = retry_times
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.retry_after_max = retry_after_max
+        self.sleep = sleep
+
+    def backoff(self, attempt: int) -> float:
+        """Full jitter, so the retries of concurrent calls don't line up."""
+        return random.uniform(
+            0, min(self.backoff_max, self.backoff_base * 2**attempt)
+        )
+
+    def call(
+        self, send: Callable[[], ResponseType], *, idempotent: bool
+    ) -> ResponseType:
+        """
+        The response of `send()`, retried while it's worth it.
+        The last response is returned as is when the retries run out,
+        the repositories raise `HookApiException` for it like for any failed response.
+        """
+        attempt = 0
+        while True:
+            self.breaker.before_call()
+            self.bucket.acquire()
+            try:
+                resp = send()
+            except TransportError:
+                self.breaker.record_failure()
+                if not idempotent or attempt >= self.retry_times:
+                    raise
+                self.sleep(self.backoff(attempt))
+                attempt += 1
+                continue
+
+            status = int(resp.status_code)  # type: ignore
+            if status not in RETRY_STATUSES:
+                self.breaker.record_success()
+                return resp
+
+            retry_after = parse_retry_after(resp.headers)  # type: ignore
+            if status == HTTPStatus.TOO_MANY_REQUESTS:
+                # Throttled, the api is up.
+                self.breaker.record_success()
+            else:
+                self.breaker.record_failure()
+            if retry_after is not None and retry_after > self.retry_after_max:
+                # Don't hold every call that long, the caller quarantines this one.
+                return resp
+            if retry_after is not None:
+                self.bucket.pause(retry_after)
+
+            retryable = idempotent or status == HTTPStatus.TOO_MANY_REQUESTS
+            if not retryable or attempt >= self.retry_times:
+                return resp
+            if retry_after is None:
+                self.sleep(self.backoff(attempt))
+            attempt += 1
+
+
+def call_with_policy(
+    policy: Optional[ApiCallPolicy],
+    send: Callable[[], ResponseType],
+    *,
+    idempotent: bool,
+) -> ResponseType:
+    if policy is None:
+        return send()
+    return policy.call(send, idempotent=idempotent)
@@ -0,0 +1,52 @@
+import shutil
+import tempfile
+from typing import Optional
+
+from scrapy.core.scheduler import Scheduler
+from scrapy.http import Request
+
+
+class MemoryBoundedScheduler(Scheduler):
+    """
+    Keep at most `SCHEDULER_MEMORY_QUEUE_LIMIT` requests in memory (0 means no limit),
+    the overflow goes to the disk queue. The disk queue lives in `JOBDIR` when it is set,
+    otherwise in a temporary directory removed when the spider closes.
+
+    Requests in memory are always dequeued first.
+    """
+
+    memory_queue_limit: int = 0
+    _tmp_jobdir: Optional[str] = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        scheduler = super().from_crawler(crawler)
+        scheduler.memory_queue_limit = crawler.settings.getint(
+            "SCHEDULER_MEMORY_QUEUE_LIMIT"
+        )
+        if scheduler.memory_queue_limit and scheduler.dqdir is None:
+            scheduler._tmp_jobdir = tempfile.mkdtemp(prefix="product_crawler-queue-")
+            scheduler.dqdir = scheduler._dqdir(scheduler._tmp_jobdir)
+        return scheduler
+
+    def enqueue_request(self, request: Request) -> bool:
+        if not self.memory_queue_limit:
+            return super().enqueue_request(request)
+
+        if not request.dont_filter and self.df.request_seen(request):
+            self.df.log(request, self.spider)
+            return False
+
+        if len(self.mqs) < self.memory_queue_limit or not self._dqpush(request):
+            self._mqpush(request)
+            self.stats.inc_value("scheduler/enqueued/memory", spider=self.spider)
+        else:
+            self.stats.inc_value("scheduler/enqueued/disk", spider=self.spider)
+        self.stats.inc_value("scheduler/enqueued", spider=self.spider)
+        return True
+
+    def close(self, reason: str):
+        result = super().close(reason)
+        if self._tmp_jobdir:
+            shutil.rmtree(self._tmp_jobdir, ignore_errors=True)
+        return result
@@ -0,0 +1,222 @@
+"""
+Process-wide objects shared by spiders and pipelines.
+
+Everything here is built on first use and cached,
+so importing spider modules stays cheap and crawlers running in the same process
+reuse the same api client, repositories and factory.
+"""
+import os
+from functools import lru_cache
+from typing import TYPE_CHECKING, Optional
+
+from scrapy.settings import BaseSettings
+from scrapy.utils.project import data_path
+
+from .libs.checkpoints import CrawlCheckpoint
+from .libs.image_index import ImageIndex
+from .libs.listing_store import ListingSummaryStore
+from .libs.locks import KeyedLocks
+from .libs.official_ids import OfficialIdIndex
+from .libs.openapi import OpenApiSchemas
+from .libs.product_index import ProductIndex
+from .libs.quarantine import Quarantine
+
+if TYPE_CHECKING:  # pragma: no cover
+    from figure_hook_client import AuthenticatedClient
+    from figure_hook_client.models import ProductInDBRich
+    from figure_parser.factories import GeneralBs4ProductFactory
+
+    from .repositories.product_repository import ProductRepository
+    from .repositories.release_repository import ReleaseRepository
+    from .repositories.throttling import ApiCallPolicy
+
+
+@lru_cache(maxsize=None)
+def get_general_factory() -> "GeneralBs4ProductFactory":
+    from figure_parser.factories import GeneralBs4ProductFactory
+
+    return GeneralBs4ProductFactory.create_factory()
+
+
+@lru_cache(maxsize=None)
+def _get_api_client(host: str, token: str) -> "AuthenticatedClient":
+    from figure_hook_client import AuthenticatedClient
+
+    return AuthenticatedClient(
+        base_url=host,
+        token=token,
+        prefix="",
+        auth_header_name="x-api-token",
+    )  # type: ignore
+
+
+def get_api_client(settings: BaseSettings) -> "AuthenticatedClient":
+    return _get_api_client(
+        settings.get("HOOK_API_HOST"), settings.get("HOOK_API_ACCESS_TOKEN")
+    )
+
+
+def get_api_call_policy(settings: BaseSettings) -> "ApiCallPolicy":
+    """One rate limit and circuit breaker for every call to the api host."""
+    return _get_api_call_policy(
+        settings.get("HOOK_API_HOST"),
+        settings.getfloat("HOOK_API_RATE_LIMIT"),
+        settings.getint("HOOK_API_RATE_BURST"),
+        settings.getint("HOOK_API_RETRY_TIMES"),
+        settings.getfloat("HOOK_API_RETRY_BACKOFF_BASE"),
+        settings.getfloat("HOOK_API_RETRY_BACKOFF_MAX"),
+        settings.getfloat("HOOK_API_RETRY_AFTER_MAX", 300),
+        settings.getint("HOOK_API_CIRCUIT_FAILURE_THRESHOLD"),
+        settings.getfloat("HOOK_API_CIRCUIT_RESET_SECS"),
+    )
+
+
+@lru_cache(maxsize=None)
+def _get_api_call_policy(
+    host: str,
+    rate: float,
+    burst: int,
+    retry_times: int,
+    backoff_base: float,
+    backoff_max: float,
+    retry_after_max: float,
+    failure_threshold: int,
+    reset_secs: float,
+) -> "ApiCallPolicy":
+    from .repositories.throttling import ApiCallPolicy, CircuitBreaker, TokenBucket
+
+    return ApiCallPolicy(
+        TokenBucket(rate, burst),
+        CircuitBreaker(failure_threshold, reset_secs),
+        retry_times=retry_times,
+        backoff_base=backoff_base,
+        backoff_max=backoff_max,
+        retry_after_max=retry_after_max,
+    )
+
+
+def get_product_repository(settings: BaseSettings) -> "ProductRepository":
+    return _get_product_repository(
+        settings.get("HOOK_API_HOST"),
+        settings.get("HOOK_API_ACCESS_TOKEN"),
+        settings.get("HOOK_API_OPENAPI_PATH"),
+        get_api_call_policy(settings),
+    )
+
+
+def get_release_repository(settings: BaseSettings) -> "ReleaseRepository":
+    return _get_release_repository(
+        settings.get("HOOK_API_HOST"),
+        settings.get("HOOK_API_ACCESS_TOKEN"),
+        get_api_call_policy(settings),
+    )
+
+
+def get_product_index(settings: BaseSettings) -> ProductIndex["ProductInDBRich"]:
+    return _get_product_index(
+        settings.getint("HOOK_API_PRODUCT_INDEX_MAX_SIZE"),
+        settings.getfloat("HOOK_API_PRODUCT_INDEX_TTL"),
+    )
+
+
+@lru_cache(maxsize=None)
+def _get_product_index(max_size: int, ttl: float) -> ProductIndex["ProductInDBRich"]:
+    return ProductIndex(max_size, ttl)
+
+
+@lru_cache(maxsize=None)
+def get_url_locks() -> KeyedLocks:
+    """Product urls being saved, shared by every crawler of the process."""
+    return KeyedLocks()
+
+
+def get_listing_store(settings: BaseSettings) -> ListingSummaryStore:
+    return _get_listing_store(
+        os.path.join(data_path(settings["CRAWLER_STATE_DIR"]), "listing.sqlite")
+    )
+
+
+@lru_cache(maxsize=None)
+def _get_listing_store(path: str) -> ListingSummaryStore:
+    return ListingSummaryStore(path)
+
+
+def get_image_index(settings: BaseSettings) -> ImageIndex:
+    return _get_image_index(
+        os.path.join(data_path(settings["CRAWLER_STATE_DIR"]), "images.sqlite")
+    )
+
+
+@lru_cache(maxsize=None)
+def _get_image_index(path: str) -> ImageIndex:
+    return ImageIndex(path)
+
+
+def get_official_id_index(settings: BaseSettings) -> OfficialIdIndex:
+    return _get_official_id_index(
+        os.path.join(data_path(settings["CRAWLER_STATE_DIR"]), "official_ids.sqlite")
+    )
+
+
+@lru_cache(maxsize=None)
+def _get_official_id_index(path: str) -> OfficialIdIndex:
+    return OfficialIdIndex(path)
+
+
+@lru_cache(maxsize=None)
+def _get_product_repository(
+    host: str,
+    token: str,
+    openapi_path: Optional[str] = None,
+    call_policy: Optional["ApiCallPolicy"] = None,
+) -> "ProductRepository":
+    from .repositories.product_repository import ProductRepository
+
+    return ProductRepository(
+        _get_api_client(host, token),
+        schemas=_get_openapi_schemas(openapi_path),
+        call_policy=call_policy,
+    )
+
+
+@lru_cache(maxsize=None)
+def _get_openapi_schemas(path: Optional[str]) -> Optional[OpenApiSchemas]:
+    if not path:
+        return None
+    if not os.path.isfile(path):
+        # A configured spec that's missing would silently turn the validation off.
+        raise FileNotFoundError(
+            f'No OpenAPI spec at HOOK_API_OPENAPI_PATH. (path: "{path}")'
+        )
+    return OpenApiSchemas.from_file(path)
+
+
+def get_quarantine(settings: BaseSettings) -> Quarantine:
+    return _get_quarantine(
+        os.path.join(data_path(settings["CRAWLER_STATE_DIR"]), "quarantine.sqlite")
+    )
+
+
+@lru_cache(maxsize=None)
+def _get_quarantine(path: str) -> Quarantine:
+    return Quarantine(path)
+
+
+def get_checkpoint(settings: BaseSettings) -> CrawlCheckpoint:
+    return _get_checkpoint(
+        os.path.join(data_path(settings["CRAWLER_STATE_DIR"]), "checkpoints.sqlite")
+    )
+
+
+@lru_cache(maxsize=None)
+def _get_checkpoint(path: str) -> CrawlCheckpoint:
+    return CrawlCheckpoint(path)
+
+
+@lru_cache(maxsize=None)
+def _get_release_repository(
+    host: str, token: str, call_policy: Optional["ApiCallPolicy"] = None
+) -> "ReleaseRepository":
+    from .repositories.release_repository import ReleaseRepository
+
+    return ReleaseRepository(_get_api_client(host, token), call_policy=call_policy)
@@ -13,8 +13,14 @@ BOT_NAME = "product_crawler"
 
 SPIDER_MODULES = ["product_crawler.spiders"]
 NEWSPIDER_MODULE = "product_crawler.spiders"
+COMMANDS_MODULE = "product_crawler.commands"
 
 
+# Product pages are fingerprinted by their canonical url, see `product_crawler.libs.product_urls`.
+REQUEST_FINGERPRINTER_CLASS = (
+    "product_crawler.fingerprinter.CanonicalUrlRequestFingerprinter"
+)
+
 # Crawl responsibly by identifying yourself (and your website) on the user-agent
 # SER_AGENT = 'gsc_crawler (+http://www.yourdomain.com)'
 
@@ -49,6 +55,12 @@ ROBOTSTXT_OBEY = False
 # SPIDER_MIDDLEWARES = {
 #    'gsc_crawler.middlewares.GscCrawlerSpiderMiddleware': 543,
 # }
+SPIDER_MIDDLEWARES = {
+    # Below HttpErrorMiddleware (50), HTTP errors are not parsing failures.
+    "product_crawler.middlewares.QuarantineFailedResponses": 45,
+}
+# Failed urls are quarantined in CRAWLER_STATE_DIR, re-process them with `scrapy crawl retry_failed`.
+QUARANTINE_STORE_BODY = os.getenv("QUARANTINE_STORE_BODY", "true").lower() == "true"
 
 # Enable or disable downloader middlewares
 # See https://docs.scrapy.org/en/latest/topics/downloader-middleware.html
@@ -61,6 +73,10 @@ ROBOTSTXT_OBEY = False
 # EXTENSIONS = {
 #    'scrapy.extensions.telnet.TelnetConsole': None,
 # }
+EXTENSIONS = {
+    "product_crawler.extensions.StructuredLogging": 0,
+    "product_crawler.extensions.TracemallocStats": 500,
+}
 
 # Configure item pipelines
 # See https://docs.scrapy.org/en/latest/topics/item-pipeline.html
@@ -68,6 +84,7 @@ ITEM_PIPELINES = {
     # 'product_crawler.pipelines.S3ImagePipeline': 100,
     # "scrapy.pipelines.images.ImagesPipeline": 150,
     # "product_crawler.pipelines.RestoreProductFromDictPipeline": 200,
+    "product_crawler.pipelines.ApplyReleaseDelayPipeline": 300,
     "product_crawler.pipelines.SaveProductInDatabasePipeline": 400,
 }
 
@@ -86,11 +103,34 @@ ITEM_PIPELINES = {
 
 # Enable and configure HTTP caching (disabled by default)
 # See https://docs.scrapy.org/en/latest/topics/downloader-middleware.html# ttpcache-middleware-settings
-# TTPCACHE_ENABLED = True
-# TTPCACHE_EXPIRATION_SECS = 0
-# TTPCACHE_DIR = 'httpcache'
-# TTPCACHE_IGNORE_HTTP_CODES = []
-# TTPCACHE_STORAGE = 'scrapy.extensions.httpcache.FilesystemCacheStorage'
+# Responses are archived by content hash, see `product_crawler.httpcache`.
+HTTPCACHE_ENABLED = os.getenv("HTTPCACHE_ENABLED", "false").lower() == "true"
+HTTPCACHE_EXPIRATION_SECS = 60 * 60 * 20
+HTTPCACHE_DIR = os.getenv("HTTPCACHE_DIR", "httpcache")
+HTTPCACHE_IGNORE_HTTP_CODES = [500, 503, 504, 400, 403, 404, 408]
+HTTPCACHE_STORAGE = "product_crawler.httpcache.ContentAddressedCacheStorage"
+# {url regex: secs}, overrides HTTPCACHE_EXPIRATION_SECS for matching urls.
+HTTPCACHE_ARCHIVE_TTL = {}
+HTTPCACHE_ARCHIVE_MAX_BYTES = int(os.getenv("HTTPCACHE_ARCHIVE_MAX_BYTES", 0))
+HTTPCACHE_ARCHIVE_COMPRESS_LEVEL = 6
+HTTPCACHE_ARCHIVE_RETENTION_DAYS = 180
+
+# Skip product pages whose listing entry didn't change, see `ProductSpider.product_requests`.
+# Products are still recrawled after LISTING_RECRAWL_DAYS.
+CRAWLER_STATE_DIR = os.getenv("CRAWLER_STATE_DIR", "state")
+LISTING_CHANGE_DETECTION_ENABLED = (
+    os.getenv("LISTING_CHANGE_DETECTION_ENABLED", "true").lower() == "true"
+)
+LISTING_RECRAWL_DAYS = 7
+
+# Resume interrupted crawls, see `ProductSpider`. Checkpoints are kept in CRAWLER_STATE_DIR.
+CRAWL_CHECKPOINTS_ENABLED = (
+    os.getenv("CRAWL_CHECKPOINTS_ENABLED", "true").lower() == "true"
+)
+
+# `gsc_delay_post_watch` spider.
+GSC_DELAY_POST_POLL_INTERVAL = int(os.getenv("GSC_DELAY_POST_POLL_INTERVAL", 60))
+GSC_DELAY_POST_SNAPSHOT_SIZE = 1000
 
 # scrapy-proxies settings
 
@@ -99,7 +139,7 @@ RETRY_HTTP_CODES = [500, 503, 504, 400, 403, 404, 408]
 
 DOWNLOADER_MIDDLEWARES = {
     "scrapy.downloadermiddlewares.retry.RetryMiddleware": 90,
-    "scrapy_proxies.RandomProxy": 100,
+    "product_crawler.middlewares.SharedRandomProxy": 100,
     "scrapy.downloadermiddlewares.httpproxy.HttpProxyMiddleware": 110,
 }
 
@@ -107,13 +147,57 @@ PROXY_LIST = os.getenv("PROXY_LIST", "proxy-list.txt")
 PROXY_MODE = 0
 
 
+# Memory bounded mode, for running in a container with a memory limit.
+SCHEDULER = "product_crawler.scheduler.MemoryBoundedScheduler"
+# The frontier of full crawls overflows to disk instead of growing in memory.
+SCHEDULER_MEMORY_QUEUE_LIMIT = int(os.getenv("SCHEDULER_MEMORY_QUEUE_LIMIT", 1000))
+
+MEMORY_BOUNDED_MODE = os.getenv("MEMORY_BOUNDED_MODE", "false").lower() == "true"
+if MEMORY_BOUNDED_MODE:
+    MEMORY_LIMIT_MB = int(os.getenv("MEMORY_LIMIT_MB", 512))
+    SCHEDULER_MEMORY_QUEUE_LIMIT = 500
+    CONCURRENT_ITEMS = 10
+    SCRAPER_SLOT_MAX_ACTIVE_SIZE = 2 * 1024 * 1024
+    MEMUSAGE_ENABLED = True
+    MEMUSAGE_WARNING_MB = int(MEMORY_LIMIT_MB * 0.75)
+    MEMUSAGE_LIMIT_MB = int(MEMORY_LIMIT_MB * 0.9)
+
+# Periodic tracemalloc snapshots, the top allocators are saved in crawl stats.
+TRACEMALLOC_ENABLED = os.getenv("TRACEMALLOC_ENABLED", "false").lower() == "true"
+TRACEMALLOC_INTERVAL = 60
+TRACEMALLOC_TOP = 10
+
+
 # logger settings
 LOG_LEVEL = "INFO"
+# JSON log lines written from a background thread, see `product_crawler.extensions.StructuredLogging`.
+# Only LOG_SAMPLE_RATE of the per-item messages below are written, warnings and errors always are.
+LOG_JSON_ENABLED = os.getenv("LOG_JSON_ENABLED", "false").lower() == "true"
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", 0.1))
+LOG_SAMPLED_MESSAGES = [
+    'Parsing "',
+    "Successfully save data in database.",
+    "Successfully save release-info in database.",
+    "Successfully update data in database.",
+    "Successfully apply the release delay.",
+]
 
 IMAGES_STORE = os.getenv("AWS_S3_IMAGE_BUCKET")
 IMAGES_STORE_S3_ACL = "public-read"
 IMAGES_URLS_FIELD = "images"
 IMAGES_RESULT_FIELD = "image_s3_urls"
+# Resized and re-encoded copies of the images, see `product_crawler.images`.
+# {name: max width and height}, formats Pillow can't write are skipped.
+IMAGES_DERIVATIVE_SIZES = {"small": 320, "medium": 800}
+# Add "AVIF" with a Pillow built to encode it, Pillow 9 can't.
+IMAGES_DERIVATIVE_FORMATS = ["WEBP"]
+IMAGES_DERIVATIVE_QUALITY = 80
+IMAGES_DERIVATIVE_WORKERS = int(os.getenv("IMAGES_DERIVATIVE_WORKERS", 2))
+IMAGES_DERIVATIVE_MAX_PENDING_MB = 64
+IMAGES_MULTIPART_CHUNK_MB = 8
+# Store images of the same size within this many bits of perceptual hash (dHash) as one image,
+# 0 disables, 7 at most.
+IMAGES_DHASH_MAX_DISTANCE = 0
 
 # S3 settings for image pipeline
 AWS_ACCESS_KEY_ID = os.getenv("AWS_ACCESS_KEY_ID")
@@ -122,3 +206,28 @@ AWS_SECRET_ACCESS_KEY = os.getenv("AWS_SECRET_ACCESS_KEY")
 # AWS_VERIFY = True  # or True (None by default)
 HOOK_API_HOST = os.getenv("HOOK_API_HOST", "http://localhost:8000")
 HOOK_API_ACCESS_TOKEN = os.getenv("HOOK_API_ACCESS_TOKEN", "token")
+# Product payloads breaking this spec are quarantined instead of sent, see `product_crawler.libs.openapi`.
+# Validation is off when unset, e.g. `temp/openapi.json` pulled by `bin/start_api_mock_server.sh`.
+# The crawl fails to start when the configured file doesn't exist.
+HOOK_API_OPENAPI_PATH = os.getenv("HOOK_API_OPENAPI_PATH")
+
+# Client side limit of the api calls, 0 means no limit. A 429 or 503 pauses every call
+# for its Retry-After. Idempotent calls are retried with jittered exponential backoff,
+# the calls fail fast for HOOK_API_CIRCUIT_RESET_SECS after too many failures in a row.
+# A call asked to wait longer than HOOK_API_RETRY_AFTER_MAX fails and is quarantined.
+HOOK_API_RATE_LIMIT = float(os.getenv("HOOK_API_RATE_LIMIT", 20))
+HOOK_API_RATE_BURST = int(os.getenv("HOOK_API_RATE_BURST", 20))
+HOOK_API_RETRY_TIMES = 3
+HOOK_API_RETRY_BACKOFF_BASE = 0.5
+HOOK_API_RETRY_BACKOFF_MAX = 30
+HOOK_API_RETRY_AFTER_MAX = 300
+HOOK_API_CIRCUIT_FAILURE_THRESHOLD = 5
+HOOK_API_CIRCUIT_RESET_SECS = 30
+# Threads saving products through the api, the throttled calls wait there instead of
+# on the reactor. The items of one product url are saved in turn, 0 is for the replays.
+HOOK_API_WRITE_CONCURRENCY = int(os.getenv("HOOK_API_WRITE_CONCURRENCY", 1))
+# Products looked up from the api are kept in memory for the crawlers of the process.
+# The least recently used go past HOOK_API_PRODUCT_INDEX_MAX_SIZE, and every product
+# is looked up again after HOOK_API_PRODUCT_INDEX_TTL seconds, e.g. in the long watches.
+HOOK_API_PRODUCT_INDEX_MAX_SIZE = 10000
+HOOK_API_PRODUCT_INDEX_TTL = 3600
@@ -5,11 +5,11 @@
 import re
 from abc import ABC
 from datetime import date
-from typing import Optional, Union
+from typing import Any, Dict, List, Optional, Sequence, Set, Union
 from urllib.parse import urljoin
 
 import scrapy
-from bs4 import BeautifulSoup
+from figure_parser import ProductBase
 from figure_parser.enums import (
     AlterCategory,
     BrandHost,
@@ -17,21 +17,226 @@ from figure_parser.enums import (
     GSCLang,
     NativeCategory,
 )
-from figure_parser.factories import GeneralBs4ProductFactory
-from scrapy.linkextractors import LinkExtractor
+from itemadapter import ItemAdapter
+from scrapy import signals
 from scrapy.spiders import CrawlSpider
 
+from ..libs.checkpoints import CrawlCheckpoint, job_key
 from ..libs.helpers import JapanDatetimeHelper
+from ..libs.listing import ListingExtractor
+from ..libs.listing_store import ListingSummaryStore
+from ..libs.official_ids import parse_official_id
+from ..libs.pages import parse_html
+from ..libs.product_urls import canonical_product_url
+from ..services import get_checkpoint, get_general_factory, get_listing_store
+from ..utils import split_arg
 from ..utils import valid_year as _valid_year
 
-general_factory = GeneralBs4ProductFactory.create_factory()
+GSC_LISTING = ListingExtractor(
+    ".hitItem:not(.shimeproduct) > .hitBox > a",
+    summary_items_xpath="//div[contains(@class, 'hitItem') and not(contains(@class, 'shimeproduct'))]",
+)
+ALTER_LISTING = ListingExtractor("figure > a", summary_items_xpath="//*[figure/a]")
+NATIVE_LISTING = ListingExtractor(
+    "section > a", metadata={"pages": ".pages"}, summary_items_xpath="//section[a]"
+)
+AMAKUNI_INDEX = ListingExtractor(metadata={"end_year": "#top_nav > .page > li > a"})
+AMAKUNI_YEAR_LISTING = ListingExtractor(
+    "#list_waku > .list_item > .list_item_right",
+    deny=r"(?:2020/005)|(?:2019/013)|(?:2023/003)|(?:2023/012)|(?:2022/004)",
+)
+# Request meta of the product pages, recorded by `record_listing_summary`.
+LISTING_META_KEYS = ("listing_url", "listing_checksum")
+
+
+def create_product(response) -> ProductBase:
+    """Parse the product page and free the parse tree as soon as the product is built."""
+    page = parse_html(response.text)
+    try:
+        return get_general_factory().create_product(url=response.url, source=page)
+    finally:
+        page.decompose()
+
+
+def merge_translation(product: ProductBase, translation: ProductBase) -> ProductBase:
+    """Fill the empty fields of `product` with the ones of its page in another language."""
+    adapter = ItemAdapter(product)
+    translated = ItemAdapter(translation)
+    for field_name in adapter.field_names():
+        if adapter.get(field_name) in (None, "", []):
+            value = translated.get(field_name)
+            if value not in (None, "", []):
+                adapter[field_name] = value
+    return product
 
 
 class ProductSpider(CrawlSpider, ABC):
+    """
+    With `CRAWL_CHECKPOINTS_ENABLED`, the listing pages whose products were all processed
+    and the processed product urls are checkpointed under the job name
+    (`-a checkpoint=<name>`, by default the spider name and arguments, see `job_key`).
+    A job restarted after dying partway skips them, the checkpoint is cleared once a job finishes.
+    """
+
+    listing_store: Optional[ListingSummaryStore] = None
+    listing_recrawl_secs: float = 0
+    checkpoint: Optional[CrawlCheckpoint] = None
+
     def __init__(self, *args, **kwargs):
         self._force_update = kwargs.pop("force_update", False)
         self._is_announcement_spider = kwargs.pop("is_announcement_spider", False)
+        self.checkpoint_job = kwargs.pop("checkpoint", None) or self.name
         super().__init__(*args, **kwargs)
+        # Canonical urls of the products in flight of each listing page, and the other way around.
+        self._unit_pending: Dict[str, Set[str]] = {}
+        self._product_units: Dict[str, Set[str]] = {}
+        self._listed_units: Set[str] = set()
+
+    @classmethod
+    def from_crawler(cls, crawler, *args, **kwargs):
+        spider = super().from_crawler(crawler, *args, **kwargs)
+        settings = crawler.settings
+        if settings.getbool("LISTING_CHANGE_DETECTION_ENABLED"):
+            spider.listing_store = get_listing_store(settings)
+            spider.listing_recrawl_secs = (
+                settings.getfloat("LISTING_RECRAWL_DAYS") * 24 * 60 * 60
+            )
+            crawler.signals.connect(
+                spider.record_listing_summary, signal=signals.item_scraped
+            )
+        if settings.getbool("CRAWL_CHECKPOINTS_ENABLED"):
+            spider.checkpoint = get_checkpoint(settings)
+            # The subclasses consume their arguments, only `from_crawler` sees them all.
+            spider.checkpoint_job = kwargs.get("checkpoint") or job_key(
+                spider.name, kwargs
+            )
+            for signal in (
+                signals.item_scraped,
+                signals.item_dropped,
+                signals.item_error,
+            ):
+                crawler.signals.connect(spider.checkpoint_item, signal=signal)
+            crawler.signals.connect(
+                spider.checkpoint_failed_response, signal=signals.spider_error
+            )
+            crawler.signals.connect(
+                spider.resume_checkpoint, signal=signals.spider_opened
+            )
+            crawler.signals.connect(
+                spider.close_checkpoint, signal=signals.spider_closed
+            )
+        return spider
+
+    def listing_request(self, url: str, **kwargs) -> Optional[scrapy.Request]:
+        """Request of a listing page, or None when the page was completed before the restart."""
+        if self.checkpoint and self.checkpoint.is_unit_done(self.checkpoint_job, url):
+            self.crawler.stats.inc_value("checkpoint/units_skipped")
+            return None
+        meta = {**kwargs.pop("meta", {}), "checkpoint_unit": url}
+        return scrapy.Request(url, meta=meta, **kwargs)
+
+    def product_requests(self, response, listing: ListingExtractor, **kwargs):
+        """
+        Requests of the product pages on a listing page.
+        Products whose listing entry didn't change since the last crawl are skipped
+        until the recrawl window passes, so are the products processed before the restart.
+        """
+        summaries = {}
+        if self.listing_store and not self.should_force_update:
+            summaries = listing.extract_summaries(response)
+
+        unit = response.meta.get("checkpoint_unit") if self.checkpoint else None
+        if unit:
+            self._unit_pending.setdefault(unit, set())
+
+        for link in listing.extract_links(response):
+            canonical_url = canonical_product_url(link.url)
+            if self.checkpoint and self.checkpoint.is_product_done(
+                self.checkpoint_job, canonical_url
+            ):
+                self.crawler.stats.inc_value("checkpoint/products_skipped")
+                continue
+
+            meta = {}
+            checksum = summaries.get(link.url)
+            if checksum:
+                assert self.listing_store
+                if not self.listing_store.should_fetch(
+                    link.url, checksum, self.listing_recrawl_secs
+                ):
+                    self.crawler.stats.inc_value("listing/unchanged_skipped")
+                    continue
+                meta = {"listing_url": link.url, "listing_checksum": checksum}
+            if unit:
+                # Tracked before yielding, the product may finish before the listing does.
+                self._unit_pending[unit].add(canonical_url)
+                self._product_units.setdefault(canonical_url, set()).add(unit)
+            yield scrapy.Request(
+                link.url, callback=self.parse_product, meta=meta, **kwargs
+            )
+
+        if unit:
+            self._listed_units.add(unit)
+            self._complete_unit_if_done(unit)
+
+    def record_listing_summary(self, item, response, spider):
+        """Remember the listing summary once the product went through the pipelines."""
+        if spider is not self or self.listing_store is None:
+            return
+        checksum = response.meta.get("listing_checksum")
+        if checksum:
+            self.listing_store.record(response.meta["listing_url"], checksum)
+
+    def checkpoint_item(self, item, spider, **kwargs):
+        """Checkpoint the product once it went through the pipelines, saved or not."""
+        if spider is not self:
+            return
+        url = ItemAdapter(item).get("url")
+        if url:
+            self._complete_product(canonical_product_url(url))
+
+    def checkpoint_failed_response(self, failure, response, spider):
+        """A product page failing to parse is quarantined, it's done for this job as well."""
+        if spider is not self:
+            return
+        url = canonical_product_url(response.url)
+        if url in self._product_units:
+            self._complete_product(url)
+
+    def _complete_product(self, url: str):
+        assert self.checkpoint
+        self.checkpoint.complete_product(self.checkpoint_job, url)
+        for unit in self._product_units.pop(url, ()):
+            self._unit_pending[unit].discard(url)
+            self._complete_unit_if_done(unit)
+
+    def _complete_unit_if_done(self, unit: str):
+        assert self.checkpoint
+        if unit in self._listed_units and not self._unit_pending.get(unit):
+            self._unit_pending.pop(unit, None)
+            self._listed_units.discard(unit)
+            self.checkpoint.complete_unit(self.checkpoint_job, unit)
+
+    def resume_checkpoint(self, spider):
+        if spider is not self or self.checkpoint is None:
+            return
+        units, products = self.checkpoint.progress(self.checkpoint_job)
+        if units or products:
+            self.logger.info(
+                f'Resuming from the checkpoint. (job: "{self.checkpoint_job}", units: {units}, products: {products})'
+            )
+
+    def close_checkpoint(self, spider, reason):
+        if spider is not self or self.checkpoint is None:
+            return
+        if reason == "finished":
+            self.checkpoint.clear(self.checkpoint_job)
+            return
+        units, products = self.checkpoint.progress(self.checkpoint_job)
+        self.logger.info(
+            "The crawl was interrupted, restart it to resume. "
+            f'(job: "{self.checkpoint_job}", reason: "{reason}", units: {units}, products: {products})'
+        )
 
     @property
     def should_force_update(self):
@@ -43,15 +248,25 @@ class ProductSpider(CrawlSpider, ABC):
 
 
 class GSCProductSpider(ProductSpider):
+    """
+    `lang` and `category` take comma separated lists, e.g. `-a lang=ja,en -a category=scale,figma`.
+
+    The listings are crawled in the first language only. Each product page is followed by
+    its pages in the other languages, merged into one item by `merge_translation`.
+    """
+
     name = "gsc_product"
     allowed_domains = [BrandHost.GSC]
 
+    langs: List[str]
+    categories: List[str]
+
     def __init__(
         self,
         begin_year: Optional[int] = None,
         end_year: Optional[int] = None,
-        lang: Optional[Union[GSCLang, str]] = None,
-        category: Optional[Union[GSCCategory, str]] = None,
+        lang: Optional[Union[GSCLang, str, Sequence[str]]] = None,
+        category: Optional[Union[GSCCategory, str, Sequence[str]]] = None,
         *args,
         **kwargs,
     ) -> None:
@@ -66,40 +281,89 @@ class GSCProductSpider(ProductSpider):
         self.end_year = _valid_year(
             end_year, FALLBACK_END_YEAR, FALLBACK_BEGIN_YEAR, "top"
         )
-        self.lang = lang or GSCLang.JAPANESE
-        self.category = category or GSCCategory.SCALE
+        self.langs = split_arg(lang or GSCLang.JAPANESE)
+        self.categories = split_arg(category or GSCCategory.SCALE)
+
+    @property
+    def lang(self) -> str:
+        return self.langs[0]
+
+    @property
+    def category(self) -> str:
+        return self.categories[0]
 
     @staticmethod
     def _extract_product_link(response):
-        return LinkExtractor(
-            restrict_css=".hitItem:not(.shimeproduct) > .hitBox > a"
-        ).extract_links(response)
+        return GSC_LISTING.extract_links(response)
 
     def start_requests(self):
         period = range(self.begin_year, self.end_year + 1)
-        for year in period:
-            url = urljoin(
-                f"https://{BrandHost.GSC}",
-                f"/{self.lang}/products/category/{self.category}/announced/{year}",
-            )
-            yield scrapy.Request(url, callback=self.parse)
+        for category in self.categories:
+            for year in period:
+                url = urljoin(
+                    f"https://{BrandHost.GSC}",
+                    f"/{self.lang}/products/category/{category}/announced/{year}",
+                )
+                request = self.listing_request(url, callback=self.parse)
+                if request:
+                    yield request
 
     def parse(self, response):
-        for link in self._extract_product_link(response):
-            yield scrapy.Request(
-                link.url,
-                callback=self.parse_product,
-                cookies={"age_verification_ok": "true"},
-            )
+        yield from self.product_requests(
+            response, GSC_LISTING, cookies={"age_verification_ok": "true"}
+        )
 
     def parse_product(self, response):
         self.logger.info(f'Parsing "{response.url}"')
-        page = BeautifulSoup(response.text, "lxml")
-        product = general_factory.create_product(
-            url=response.url,
-            source=page,
+        yield self.translation_request(
+            create_product(response), self.langs[1:], response.meta
+        )
+
+    def translation_request(
+        self, product: ProductBase, langs: List[str], meta: Dict[str, Any]
+    ):
+        """
+        Request of the product page in the next language of `langs`,
+        or the product itself once every language is merged.
+        The listing summary in `meta` is passed along to be recorded with the merged item.
+        """
+        parsed = parse_official_id(product.url)
+        if not langs or parsed is None:
+            return product
+
+        _, official_id = parsed
+        lang, *rest = langs
+        return scrapy.Request(
+            urljoin(f"https://{BrandHost.GSC}", f"/{lang}/product/{official_id}"),
+            callback=self.parse_translation,
+            errback=self.translation_failed,
+            cb_kwargs={"product": product, "langs": rest},
+            cookies={"age_verification_ok": "true"},
+            meta={key: meta[key] for key in LISTING_META_KEYS if key in meta},
+            # The merged product waits for this page, it mustn't be filtered out.
+            dont_filter=True,
+            # Finish the products in flight before starting new ones.
+            priority=1,
+        )
+
+    def parse_translation(self, response, product: ProductBase, langs: List[str]):
+        try:
+            merge_translation(product, create_product(response))
+        except Exception as e:
+            self.logger.warning(
+                f'Failed to parse the translated product page. (url: "{response.url}")'
+            )
+            self.logger.warning(e)
+        yield self.translation_request(product, langs, response.meta)
+
+    def translation_failed(self, failure):
+        request = failure.request
+        self.logger.warning(
+            f'Failed to fetch the translated product page. (url: "{request.url}")'
+        )
+        yield self.translation_request(
+            request.cb_kwargs["product"], request.cb_kwargs["langs"], request.meta
         )
-        yield product
 
 
 class AlterProductSpider(ProductSpider):
@@ -134,20 +398,27 @@ class AlterProductSpider(ProductSpider):
         )
         for year in period:
             url = urljoin(f"https://{BrandHost.ALTER}", f"/{self.category}/?yy={year}")
-            yield scrapy.Request(url, callback=self.parse)
+            request = self.listing_request(url, callback=self.parse)
+            if request:
+                yield request
 
     def parse(self, response):
-        for link in LinkExtractor(restrict_css="figure > a").extract_links(response):
-            yield scrapy.Request(link.url, callback=self.parse_product)
+        yield from self.product_requests(response, ALTER_LISTING)
 
     def parse_product(self, response):
         self.logger.info(f'Parsing "{response.url}"')
-        page = BeautifulSoup(response.text, "lxml")
-        product = general_factory.create_product(url=response.url, source=page)
-        yield product
+        yield create_product(response)
 
 
 class NativeProductSpider(ProductSpider):
+    """
+    Every category page from `begin_page` is requested at once. With `-a incremental=true`
+    the pages are requested one after the other, newest first, and the pagination stops
+    after `stop_after_known_pages` pages in a row only list unchanged products.
+    Like the other brands, both modes skip the unchanged products of the listing change
+    detection, `-a force_update=true` fetches every product page.
+    """
+
     name = "native_product"
     allowed_domains = [BrandHost.NATIVE]
 
@@ -155,12 +426,17 @@ class NativeProductSpider(ProductSpider):
     begin_page: int
     end_page: int
     max_page: int
+    incremental: bool
+    stop_after_known_pages: int
+    known_page_streak: int
 
     def __init__(
         self,
         begin_page: int = 1,
         end_page: int = 0,
         category: Optional[Union[NativeCategory, str]] = None,
+        incremental: Union[bool, str] = False,
+        stop_after_known_pages: int = 2,
         *arg,
         **kwargs,
     ) -> None:
@@ -169,6 +445,9 @@ class NativeProductSpider(ProductSpider):
         self.begin_page = int(begin_page)
         self.end_page = int(end_page) if end_page else end_page
         self.max_page = end_page
+        self.incremental = str(incremental).lower() in ("true", "1")
+        self.stop_after_known_pages = int(stop_after_known_pages)
+        self.known_page_streak = 0
 
     def start_requests(self):
         url = urljoin(f"https://{BrandHost.NATIVE}", f"/{self.category}/")
@@ -178,11 +457,10 @@ class NativeProductSpider(ProductSpider):
         yield scrapy.Request(url, callback=self.parse)
 
     def set_max_page(self, response):
-        page = BeautifulSoup(response.text, "lxml")
         pattern = r"\d\ / (?P<total>\d+)"
-        count_ele = page.select_one(".pages")
-        if count_ele:
-            count_text = count_ele.text.strip()
+        count_text = NATIVE_LISTING.extract_text(response, "pages")
+        if count_text:
+            count_text = count_text.strip()
             result = re.search(pattern, count_text)
             if result:
                 total = result.groupdict().get("total")
@@ -197,23 +475,61 @@ class NativeProductSpider(ProductSpider):
         self.logger.info(
             f"Page info: begin_page={self.begin_page}, end_page={end_page}"
         )
+        if self.incremental:
+            if self.listing_store is None:
+                self.logger.warning(
+                    "Listing change detection is disabled, incremental mode walks every page."
+                )
+            if self.begin_page <= min(self.max_page, end_page):
+                yield self._page_request(self.begin_page, incremental=True)
+            return
+
         for page_num in range(self.begin_page, min(self.max_page, end_page) + 1):
-            url = urljoin(
-                f"https://{BrandHost.NATIVE}", f"/{self.category}/page/{page_num}"
-            )
-            yield scrapy.Request(
-                url, callback=self.parse_product_urls, dont_filter=True
+            yield self._page_request(page_num)
+
+    def _page_request(self, page_num: int, incremental: bool = False):
+        url = urljoin(
+            f"https://{BrandHost.NATIVE}", f"/{self.category}/page/{page_num}"
+        )
+        return scrapy.Request(
+            url,
+            callback=self.parse_product_urls,
+            cb_kwargs={"page_num": page_num} if incremental else {},
+            dont_filter=True,
+        )
+
+    def _is_known_page(self, response) -> bool:
+        if self.listing_store is None or self.should_force_update:
+            return False
+        summaries = NATIVE_LISTING.extract_summaries(response)
+        return bool(summaries) and all(
+            self.listing_store.is_unchanged(url, checksum)
+            for url, checksum in summaries.items()
+        )
+
+    def parse_product_urls(self, response, page_num: Optional[int] = None):
+        yield from self.product_requests(response, NATIVE_LISTING)
+        if page_num is None:
+            return
+
+        # Incremental mode, the category lists the newest products first.
+        if self._is_known_page(response):
+            self.known_page_streak += 1
+        else:
+            self.known_page_streak = 0
+
+        if self.known_page_streak >= self.stop_after_known_pages:
+            self.logger.info(
+                f"Stop paginating, {self.known_page_streak} pages in a row are already known. (page: {page_num})"
             )
+            return
 
-    def parse_product_urls(self, response):
-        for link in LinkExtractor(restrict_css="section > a").extract_links(response):
-            yield scrapy.Request(link.url, callback=self.parse_product)
+        if page_num < min(self.max_page, self.end_page or self.max_page):
+            yield self._page_request(page_num + 1, incremental=True)
 
     def parse_product(self, response):
         self.logger.info(f'Parsing "{response.url}"')
-        page = BeautifulSoup(response.text, "lxml")
-        product = general_factory.create_product(url=response.url, source=page)
-        yield product
+        yield create_product(response)
 
 
 class AmakuniProductSpider(ProductSpider):
@@ -248,14 +564,13 @@ class AmakuniProductSpider(ProductSpider):
         yield scrapy.Request(url, callback=self.parse)
 
     def set_year_range(self, response):
-        page = BeautifulSoup(response.text, "lxml")
-        end_year_ele = page.select_one("#top_nav > .page > li > a")
+        end_year_text = AMAKUNI_INDEX.extract_text(response, "end_year")
 
         fallback_end_year = self.FALLBACK_END_YEAR
 
-        if end_year_ele:
-            if end_year_ele.text.isdigit():
-                end_year = int(end_year_ele.text)
+        if end_year_text:
+            if end_year_text.isdigit():
+                end_year = int(end_year_text)
                 fallback_end_year = end_year
 
         self.begin_year = _valid_year(
@@ -281,13 +596,8 @@ class AmakuniProductSpider(ProductSpider):
             yield scrapy.Request(url, callback=self.parse_year_page)
 
     def parse_year_page(self, response):
-        for link in LinkExtractor(
-            restrict_css="#list_waku > .list_item > .list_item_right",
-            deny=r"(?:2020/005)|(?:2019/013)|(?:2023/003)|(?:2023/012)|(?:2022/004)",
-        ).extract_links(response):
+        for link in AMAKUNI_YEAR_LISTING.extract_links(response):
             yield scrapy.Request(link.url, callback=self.parse_product)
 
     def parse_product(self, response):
-        page = BeautifulSoup(response.text, "lxml")
-        product = general_factory.create_product(url=response.url, source=page)
-        yield product
+        yield create_product(response)
@@ -1,91 +1,145 @@
-import re
+import os
+import time
 import urllib.parse
 from abc import ABC
-from typing import Iterable, Literal, Optional
+from typing import Dict, Mapping, Optional, Set
 from urllib.parse import urljoin
 
 import scrapy
-from bs4 import BeautifulSoup
 from figure_parser.enums import BrandHost
-from figure_parser.factories import GeneralBs4ProductFactory
+from scrapy import signals
+from scrapy.exceptions import DontCloseSpider
+from scrapy.http import TextResponse
 from scrapy.linkextractors import LinkExtractor
 from scrapy.spiders import CrawlSpider, Rule
+from scrapy.utils.project import data_path
+from scrapy.utils.reactor import CallLaterOnce
+from twisted.internet.threads import deferToThread
 
-DelayTag = dict[str, dict[Literal["jan", "url"], str]]
+from ..items import ReleaseDelay
+from ..libs.delay_post import DelayTag, parse_delay_products
+from ..libs.official_ids import OfficialIdIndex
+from ..libs.pages import parse_html
+from ..libs.post_snapshot import PostSnapshotStore
+from ..repositories.exceptions import HookApiException
+from ..services import get_official_id_index, get_product_repository
+from . import create_product
 
-general_factory = GeneralBs4ProductFactory.create_factory()
+DELAY_POST_LINKS = LinkExtractor(
+    allow="("
+    f'{urllib.parse.quote("発売月")}|'
+    f'{urllib.parse.quote("発売時期")}|'
+    f'{urllib.parse.quote("発売延期")}|'
+    f'{urllib.parse.quote("延期")}'
+    ")",
+    unique=True,
+)
 
 
 class GscDelayPostAbstractSpider(CrawlSpider, ABC):
     allowed_domains = [BrandHost.GSC]
     start_urls = ["https://www.goodsmile.info/ja/posts/category/information/date/"]
 
-    rules = [
-        Rule(
-            LinkExtractor(
-                allow="("
-                f'{urllib.parse.quote("発売月")}|'
-                f'{urllib.parse.quote("発売時期")}|'
-                f'{urllib.parse.quote("発売延期")}|'
-                f'{urllib.parse.quote("延期")}'
-                ")",
-                unique=True,
-            ),
-            callback="parse_delay_post",
-        )
-    ]
+    rules = [Rule(DELAY_POST_LINKS, callback="parse_delay_post")]
 
-    @staticmethod
-    def fetch_gsc_products_by_official_id(ids: Iterable) -> set[str]:
-        return set(ids)
+    official_id_index: Optional[OfficialIdIndex] = None
 
-    @staticmethod
-    def _parse_delay_products_from_post(page: BeautifulSoup) -> DelayTag:
-        products_delayed: DelayTag = {}
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._tracked_ids: Dict[str, bool] = {}
 
-        for e in page.findAll("br"):
-            e.extract()
+    @classmethod
+    def from_crawler(cls, crawler, *args, **kwargs):
+        spider = super().from_crawler(crawler, *args, **kwargs)
+        spider.official_id_index = get_official_id_index(crawler.settings)
+        return spider
 
-        changed_ps = page.select(
-            ".content > p, .content > center", string=re.compile("発売[月|日]変更")
-        )
-        for c in changed_ps:
-            if "JAN" in c.get_text():
-                results = re.findall(
-                    r"「.*href=\"(.*\/product\/(\d+)\/.*)\".*」JAN：(\d+)", str(c)
-                )
-                for r in results:
-                    url = r[0]
-                    maker_id = r[1]
-                    jan = r[2]
-                    products_delayed[maker_id] = {"url": url, "jan": jan}
+    def fetch_gsc_products_by_official_id(
+        self, products: Mapping[str, str]
+    ) -> set[str]:
+        """
+        Official ids of `products` (official id -> product url) saved in the database.
+        The ids are resolved by the local id index, then by the api one by one,
+        and cached for the rest of the run.
+        """
+        if self.official_id_index is None:
+            return set(products)
 
-        return products_delayed
+        unresolved = [p_id for p_id in products if p_id not in self._tracked_ids]
+        indexed = self.official_id_index.find(BrandHost.GSC.value, unresolved)
+        for p_id in unresolved:
+            self._tracked_ids[p_id] = p_id in indexed or self._is_product_in_db(
+                products[p_id]
+            )
+
+        return {p_id for p_id in products if self._tracked_ids[p_id]}
+
+    def _is_product_in_db(self, url: str) -> bool:
+        assert self.official_id_index is not None
+        try:
+            product = get_product_repository(self.settings).get_product_by_url(
+                source_url=url
+            )
+        except HookApiException as e:
+            # Fetching an untracked product costs less than missing a delay.
+            self.logger.warning(f'Failed to look up the product. (url: "{url}")')
+            self.logger.warning(e)
+            return True
+
+        if product is None:
+            return False
+        self.official_id_index.add(url)
+        return True
+
+    @staticmethod
+    def _parse_delay_products_from_post(response: TextResponse) -> DelayTag:
+        return parse_delay_products(response.selector.root)
 
     def parse_delay_post(self, response):
-        page = BeautifulSoup(response.text, "lxml")
-        products_delayed = self._parse_delay_products_from_post(page)
+        products_delayed = self._parse_delay_products_from_post(response)
 
-        products_recorded_in_db = self.fetch_gsc_products_by_official_id(
-            products_delayed.keys()
+        product_urls = {
+            p_id: urljoin(f"https://{BrandHost.GSC}", product["url"])
+            for p_id, product in products_delayed.items()
+        }
+        # The api lookups of untracked products wait for the throttling, off the reactor.
+        return deferToThread(
+            self.fetch_gsc_products_by_official_id, product_urls
+        ).addCallback(
+            lambda recorded: list(
+                self._follow_delayed_products(products_delayed, product_urls, recorded)
+            )
         )
 
+    def _follow_delayed_products(
+        self,
+        products_delayed: DelayTag,
+        product_urls: Mapping[str, str],
+        products_recorded_in_db: Set[str],
+    ):
         for p_id in set(products_delayed) & products_recorded_in_db:
-            url = urljoin(
-                f"https://{BrandHost.GSC}",
-                products_delayed[p_id]["url"],
-            )
-            yield scrapy.Request(
-                url=url,
-                callback=self.parse_product,
-                cb_kwargs={"jan": products_delayed[p_id]["jan"]},
-                cookies={"age_verification_ok": "true"},
-            )
+            product = products_delayed[p_id]
+            release_date = product.get("release_date")
+            if release_date:
+                yield ReleaseDelay(
+                    url=product_urls[p_id],
+                    jan=product["jan"],
+                    release_date=release_date,
+                )
+            else:
+                yield self.product_request(product_urls[p_id], product["jan"])
+
+    def product_request(self, url: str, jan: str) -> scrapy.Request:
+        return scrapy.Request(
+            url=url,
+            callback=self.parse_product,
+            cb_kwargs={"jan": jan},
+            cookies={"age_verification_ok": "true"},
+        )
 
     def parse_product(self, response, jan):
-        self.logger.info(f"Parsing {response.url}...")
-        page = BeautifulSoup(response.text, "lxml")
-        product = general_factory.create_product(url=response.url, source=page)
+        self.logger.info(f'Parsing "{response.url}"')
+        product = create_product(response)
         product.jan = jan
         yield product
 
@@ -99,17 +153,130 @@ class GscNewDelayPostSpider(GscDelayPostAbstractSpider):
     name = "gsc_new_delay_post"
 
     def parse(self, response, **kwargs):
-        page = BeautifulSoup(response.text, "lxml")
-        for icon in page.select(".newsS > a > .newicon"):
-            if icon.parent:
-                href = icon.parent.get("href")
-                if type(href) is str:
-                    yield scrapy.Request(
-                        urljoin(
-                            f"https://{BrandHost.GSC}",
-                            href,
-                        )
+        page = parse_html(response.text)
+        hrefs = [
+            icon.parent.get("href")
+            for icon in page.select(".newsS > a > .newicon")
+            if icon.parent
+        ]
+        page.decompose()
+        for href in hrefs:
+            if type(href) is str:
+                yield scrapy.Request(
+                    urljoin(
+                        f"https://{BrandHost.GSC}",
+                        href,
                     )
+                )
+
+
+class GscDelayPostWatchSpider(GscDelayPostAbstractSpider):
+    """
+    Long-running spider polling the information index with conditional GETs.
+
+    Delay posts missing from the snapshot of the previous polls are parsed right away.
+    The first poll on an empty snapshot only records the posts already published.
+    """
+
+    name = "gsc_delay_post_watch"
+    # The snapshot replaces the dupefilter, whose fingerprints would grow for the whole uptime.
+    custom_settings = {
+        "DUPEFILTER_CLASS": "scrapy.dupefilters.BaseDupeFilter",
+        "HTTPCACHE_ENABLED": False,
+    }
+
+    snapshot: PostSnapshotStore
+    poll_interval: float
+
+    def __init__(self, poll_interval: Optional[float] = None, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._poll_interval_arg = poll_interval
+        self._last_poll = 0.0
+        self._next_poll = CallLaterOnce(self._poll)
+
+    @classmethod
+    def from_crawler(cls, crawler, *args, **kwargs):
+        spider = super().from_crawler(crawler, *args, **kwargs)
+        settings = crawler.settings
+        spider.poll_interval = float(
+            spider._poll_interval_arg
+            or settings.getfloat("GSC_DELAY_POST_POLL_INTERVAL", 60)
+        )
+        spider.snapshot = PostSnapshotStore(
+            os.path.join(
+                data_path(settings.get("CRAWLER_STATE_DIR", "state")),
+                f"{spider.name}.sqlite",
+            ),
+            max_posts=settings.getint("GSC_DELAY_POST_SNAPSHOT_SIZE", 1000),
+        )
+        crawler.signals.connect(spider.on_idle, signal=signals.spider_idle)
+        crawler.signals.connect(spider.on_closed, signal=signals.spider_closed)
+        return spider
+
+    def start_requests(self):
+        yield self.index_request()
+
+    def index_request(self) -> scrapy.Request:
+        url = self.start_urls[0]
+        etag, last_modified = self.snapshot.get_validators(url)
+        headers = {}
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+
+        self._last_poll = time.monotonic()
+        return scrapy.Request(
+            url,
+            callback=self.parse_index,
+            headers=headers,
+            meta={"handle_httpstatus_list": [304]},
+            dont_filter=True,
+        )
+
+    def parse_index(self, response):
+        if response.status == 304:
+            self.logger.debug(f'Index not modified. (url: "{response.url}")')
+            return
+
+        self.snapshot.set_validators(
+            response.url,
+            response.headers.get("ETag", b"").decode() or None,
+            response.headers.get("Last-Modified", b"").decode() or None,
+        )
+
+        urls = [link.url for link in DELAY_POST_LINKS.extract_links(response)]
+        is_first_poll = self.snapshot.is_empty()
+        new_urls = self.snapshot.new_posts(urls)
+        self.snapshot.add(new_urls)
+        if is_first_poll:
+            self.logger.info(
+                f"Recorded the published delay posts. (count: {len(urls)})"
+            )
+            return
+
+        for url in new_urls:
+            self.logger.info(f'New delay post. (url: "{url}")')
+            self.crawler.stats.inc_value("delay_post_watch/new_posts")
+            yield scrapy.Request(
+                url, callback=self.parse_delay_post, priority=10, dont_filter=True
+            )
+
+    def _poll(self):
+        self.crawler.engine.crawl(self.index_request())
+
+    def on_idle(self, spider):
+        if spider is not self:
+            return
+        delay = max(0.0, self._last_poll + self.poll_interval - time.monotonic())
+        self._next_poll.schedule(delay)
+        raise DontCloseSpider
+
+    def on_closed(self, spider):
+        if spider is not self:
+            return
+        self._next_poll.cancel()
+        self.snapshot.close()
 
 
 class GscDelayPostSpider(GscDelayPostAbstractSpider):
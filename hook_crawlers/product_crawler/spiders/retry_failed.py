@@ -0,0 +1,98 @@
+import json
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import urlparse
+
+import scrapy
+from figure_parser.enums import BrandHost
+from scrapy.spiderloader import SpiderLoader
+
+from ..libs.quarantine import Quarantine
+from ..middlewares import QuarantineFailedResponses
+from ..services import get_quarantine
+
+
+class RetryFailedSpider(scrapy.Spider):
+    """
+    Fetch the quarantined urls again and parse them with the callback of the spider
+    that failed on them, the items go through the item pipelines as usual.
+
+    `-a spider=gsc_product` and `-a stage=parse` only retry the matching urls.
+    A url leaves the quarantine once it's fetched again, and comes back on a new failure.
+    Failures in the item pipelines are retried with `parse_product`.
+    """
+
+    name = "retry_failed"
+
+    quarantine: Quarantine
+    spider_loader: SpiderLoader
+
+    def __init__(
+        self, spider: Optional[str] = None, stage: Optional[str] = None, *args, **kwargs
+    ):
+        super().__init__(*args, **kwargs)
+        self.spider_filter = spider
+        self.stage_filter = stage
+        self._delegates: Dict[str, scrapy.Spider] = {}
+
+    @classmethod
+    def from_crawler(cls, crawler, *args, **kwargs):
+        spider = super().from_crawler(crawler, *args, **kwargs)
+        spider.quarantine = get_quarantine(crawler.settings)
+        spider.spider_loader = SpiderLoader.from_settings(crawler.settings)
+        return spider
+
+    def delegate(self, spider_name: str) -> scrapy.Spider:
+        """The spider whose callbacks parse the urls it failed on."""
+        if spider_name not in self._delegates:
+            spidercls = self.spider_loader.load(spider_name)
+            self._delegates[spider_name] = spidercls.from_crawler(self.crawler)
+        return self._delegates[spider_name]
+
+    def start_requests(self):
+        entries = {}
+        for entry in self.quarantine.entries(self.stage_filter, self.spider_filter):
+            if entry.spider != self.name and entry.url not in entries:
+                entries[entry.url] = entry
+        self.logger.info(f"Retrying the quarantined urls. (count: {len(entries)})")
+
+        for entry in entries.values():
+            try:
+                self.delegate(entry.spider)
+            except KeyError:
+                self.logger.warning(
+                    f'Unknown spider, skip the url. (spider: "{entry.spider}", url: "{entry.url}")'
+                )
+                continue
+
+            cookies = {}
+            if urlparse(entry.url).netloc == BrandHost.GSC:
+                cookies = {"age_verification_ok": "true"}
+            yield scrapy.Request(
+                entry.url,
+                callback=self.parse_failed,
+                cb_kwargs={
+                    "url": entry.url,
+                    "origin": entry.spider,
+                    "callback": entry.callback or "parse_product",
+                    "kwargs": json.loads(entry.cb_kwargs or "{}"),
+                },
+                cookies=cookies,
+                dont_filter=True,
+            )
+
+    def parse_failed(
+        self, response, url: str, origin: str, callback: str, kwargs: Dict[str, Any]
+    ):
+        self.quarantine.discard(url)
+        self.crawler.stats.inc_value("retry_failed/retried")
+        # Callbacks return iterables, async generators or deferreds, scrapy handles all of them.
+        return getattr(self.delegate(origin), callback)(response, **kwargs)
+
+    def failure_origin(self, response) -> Tuple[str, str, Dict[str, Any]]:
+        """Spider, callback and arguments to quarantine a failure of `parse_failed` with."""
+        cb_kwargs = response.request.cb_kwargs
+        if "origin" not in cb_kwargs:
+            # Follow-up requests yielded by the delegate callbacks go to the delegate itself.
+            delegate = getattr(response.request.callback, "__self__", self)
+            return QuarantineFailedResponses.callback_of(response, delegate)
+        return cb_kwargs["origin"], cb_kwargs["callback"], cb_kwargs["kwargs"]
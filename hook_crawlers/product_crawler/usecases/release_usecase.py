@@ -1,6 +1,6 @@
 from datetime import date
 from enum import Enum, auto
-from typing import List, Set, Union
+from typing import List, Optional, Set, Union
 
 from figure_hook_client.models import ProductReleaseInfoInDB, ProductReleaseInfoUpdate
 from figure_parser import Release
@@ -99,3 +99,16 @@ class ReleaseUsecase:
                 release_patch.price = incoming_release.price
                 release_patch.tax_including = incoming_release.tax_including
         return release_patch
+
+    @staticmethod
+    def get_delayed_release(
+        existing_releases: List[ProductReleaseInfoInDB],
+    ) -> Optional[ProductReleaseInfoInDB]:
+        """
+        The release a delay announcement is about: the only one which hasn't shipped.
+        `None` when there are none or several of them.
+        """
+        unshipped = [r for r in existing_releases if not r.shipped_at]
+        if len(unshipped) != 1:
+            return None
+        return unshipped[0]
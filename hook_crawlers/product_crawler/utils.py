@@ -1,4 +1,5 @@
-from typing import Literal
+from enum import Enum
+from typing import Iterable, List, Literal, Optional, Union
 
 
 def valid_year(
@@ -25,3 +26,14 @@ def valid_year(
             year = _fallback(year, fallback_flag)
 
     return year
+
+
+def split_arg(value: Optional[Union[str, Iterable[str]]]) -> List[str]:
+    """Values of a spider argument, comma separated when given from the command line."""
+    if not value:
+        return []
+    if isinstance(value, str):
+        # A str enum splits into its plain value.
+        value = value.split(",")
+    values = [v.value if isinstance(v, Enum) else v for v in value]
+    return [v.strip() for v in values if v.strip()]
@@ -0,0 +1,112 @@
+"""
+Warm worker pool for scrapyd jobs.
+
+`server` preloads the heavy third-party modules once and keeps forked workers
+waiting on a unix socket. `runner` is set as scrapyd's `runner`, it hands the
+job (argv, environment, cwd and stdio) to a warm worker and waits for its exit
+code. Each worker runs exactly one job and exits, so jobs stay isolated.
+
+The jobs carry the environment of scrapyd, api tokens included. The socket lives
+in a 0700 directory of the scrapyd user, and both ends check with `SO_PEERCRED`
+that the other side runs as that user too.
+
+Keep this package free of heavy imports, `runner` is started for every job.
+"""
+import json
+import os
+import socket
+import struct
+from stat import S_ISDIR
+from typing import Any, Dict, List, Tuple
+
+SOCKET_NAME = "warm-pool.sock"
+SOCKET_PATH_ENV = "WARM_POOL_SOCKET"
+
+_HEADER = struct.Struct("!I")
+_EXIT_CODE = struct.Struct("!i")
+_PEER_CREDENTIALS = struct.Struct("3i")
+STDIO_FDS = (0, 1, 2)
+
+
+def get_socket_path() -> str:
+    """`WARM_POOL_SOCKET`, or the socket in a directory of the current user."""
+    path = os.environ.get(SOCKET_PATH_ENV)
+    if path:
+        return path
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime_dir:
+        return os.path.join(runtime_dir, "hook_crawlers", SOCKET_NAME)
+    return os.path.join(f"/tmp/hook_crawlers-{os.getuid()}", SOCKET_NAME)
+
+
+def is_private_dir(path: str) -> bool:
+    """A real directory owned by the current user, closed to the group and the others."""
+    try:
+        stat = os.lstat(path)
+    except FileNotFoundError:
+        return False
+    return (
+        S_ISDIR(stat.st_mode)
+        and stat.st_uid == os.getuid()
+        and not stat.st_mode & 0o077
+    )
+
+
+def make_private_dir(path: str):
+    """Create the 0700 directory of the socket, refuse one another user could write to."""
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    if not is_private_dir(path):
+        raise PermissionError(
+            f'The socket directory must be a 0700 directory of the current user. (path: "{path}")'
+        )
+
+
+def peer_uid(sock: socket.socket) -> int:
+    """Uid of the process on the other side of a unix socket."""
+    creds = sock.getsockopt(
+        socket.SOL_SOCKET, socket.SO_PEERCRED, _PEER_CREDENTIALS.size
+    )
+    _, uid, _ = _PEER_CREDENTIALS.unpack(creds)
+    return uid
+
+
+def is_trusted_peer(sock: socket.socket) -> bool:
+    return peer_uid(sock) == os.getuid()
+
+
+def _recv_exactly(sock: socket.socket, size: int) -> bytes:
+    buf = b""
+    while len(buf) < size:
+        chunk = sock.recv(size - len(buf))
+        if not chunk:
+            raise ConnectionError("Connection closed by the other side.")
+        buf += chunk
+    return buf
+
+
+def send_job(sock: socket.socket, job: Dict[str, Any], fds=STDIO_FDS):
+    payload = json.dumps(job).encode("utf-8")
+    socket.send_fds(sock, [_HEADER.pack(len(payload))], list(fds))
+    sock.sendall(payload)
+
+
+def recv_job(sock: socket.socket) -> Tuple[Dict[str, Any], List[int]]:
+    header, fds, _, _ = socket.recv_fds(sock, _HEADER.size, len(STDIO_FDS))
+    if len(header) != _HEADER.size:
+        raise ConnectionError("Incomplete job header.")
+    (size,) = _HEADER.unpack(header)
+    job = json.loads(_recv_exactly(sock, size).decode("utf-8"))
+    return job, fds
+
+
+def send_exit_code(sock: socket.socket, exit_code: int):
+    sock.sendall(_EXIT_CODE.pack(exit_code))
+
+
+def recv_exit_code(sock: socket.socket) -> int:
+    (exit_code,) = _EXIT_CODE.unpack(_recv_exactly(sock, _EXIT_CODE.size))
+    return exit_code
+
+
+def send_signal(sock: socket.socket, signum: int):
+    sock.sendall(bytes([signum]))
@@ -0,0 +1,82 @@
+"""
+Drop-in replacement of `scrapyd.runner`.
+
+Set `runner = product_crawler.warm_pool.runner` in the `[scrapyd]` section.
+The job runs in a warm worker when the pool is up, otherwise it falls back to
+`scrapyd.runner` in this process.
+"""
+import os
+import signal
+import socket
+import sys
+
+from . import (
+    get_socket_path,
+    is_private_dir,
+    is_trusted_peer,
+    recv_exit_code,
+    send_job,
+    send_signal,
+)
+
+FORWARDED_SIGNALS = (signal.SIGTERM, signal.SIGINT)
+
+
+def connect_pool(path: str):
+    """
+    The socket of the pool, `None` unless it's in a private directory
+    and the pool runs as the current user, the job carries the environment.
+    """
+    if not is_private_dir(os.path.dirname(path)):
+        return None
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+    except OSError:
+        sock.close()
+        return None
+    if not is_trusted_peer(sock):
+        print(
+            f'The warm pool socket is held by another user, ignore it. (path: "{path}")',
+            file=sys.stderr,
+        )
+        sock.close()
+        return None
+    return sock
+
+
+def run_in_pool(sock: socket.socket) -> int:
+    sys.stdout.flush()
+    sys.stderr.flush()
+    send_job(
+        sock,
+        {"argv": sys.argv, "env": dict(os.environ), "cwd": os.getcwd()},
+    )
+
+    def forward(signum, _):
+        send_signal(sock, signum)
+
+    for signum in FORWARDED_SIGNALS:
+        signal.signal(signum, forward)
+
+    try:
+        return recv_exit_code(sock)
+    except ConnectionError:
+        return 1
+    finally:
+        sock.close()
+
+
+def main():
+    sock = connect_pool(get_socket_path())
+    if sock is None:
+        from scrapyd.runner import main as scrapyd_main
+
+        scrapyd_main()
+        return
+
+    sys.exit(run_in_pool(sock))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,241 @@
+"""
+Keep warm scrapyd workers forked from a parent that already imported the heavy modules.
+
+Usage:
+    python -m product_crawler.warm_pool.server [--workers 4] [--socket PATH] [--preload MODULE ...]
+"""
+import argparse
+import importlib
+import logging
+import os
+import random
+import select
+import signal
+import socket
+import struct
+import sys
+import threading
+from contextlib import suppress
+from typing import Iterable, Set
+
+from . import (
+    get_socket_path,
+    is_trusted_peer,
+    make_private_dir,
+    recv_job,
+    send_exit_code,
+)
+
+logger = logging.getLogger("warm_pool")
+
+DEFAULT_PRELOAD_MODULES = [
+    "scrapy",
+    "scrapy.cmdline",
+    "scrapy.crawler",
+    "scrapy.linkextractors",
+    "scrapy.pipelines.images",
+    "scrapy_proxies",
+    "scrapyd.runner",
+    "bs4",
+    "lxml.html",
+    "pydantic",
+    "figure_parser",
+    "figure_parser.factories",
+    "figure_hook_client",
+]
+
+_PID = struct.Struct("!i")
+
+
+def preload_modules(modules: Iterable[str]):
+    for module in modules:
+        try:
+            importlib.import_module(module)
+        except ImportError as e:
+            logger.warning(f'Failed to preload "{module}". ({e})')
+
+    # An installed reactor would be shared by every forked worker.
+    if "twisted.internet.reactor" in sys.modules:
+        raise RuntimeError(
+            "The twisted reactor was installed while preloading modules, "
+            "workers can't be forked from this process."
+        )
+
+
+def run_job(conn: socket.socket) -> int:
+    """Take over the job sent by `runner` and run it in this process."""
+    job, fds = recv_job(conn)
+    for target_fd, fd in zip((0, 1, 2), fds):
+        os.dup2(fd, target_fd)
+        os.close(fd)
+
+    os.chdir(job["cwd"])
+    os.environ.clear()
+    os.environ.update(job["env"])
+    sys.argv = job["argv"]
+    threading.Thread(target=_watch_runner, args=(conn,), daemon=True).start()
+
+    from scrapyd.runner import main as scrapyd_main
+
+    try:
+        scrapyd_main()
+    except SystemExit as e:
+        if e.code is None:
+            return 0
+        if isinstance(e.code, int):
+            return e.code
+        print(e.code, file=sys.stderr)
+        return 1
+    except BaseException:
+        logging.exception("Job failed.")
+        return 1
+    return 0
+
+
+def _watch_runner(conn: socket.socket):
+    """Relay signals forwarded by `runner`, stop the job when `runner` is gone."""
+    while True:
+        try:
+            data = conn.recv(1)
+        except OSError:
+            data = b""
+        if not data:
+            os.kill(os.getpid(), signal.SIGTERM)
+            return
+        os.kill(os.getpid(), data[0])
+
+
+class WarmPoolServer:
+    def __init__(self, socket_path: str, workers: int) -> None:
+        self.socket_path = socket_path
+        self.workers = workers
+        self.idle_workers: Set[int] = set()
+        self._running = False
+
+    def serve_forever(self):
+        make_private_dir(os.path.dirname(self.socket_path))
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        self.listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        # Created 0600, not after binding with the default umask.
+        umask = os.umask(0o177)
+        try:
+            self.listener.bind(self.socket_path)
+        finally:
+            os.umask(umask)
+        self.listener.listen(self.workers * 4)
+        self.ready_r, self.ready_w = os.pipe()
+
+        self._running = True
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+        logger.info(
+            f'Warm pool is listening. (socket: "{self.socket_path}", workers: {self.workers})'
+        )
+
+        try:
+            while self._running:
+                self._fill_pool()
+                try:
+                    readable, _, _ = select.select([self.ready_r], [], [], 1)
+                except InterruptedError:
+                    continue
+                if readable:
+                    self._handle_taken_workers()
+                self._reap_workers()
+        finally:
+            self._shutdown()
+
+    def _fill_pool(self):
+        while len(self.idle_workers) < self.workers:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            pid = os.fork()
+            if pid == 0:
+                self._worker_main()
+            self.idle_workers.add(pid)
+
+    def _worker_main(self):
+        exit_code = 1
+        try:
+            for signum in (signal.SIGTERM, signal.SIGINT):
+                signal.signal(signum, signal.SIG_DFL)
+            os.close(self.ready_r)
+            random.seed()
+
+            conn = self.accept_trusted()
+            os.write(self.ready_w, _PID.pack(os.getpid()))
+            self.listener.close()
+            os.close(self.ready_w)
+
+            logging.root.handlers.clear()
+            exit_code = run_job(conn)
+            sys.stdout.flush()
+            sys.stderr.flush()
+            send_exit_code(conn, exit_code)
+        finally:
+            os._exit(exit_code)
+
+    def accept_trusted(self) -> socket.socket:
+        """The next connection from a process of the current user."""
+        while True:
+            conn, _ = self.listener.accept()
+            if is_trusted_peer(conn):
+                return conn
+            logger.warning("Refused a job from another user.")
+            conn.close()
+
+    def _handle_taken_workers(self):
+        data = os.read(self.ready_r, _PID.size * self.workers)
+        for offset in range(0, len(data) - len(data) % _PID.size, _PID.size):
+            (pid,) = _PID.unpack_from(data, offset)
+            self.idle_workers.discard(pid)
+            logger.info(f"Worker took a job. (pid: {pid})")
+
+    def _reap_workers(self):
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            if pid in self.idle_workers:
+                self.idle_workers.discard(pid)
+                logger.warning(f"Idle worker died. (pid: {pid}, status: {status})")
+
+    def _stop(self, signum, _):
+        logger.info(f"Received signal {signum}, stopping the warm pool.")
+        self._running = False
+
+    def _shutdown(self):
+        # Busy workers are running jobs and finish on their own.
+        for pid in self.idle_workers:
+            with suppress(ProcessLookupError):
+                os.kill(pid, signal.SIGTERM)
+        self.listener.close()
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--socket", default=get_socket_path())
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument(
+        "--preload",
+        nargs="*",
+        default=DEFAULT_PRELOAD_MODULES,
+        help="modules imported before forking workers",
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO, format="%(asctime)s [%(name)s] %(levelname)s: %(message)s"
+    )
+    preload_modules(args.preload)
+    WarmPoolServer(args.socket, args.workers).serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -23,6 +23,13 @@ get_project () {
     python _cmd.py get-project
 }
 
+start_warm_pool () {
+    if [ -n "$WARM_POOL_WORKERS" ]; then
+        echo "Start warm pool with $WARM_POOL_WORKERS workers."
+        python -m product_crawler.warm_pool.server --workers $WARM_POOL_WORKERS &
+    fi
+}
+
 check_db () {
     python _cmd.py checkdb
 }
@@ -49,6 +56,7 @@ if [ "$COMMAND" == "test" ]; then
     pkill scrapyd
 elif [ "$COMMAND" == "run" ]; then
     if check_db; then
+        start_warm_pool
         scrapyd
     else
         echo "Can't get connection with db."
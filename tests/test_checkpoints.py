@@ -0,0 +1,27 @@
+from hook_crawlers.product_crawler.libs.checkpoints import CrawlCheckpoint, job_key
+
+
+def test_progress_per_job(tmp_path):
+    checkpoint = CrawlCheckpoint(str(tmp_path / "checkpoints.sqlite"))
+    checkpoint.complete_unit("gsc_product", "https://a/2021")
+    checkpoint.complete_product("gsc_product", "https://a/product/1")
+    checkpoint.complete_product("gsc_product", "https://a/product/1")
+    checkpoint.complete_product("alter_product", "https://b/products/1/")
+
+    assert checkpoint.is_unit_done("gsc_product", "https://a/2021")
+    assert not checkpoint.is_unit_done("gsc_product", "https://a/2022")
+    assert checkpoint.is_product_done("gsc_product", "https://a/product/1")
+    assert not checkpoint.is_product_done("gsc_product", "https://b/products/1/")
+    assert checkpoint.progress("gsc_product") == (1, 1)
+
+    checkpoint.clear("gsc_product")
+    assert checkpoint.progress("gsc_product") == (0, 0)
+    assert checkpoint.progress("alter_product") == (0, 1)
+
+
+def test_job_key():
+    assert job_key("gsc_product", {}) == "gsc_product"
+    assert (
+        job_key("gsc_product", {"category": "scale", "begin_year": 2021, "_job": "1"})
+        == "gsc_product?begin_year=2021&category=scale"
+    )
@@ -0,0 +1,18 @@
+import pytest
+from scrapy.exceptions import UsageError
+
+from hook_crawlers.product_crawler.commands.crawlmany import split_spider_args
+
+
+def test_split_spider_args():
+    routed = split_spider_args(
+        ["gsc_product", "alter_product"],
+        {"gsc_product:begin_year": "2021", "force_update": "1"},
+    )
+    assert routed["gsc_product"] == {"begin_year": "2021", "force_update": "1"}
+    assert routed["alter_product"] == {"force_update": "1"}
+
+
+def test_split_spider_args_with_unknown_spider():
+    with pytest.raises(UsageError):
+        split_spider_args(["gsc_product"], {"alter_product:begin_year": "2021"})
@@ -0,0 +1,35 @@
+import json
+import pathlib
+from datetime import date
+
+import pytest
+from scrapy.http import HtmlResponse
+
+from hook_crawlers.product_crawler.libs.delay_post import (
+    parse_delay_products,
+    parse_new_release_date,
+)
+
+FIXTURES = pathlib.Path(__file__).parent.joinpath("fixtures", "gsc_delay_posts")
+EXPECTED = json.loads(FIXTURES.joinpath("expected.json").read_text(encoding="utf-8"))
+
+
+@pytest.mark.parametrize("name", sorted(EXPECTED))
+def test_parse_delay_products(name):
+    response = HtmlResponse(
+        url=f"https://www.goodsmile.info/ja/post/1/{name}",
+        body=FIXTURES.joinpath(name).read_bytes(),
+        encoding="utf-8",
+    )
+    products = parse_delay_products(response.selector.root)
+    for product in products.values():
+        if "release_date" in product:
+            product["release_date"] = product["release_date"].isoformat()
+    assert products == EXPECTED[name]
+
+
+def test_parse_new_release_date():
+    assert parse_new_release_date("2021年1月 → 2021年3月") == date(2021, 3, 1)
+    assert parse_new_release_date("変更前：2020年12月 変更後：2021年2月") == date(2021, 2, 1)
+    assert parse_new_release_date("2021年1月より発売延期") is None
+    assert parse_new_release_date("2022年5月 → 2022年7月～8月") is None
@@ -0,0 +1,71 @@
+import io
+import logging
+import tracemalloc
+
+import pytest
+from scrapy import Spider
+from scrapy.exceptions import NotConfigured
+from scrapy.utils.test import get_crawler
+
+from hook_crawlers.product_crawler.extensions import StructuredLogging, TracemallocStats
+
+
+def test_tracemalloc_snapshot_in_stats():
+    crawler = get_crawler(Spider, {"TRACEMALLOC_ENABLED": True, "TRACEMALLOC_TOP": 3})
+    spider = Spider.from_crawler(crawler, name="test")
+    ext = TracemallocStats.from_crawler(crawler)
+
+    ext.spider_opened(spider)
+    allocated = [bytearray(1024) for _ in range(100)]
+    ext.spider_closed(spider)
+
+    stats = crawler.stats.get_stats()
+    assert allocated
+    assert stats["tracemalloc/peak_bytes"] > 0
+    assert "tracemalloc/top/0" in stats
+    assert "tracemalloc/top/3" not in stats
+
+
+def test_structured_logging_is_off_by_default():
+    crawler = get_crawler(Spider)
+    with pytest.raises(NotConfigured):
+        StructuredLogging.from_crawler(crawler)
+
+
+def test_structured_logging_moves_root_handlers_to_a_thread(mocker):
+    crawler = get_crawler(Spider, {"LOG_JSON_ENABLED": True})
+    root = logging.getLogger()
+    handler = logging.StreamHandler(io.StringIO())
+    mocker.patch.object(root, "handlers", [handler])
+
+    ext = StructuredLogging.from_crawler(crawler)
+    assert root.handlers == [ext.logging.queue_handler]
+    ext.engine_stopped()
+    assert root.handlers == [handler]
+
+
+def test_structured_logging_is_shared_by_the_crawlers_of_a_process(mocker):
+    crawlers = [get_crawler(Spider, {"LOG_JSON_ENABLED": True}) for _ in range(2)]
+    root = logging.getLogger()
+    handler = logging.StreamHandler(io.StringIO())
+    mocker.patch.object(root, "handlers", [handler])
+
+    exts = [StructuredLogging.from_crawler(c) for c in crawlers]
+    assert exts[0].logging is exts[1].logging
+    exts[0].engine_stopped()
+    assert root.handlers == [exts[1].logging.queue_handler]
+    exts[1].engine_stopped()
+    assert root.handlers == [handler]
+
+
+def test_tracemalloc_is_shared_by_the_crawlers_of_a_process():
+    crawlers = [get_crawler(Spider, {"TRACEMALLOC_ENABLED": True}) for _ in range(2)]
+    spiders = [Spider.from_crawler(c, name=f"test{n}") for n, c in enumerate(crawlers)]
+    exts = [TracemallocStats.from_crawler(c) for c in crawlers]
+
+    for ext, spider in zip(exts, spiders):
+        ext.spider_opened(spider)
+    exts[0].spider_closed(spiders[0])
+    assert tracemalloc.is_tracing()
+    exts[1].spider_closed(spiders[1])
+    assert not tracemalloc.is_tracing()
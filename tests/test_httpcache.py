@@ -0,0 +1,87 @@
+import time
+
+import pytest
+from scrapy import Request, Spider
+from scrapy.http import HtmlResponse
+from scrapy.utils.test import get_crawler
+
+from hook_crawlers.product_crawler.httpcache import (
+    ArchivedResponse,
+    ContentAddressedCacheStorage,
+    ResponseArchive,
+)
+
+
+def make_entry(archive: ResponseArchive, run_id: str, body: bytes, timestamp=None):
+    return ArchivedResponse(
+        fingerprint="f" * 40,
+        run_id=run_id,
+        url="https://example.com/product/1",
+        method="GET",
+        status=200,
+        response_url="https://example.com/product/1",
+        headers=b"Content-Type: text/html",
+        blob=archive.put_blob(body),
+        callback="parse_product",
+        cb_kwargs="{}",
+        timestamp=timestamp or time.time(),
+    )
+
+
+@pytest.fixture
+def archive(tmp_path):
+    archive = ResponseArchive(str(tmp_path / "spider"))
+    yield archive
+    archive.close()
+
+
+def test_same_body_is_stored_once(archive: ResponseArchive):
+    archive.put(make_entry(archive, "run-1", b"<html>same</html>", 1))
+    archive.put(make_entry(archive, "run-2", b"<html>same</html>", 2))
+
+    assert archive.runs() == ["run-1", "run-2"]
+    (blob_count,) = archive.db.execute("SELECT COUNT(*) FROM blobs").fetchone()
+    assert blob_count == 1
+
+
+def test_evict_oldest_runs(archive: ResponseArchive):
+    archive.put(make_entry(archive, "run-1", b"old" * 1000, 1))
+    archive.put(make_entry(archive, "run-2", b"new", 2))
+
+    assert archive.evict(archive.total_size() - 1) == 1
+    assert archive.runs() == ["run-2"]
+    assert archive.latest("f" * 40).run_id == "run-2"
+
+
+def test_compact_keeps_latest_response(archive: ResponseArchive):
+    archive.put(make_entry(archive, "run-1", b"old", 1))
+    archive.put(make_entry(archive, "run-2", b"new", 2))
+
+    result = archive.compact(retention_secs=1)
+    assert result["deleted_responses"] == 1
+    assert archive.runs() == ["run-2"]
+    assert archive.read_blob(archive.latest("f" * 40).blob) == b"new"
+
+
+def test_storage_round_trip(tmp_path):
+    crawler = get_crawler(
+        Spider,
+        {
+            "HTTPCACHE_DIR": str(tmp_path),
+            "HTTPCACHE_EXPIRATION_SECS": 0,
+            "HTTPCACHE_ARCHIVE_TTL": {r"/listing/": 1},
+        },
+    )
+    spider = Spider.from_crawler(crawler, name="test")
+    storage = ContentAddressedCacheStorage(crawler.settings)
+    storage.open_spider(spider)
+
+    request = Request("https://example.com/product/1")
+    response = HtmlResponse(request.url, body=b"<html>product</html>")
+    storage.store_response(spider, request, response)
+
+    cached = storage.retrieve_response(spider, request)
+    assert cached.body == response.body
+    assert isinstance(cached, HtmlResponse)
+    assert storage.retrieve_response(spider, Request("https://example.com/2")) is None
+    storage.close_spider(spider)
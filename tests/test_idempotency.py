@@ -0,0 +1,37 @@
+from datetime import date
+
+from figure_parser import Release
+
+from hook_crawlers.product_crawler.libs.idempotency import (
+    IDEMPOTENCY_KEY_HEADER,
+    product_idempotency_key,
+    release_idempotency_key,
+    with_idempotency_key,
+)
+
+
+def test_product_key_is_the_one_of_the_canonical_url():
+    assert product_idempotency_key(
+        "https://www.goodsmile.info/en/product/1/a.html"
+    ) == product_idempotency_key("https://www.goodsmile.info/en/product/1")
+    assert product_idempotency_key(
+        "https://www.goodsmile.info/ja/product/1"
+    ) != product_idempotency_key("https://www.goodsmile.info/ja/product/2")
+
+
+def test_release_key():
+    url = "https://www.goodsmile.info/ja/product/1"
+    release = Release(release_date=date(2023, 1, 1), price=12000, tax_including=True)
+    key = release_idempotency_key(url, 0, release)
+
+    assert key.startswith("release-")
+    assert key == release_idempotency_key(url, 0, release.copy())
+    assert key != release_idempotency_key(url, 1, release)
+    assert key != release_idempotency_key(url, 0, release.copy(update={"price": 1}))
+
+
+def test_with_idempotency_key(mocker):
+    client = mocker.Mock()
+    assert with_idempotency_key(client, None) is client
+    assert with_idempotency_key(client, "k") is client.with_headers.return_value
+    client.with_headers.assert_called_once_with({IDEMPOTENCY_KEY_HEADER: "k"})
@@ -0,0 +1,91 @@
+from io import BytesIO
+
+from PIL import Image
+
+from hook_crawlers.product_crawler.images import (
+    ByteBudget,
+    available_formats,
+    dhash,
+    fingerprint,
+    make_derivatives,
+)
+from hook_crawlers.product_crawler.libs.image_index import ImageIndex
+
+
+def make_image(width: int = 1200, height: int = 900) -> bytes:
+    buf = BytesIO()
+    Image.new("RGB", (width, height), "red").save(buf, "JPEG")
+    return buf.getvalue()
+
+
+def make_gradient(angle: int, size: int = 256, fmt: str = "PNG", **params) -> bytes:
+    image = Image.linear_gradient("L").rotate(angle).resize((size, size))
+    buf = BytesIO()
+    image.convert("RGB").save(buf, fmt, **params)
+    return buf.getvalue()
+
+
+def test_available_formats():
+    assert available_formats(["webp", "NOT_A_FORMAT"]) == ["WEBP"]
+
+
+def test_make_derivatives():
+    derivatives = make_derivatives(make_image(), {"small": 320}, ["WEBP"])
+    assert [(name, ext) for name, ext, _ in derivatives] == [
+        ("full", "webp"),
+        ("small", "webp"),
+    ]
+
+    sizes = {}
+    for name, _, data in derivatives:
+        with Image.open(BytesIO(data)) as image:
+            assert image.format == "WEBP"
+            sizes[name] = image.size
+    assert sizes == {"full": (1200, 900), "small": (320, 240)}
+
+
+def test_byte_budget():
+    budget = ByteBudget(limit=100)
+    fired = []
+    budget.acquire(60).addCallback(lambda _: fired.append("a"))
+    budget.acquire(60).addCallback(lambda _: fired.append("b"))
+    budget.acquire(10).addCallback(lambda _: fired.append("c"))
+    assert fired == ["a"]
+
+    budget.release(60)
+    assert fired == ["a", "b", "c"]
+
+    # Bigger than the whole budget, served once everything is released.
+    budget.acquire(500).addCallback(lambda _: fired.append("d"))
+    assert fired == ["a", "b", "c"]
+    budget.release(60)
+    budget.release(10)
+    assert fired == ["a", "b", "c", "d"]
+
+
+def test_dhash_of_near_identical_images():
+    original = dhash(make_gradient(30))
+    copy = dhash(make_gradient(30, size=180, fmt="JPEG", quality=60))
+    other = dhash(make_gradient(210))
+    assert fingerprint(make_gradient(30)) == (original, (256, 256))
+
+    assert bin(original ^ copy).count("1") <= 4
+    assert bin(original ^ other).count("1") > 16
+
+
+def test_nearest_image(tmp_path):
+    index = ImageIndex(str(tmp_path / "images.sqlite"))
+    index.put_dhash("full/a.jpg", 0xFFFF_0000_FFFF_0000, (600, 800))
+    index.put_dhash("full/b.jpg", 0x0123_4567_89AB_CDEF, (600, 800))
+
+    assert index.nearest(0xFFFF_0000_FFFF_0001, 4, (600, 800)) == ("full/a.jpg", 1)
+    # 7 flipped bits, one in each of 7 bands: the eighth band still matches.
+    assert index.nearest(
+        0x0123_4567_89AB_CDEF ^ 0x0101_0101_0101_0100, 7, (600, 800)
+    ) == (
+        "full/b.jpg",
+        7,
+    )
+    assert index.nearest(0x0F0F_0F0F_0F0F_0F0F, 4, (600, 800)) is None
+    # Near hashes of another size aren't the same image.
+    assert index.nearest(0xFFFF_0000_FFFF_0001, 4, (300, 400)) is None
@@ -0,0 +1,75 @@
+import time
+
+from scrapy.http import HtmlResponse
+
+from hook_crawlers.product_crawler.libs.listing import ListingExtractor
+from hook_crawlers.product_crawler.libs.listing_store import ListingSummaryStore
+
+PAGE = b"""
+<html><body>
+<div id="top_nav"><ul class="page"><li><a href="/item/item2023.php">2023</a></li></ul></div>
+<section><a href="/creators/1/">one</a></section>
+<section><a href="/creators/2/">two</a></section>
+<div><span class="pages">1 / <b>42</b></span></div>
+</body></html>
+"""
+
+
+def make_response():
+    return HtmlResponse(url="https://www.native-web.jp/creators/", body=PAGE)
+
+
+def test_extract_links():
+    extractor = ListingExtractor("section > a", deny=r"/2/")
+    links = extractor.extract_links(make_response())
+    assert [link.url for link in links] == ["https://www.native-web.jp/creators/1/"]
+
+
+def test_extract_text():
+    extractor = ListingExtractor(
+        metadata={"pages": ".pages", "end_year": "#top_nav > .page > li > a"}
+    )
+    response = make_response()
+    assert extractor.extract_text(response, "pages") == "1 / 42"
+    assert extractor.extract_text(response, "end_year") == "2023"
+    assert extractor.extract_links(response) == []
+
+
+def test_missing_metadata():
+    extractor = ListingExtractor(metadata={"pages": ".nothing"})
+    assert extractor.extract_text(make_response(), "pages") is None
+
+
+def test_extract_summaries():
+    extractor = ListingExtractor("section > a", summary_items_xpath="//section")
+    summaries = extractor.extract_summaries(make_response())
+    assert list(summaries) == [
+        "https://www.native-web.jp/creators/1/",
+        "https://www.native-web.jp/creators/2/",
+    ]
+    assert summaries == extractor.extract_summaries(make_response())
+
+    changed = HtmlResponse(
+        url="https://www.native-web.jp/creators/",
+        body=PAGE.replace(b">two<", b">two (resale)<"),
+    )
+    changed_summaries = extractor.extract_summaries(changed)
+    url_1, url_2 = summaries
+    assert changed_summaries[url_1] == summaries[url_1]
+    assert changed_summaries[url_2] != summaries[url_2]
+
+
+def test_listing_summary_store(tmp_path, monkeypatch):
+    store = ListingSummaryStore(str(tmp_path / "listing.sqlite"))
+    url = "https://www.native-web.jp/creators/1/"
+    assert store.should_fetch(url, "a", recrawl_secs=3600)
+
+    store.record(url, "a")
+    assert store.is_unchanged(url, "a")
+    assert not store.is_unchanged(url, "b")
+    assert not store.should_fetch(url, "a", recrawl_secs=3600)
+    assert store.should_fetch(url, "b", recrawl_secs=3600)
+
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 7200)
+    assert store.should_fetch(url, "a", recrawl_secs=3600)
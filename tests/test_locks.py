@@ -0,0 +1,27 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from hook_crawlers.product_crawler.libs.locks import KeyedLocks
+
+
+def test_one_holder_per_key():
+    locks = KeyedLocks()
+    holders = {"a": 0, "b": 0}
+    most = {"a": 0, "b": 0}
+    guard = threading.Lock()
+
+    def hold(key: str):
+        with locks.hold(key):
+            with guard:
+                holders[key] += 1
+                most[key] = max(most[key], holders[key])
+            time.sleep(0.01)
+            with guard:
+                holders[key] -= 1
+
+    with ThreadPoolExecutor(8) as executor:
+        list(executor.map(hold, ["a", "b"] * 8))
+
+    assert most == {"a": 1, "b": 1}
+    assert len(locks) == 0
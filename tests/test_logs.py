@@ -0,0 +1,74 @@
+import io
+import json
+import logging
+
+from hook_crawlers.product_crawler.logs import (
+    BackgroundLogging,
+    JsonFormatter,
+    SamplingFilter,
+)
+
+
+def make_record(msg, *args, level=logging.INFO, **extra):
+    record = logging.LogRecord("test", level, __file__, 1, msg, args, None)
+    record.__dict__.update(extra)
+    return record
+
+
+def test_json_formatter(mocker):
+    spider = mocker.Mock()
+    spider.name = "gsc_product"
+    line = JsonFormatter().format(
+        make_record('Parsing "%s"', "https://a", spider=spider)
+    )
+
+    entry = json.loads(line)
+    assert entry["message"] == 'Parsing "https://a"'
+    assert (entry["level"], entry["logger"], entry["spider"]) == (
+        "INFO",
+        "test",
+        "gsc_product",
+    )
+
+
+def test_sampling_keeps_warnings_and_other_messages():
+    sampling = SamplingFilter(0.25, ['Parsing "', "Successfully"])
+    kept = [sampling.filter(make_record(f'Parsing "{n}"')) for n in range(8)] + [
+        sampling.filter(make_record("Successfully save data")) for _ in range(2)
+    ]
+
+    assert kept == [True, False, False, False, True, False, False, False, True, False]
+    assert sampling.filter(make_record('Parsing "9"', level=logging.WARNING))
+    assert sampling.filter(make_record("Spider opened"))
+    assert not SamplingFilter(0, ['Parsing "']).filter(make_record('Parsing "1"'))
+
+
+def test_background_logging():
+    logger = logging.getLogger("test_background_logging")
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    stream = io.StringIO()
+    handler = logging.StreamHandler(stream)
+    logger.addHandler(handler)
+
+    background = BackgroundLogging(
+        JsonFormatter(), filters=[SamplingFilter(0.5, ["Parsing"])]
+    )
+    assert background.install(logger)
+    assert logger.handlers == [background.queue_handler]
+    args = ["a"]
+    for _ in range(4):
+        logger.info("Parsing %s", args)
+    args.append("b")
+    logger.error("Failed")
+    background.uninstall()
+
+    lines = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert [line["message"] for line in lines] == [
+        "Parsing ['a']",
+        "Parsing ['a']",
+        "Failed",
+    ]
+    assert lines[0]["sample_rate"] == 0.5
+    assert logger.handlers == [handler]
+    assert not isinstance(handler.formatter, JsonFormatter)
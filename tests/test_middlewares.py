@@ -0,0 +1,66 @@
+from pytest_mock import MockerFixture
+from scrapy import Request
+from scrapy.http import HtmlResponse
+from scrapy.settings import Settings
+from scrapy.utils.test import get_crawler
+
+from hook_crawlers.product_crawler.libs.quarantine import Quarantine
+from hook_crawlers.product_crawler.middlewares import (
+    QuarantineFailedResponses,
+    SharedRandomProxy,
+)
+from hook_crawlers.product_crawler.spiders.gsc_post import GscNewDelayPostSpider
+
+
+def test_shared_proxy_pool(tmp_path):
+    proxy_list = tmp_path / "proxy-list.txt"
+    proxy_list.write_text("http://127.0.0.1:8080\nhttp://127.0.0.2:8080\n")
+    settings = Settings({"PROXY_LIST": str(proxy_list), "PROXY_MODE": 0})
+
+    proxy_a = SharedRandomProxy(settings)
+    proxy_b = SharedRandomProxy(settings)
+    assert len(proxy_a.proxies) == 2
+
+    del proxy_a.proxies["http://127.0.0.1:8080"]
+    assert "http://127.0.0.1:8080" not in proxy_b.proxies
+
+
+def test_quarantine_failed_responses(tmp_path, mocker: MockerFixture):
+    quarantine = Quarantine(str(tmp_path / "quarantine.sqlite"))
+    middleware = QuarantineFailedResponses(quarantine, store_body=True)
+    spider = mocker.Mock(spec=["name", "crawler"])
+    spider.name = "gsc_delay_post"
+
+    def parse_product(response, jan):
+        ...
+
+    url = "https://www.goodsmile.info/ja/product/1/a.html"
+    request = Request(url, callback=parse_product, cb_kwargs={"jan": "4580000000001"})
+    response = HtmlResponse(url, body=b"<html></html>", request=request)
+    middleware.process_spider_exception(response, ValueError("No name"), spider)
+
+    [entry] = quarantine.entries(stage="parse")
+    assert (entry.url, entry.spider, entry.callback) == (
+        url,
+        "gsc_delay_post",
+        "parse_product",
+    )
+    assert entry.cb_kwargs == '{"jan": "4580000000001"}'
+    assert entry.error == "ValueError('No name')"
+    assert quarantine.body(url, "parse") == b"<html></html>"
+
+
+def test_quarantine_failed_rule_callback(tmp_path):
+    crawler = get_crawler(
+        GscNewDelayPostSpider, settings_dict={"CRAWLER_STATE_DIR": str(tmp_path)}
+    )
+    spider = GscNewDelayPostSpider.from_crawler(crawler)
+
+    url = "https://www.goodsmile.info/ja/post/1/a.html"
+    request = Request(url, callback=spider._callback, meta={"rule": 0, "link_text": ""})
+    response = HtmlResponse(url, body=b"<html></html>", request=request)
+    assert QuarantineFailedResponses.callback_of(response, spider) == (
+        "gsc_new_delay_post",
+        "parse_delay_post",
+        {},
+    )
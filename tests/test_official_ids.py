@@ -0,0 +1,22 @@
+from hook_crawlers.product_crawler.libs.official_ids import (
+    OfficialIdIndex,
+    parse_official_id,
+)
+
+
+def test_parse_official_id():
+    assert parse_official_id("https://www.goodsmile.info/ja/product/10419/x.html") == (
+        "www.goodsmile.info",
+        "10419",
+    )
+    assert parse_official_id("https://www.native-web.jp/creators/4891/") is None
+
+
+def test_find(tmp_path):
+    index = OfficialIdIndex(str(tmp_path / "official_ids.sqlite"))
+    url = "https://www.goodsmile.info/ja/product/10419/x.html"
+    assert index.add(url)
+    assert not index.add("https://www.native-web.jp/creators/4891/")
+
+    assert index.find("www.goodsmile.info", ["10419", "10420"]) == {"10419": url}
+    assert index.find("www.goodsmile.info", []) == {}
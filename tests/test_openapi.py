@@ -0,0 +1,79 @@
+from hook_crawlers.product_crawler.libs.openapi import OpenApiSchemas, field_name
+
+SPEC = {
+    "components": {
+        "schemas": {
+            "ProductCreate": {
+                "type": "object",
+                "required": ["name", "url", "checksum", "official_images"],
+                "properties": {
+                    "name": {"type": "string", "maxLength": 16},
+                    "url": {"type": "string", "format": "uri", "minLength": 1},
+                    "checksum": {"type": "string"},
+                    "jan": {"type": "string", "maxLength": 13},
+                    "scale": {"type": "integer", "minimum": 1},
+                    "order_period_start": {"type": "string", "format": "date-time"},
+                    "official_images": {
+                        "type": "array",
+                        "items": {"type": "string", "format": "uri"},
+                    },
+                    "release": {"$ref": "#/components/schemas/Release"},
+                },
+            },
+            "Release": {
+                "type": "object",
+                "required": ["price"],
+                "properties": {
+                    "price": {"type": "integer"},
+                    "release_date": {"type": "string", "format": "date"},
+                },
+            },
+        }
+    }
+}
+
+
+def make_payload(**kwargs):
+    payload = {
+        "name": "Figure",
+        "url": "https://www.goodsmile.info/ja/product/1",
+        "checksum": "abc",
+        "jan": None,
+        "order_period_start": "2022-01-01T00:00:00+09:00",
+        "official_images": ["https://images.goodsmile.info/1.jpg"],
+        "release": {"price": 12000, "release_date": "2022-10-01"},
+    }
+    payload.update(kwargs)
+    return payload
+
+
+def test_valid_payload():
+    assert OpenApiSchemas(SPEC).validate("ProductCreate", make_payload()) == []
+
+
+def test_invalid_payload():
+    schemas = OpenApiSchemas(SPEC)
+    payload = make_payload(
+        name="A very long figure name",
+        jan="45800000000012",
+        scale=True,
+        official_images=["https://images.goodsmile.info/1.jpg", "/2.jpg"],
+        release={"release_date": "2022-13-01"},
+    )
+    del payload["checksum"]
+
+    assert schemas.validate("ProductCreate", payload) == [
+        ("checksum", "required"),
+        ("name", "longer than 16"),
+        ("jan", "longer than 13"),
+        ("official_images[1]", "not a valid uri"),
+        ("release.price", "required"),
+        ("release.release_date", "not a valid date"),
+        ("scale", "expected integer"),
+    ]
+
+
+def test_field_name():
+    assert field_name("release.price") == "release"
+    assert field_name("official_images[1]") == "official_images"
+    assert field_name("") == "<root>"
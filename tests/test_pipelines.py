@@ -1,8 +1,40 @@
+import hashlib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from io import BytesIO
+
+import pytest
+from figure_hook_client.models import ProductReleaseInfoInDB
+from PIL import Image
+from pytest_mock import MockerFixture
+from scrapy import Request
+from scrapy.exceptions import DropItem
+from scrapy.http import Response
+from scrapy.pipelines.files import S3FilesStore
+from scrapy.settings import Settings
+from twisted.internet.defer import Deferred
+from twisted.python.failure import Failure
+
+from hook_crawlers.product_crawler.images import fingerprint
+from hook_crawlers.product_crawler.items import ReleaseDelay
+from hook_crawlers.product_crawler.libs.idempotency import product_idempotency_key
+from hook_crawlers.product_crawler.libs.product_index import ProductIndex
+from hook_crawlers.product_crawler.libs.product_urls import canonical_product_url
+from hook_crawlers.product_crawler.libs.quarantine import Quarantine
 from hook_crawlers.product_crawler.pipelines import (
+    ApplyReleaseDelayPipeline,
+    S3ImagePipeline,
+    SaveProductInDatabasePipeline,
     fill_announced_date,
     get_last_release,
     is_announcement_spider,
 )
+from hook_crawlers.product_crawler.repositories.exceptions import (
+    CircuitOpenError,
+    PayloadValidationError,
+)
 
 
 def test_get_last_release(product_base_factory):
@@ -28,3 +60,405 @@ def test_filling_announced_date(product_base_factory):
     releases = product.releases
     assert releases
     assert releases[-1].announced_at is not None
+
+
+class TestSaveProductInDatabasePipeline:
+    def test_quarantine_invalid_product(
+        self, tmp_path, mocker: MockerFixture, product_base_factory
+    ):
+        product_repo = mocker.Mock()
+        product_repo.get_product_by_url.return_value = None
+        product_repo.create_product.side_effect = PayloadValidationError(
+            "ProductCreate",
+            [("jan", "longer than 13"), ("releases[0].price", "expected integer")],
+        )
+        quarantine = Quarantine(str(tmp_path / "quarantine.sqlite"))
+        pipeline = SaveProductInDatabasePipeline(
+            product_repo,
+            mocker.Mock(),
+            ProductIndex(),
+            mocker.Mock(),
+            quarantine,
+            write_concurrency=0,
+        )
+        spider = mocker.Mock(is_announcement_spider=False)
+        spider.name = "gsc_product"
+        product = product_base_factory.build(
+            url="https://www.goodsmile.info/ja/product/1"
+        )
+
+        with pytest.raises(DropItem):
+            pipeline.process_item(product, spider)
+
+        [entry] = quarantine.entries(stage="validation")
+        assert (entry.url, entry.spider) == (product.url, "gsc_product")
+        assert spider.crawler.stats.inc_value.call_args_list == [
+            mocker.call("validation/rejected", spider=spider),
+            mocker.call("validation/rejected/jan", spider=spider),
+            mocker.call("validation/rejected/releases", spider=spider),
+        ]
+        pipeline.release_repo.create_release_own_by_product.assert_not_called()
+
+    @pytest.mark.parametrize("saved", [False, True])
+    def test_failed_saves_are_dropped(
+        self, saved, tmp_path, mocker: MockerFixture, product_base_factory
+    ):
+        # Dropped items aren't scraped, so their listing summary isn't recorded.
+        product_repo = mocker.Mock()
+        product_repo.get_product_by_url.return_value = (
+            mocker.Mock(id=1, checksum="outdated") if saved else None
+        )
+        product_repo.create_product.side_effect = RuntimeError("api is down")
+        product_repo.update_product.side_effect = RuntimeError("api is down")
+        release_repo = mocker.Mock()
+        release_repo.get_releases_by_product_id.return_value = []
+        quarantine = Quarantine(str(tmp_path / "quarantine.sqlite"))
+        pipeline = SaveProductInDatabasePipeline(
+            product_repo,
+            release_repo,
+            ProductIndex(),
+            mocker.Mock(),
+            quarantine,
+            write_concurrency=0,
+        )
+        spider = mocker.Mock(is_announcement_spider=False)
+        spider.name = "gsc_product"
+        product = product_base_factory.build(
+            url="https://www.goodsmile.info/ja/product/1", releases=[]
+        )
+
+        with pytest.raises(DropItem):
+            pipeline.process_item(product, spider)
+
+        [entry] = quarantine.entries(stage="save")
+        assert entry.url == product.url
+
+    def test_concurrent_items_of_a_url_create_one_product(
+        self, tmp_path, mocker: MockerFixture, product_base_factory
+    ):
+        product_repo = mocker.Mock()
+        # A slow lookup, every item would miss the product without the url lock.
+        product_repo.get_product_by_url.side_effect = lambda **_: time.sleep(0.05)
+        product_repo.create_product.return_value = mocker.Mock(
+            id=1, checksum="outdated"
+        )
+        release_repo = mocker.Mock()
+        release_repo.get_releases_by_product_id.return_value = []
+        pipeline = SaveProductInDatabasePipeline(
+            product_repo,
+            release_repo,
+            ProductIndex(),
+            mocker.Mock(),
+            Quarantine(str(tmp_path / "quarantine.sqlite")),
+            write_concurrency=0,
+        )
+        spider = mocker.Mock(is_announcement_spider=False)
+        spider.name = "gsc_product"
+        url = "https://www.goodsmile.info/ja/product/1"
+        products = [product_base_factory.build(url=url, releases=[]) for _ in range(4)]
+
+        with ThreadPoolExecutor(4) as executor:
+            list(executor.map(lambda p: pipeline.save_item(p, spider), products))
+
+        product_repo.create_product.assert_called_once()
+        assert product_repo.get_product_by_url.call_count == 1
+        assert product_repo.create_product.call_args.kwargs[
+            "idempotency_key"
+        ] == product_idempotency_key(url)
+
+    def test_items_are_saved_off_the_calling_thread(
+        self, tmp_path, mocker: MockerFixture, product_base_factory
+    ):
+        threads = []
+        product_repo = mocker.Mock()
+        product_repo.get_product_by_url.side_effect = lambda **_: threads.append(
+            threading.get_ident()
+        )
+        pipeline = SaveProductInDatabasePipeline(
+            product_repo,
+            mocker.Mock(),
+            ProductIndex(),
+            mocker.Mock(),
+            Quarantine(str(tmp_path / "quarantine.sqlite")),
+        )
+        spider = mocker.Mock(is_announcement_spider=False)
+        spider.name = "gsc_product"
+        product = product_base_factory.build(
+            url="https://www.goodsmile.info/ja/product/1"
+        )
+
+        assert isinstance(pipeline.process_item(product, spider), Deferred)
+        assert pipeline.executor
+        pipeline.executor.shutdown(wait=True)
+        assert threads and threads[0] != threading.get_ident()
+
+
+class TestApplyReleaseDelayPipeline:
+    URL = "https://www.goodsmile.info/ja/product/1234/a.html"
+
+    def make_db_release(self, release_id: int, shipped_at=None):
+        return ProductReleaseInfoInDB(
+            id=release_id,
+            product_id=1,
+            created_at=datetime.now(),
+            updated_at=datetime.now(),
+            price=12000,
+            tax_including=True,
+            initial_release_date=date(2999, 1, 1),
+            adjusted_release_date=None,
+            shipped_at=shipped_at,
+        )
+
+    def make_pipeline(self, mocker: MockerFixture, db_releases):
+        product_repo = mocker.Mock()
+        product_repo.get_product_by_url.return_value = mocker.Mock(id=1)
+        release_repo = mocker.Mock()
+        release_repo.get_releases_by_product_id.return_value = db_releases
+        return ApplyReleaseDelayPipeline(
+            product_repo, release_repo, ProductIndex(), write_concurrency=0
+        )
+
+    def test_patch_release_date(self, mocker: MockerFixture):
+        pipeline = self.make_pipeline(
+            mocker,
+            [
+                self.make_db_release(1, shipped_at=date(2020, 1, 1)),
+                self.make_db_release(2),
+            ],
+        )
+        item = ReleaseDelay(
+            url=self.URL, jan="4580000000001", release_date=date(2999, 3, 1)
+        )
+
+        assert pipeline.process_item(item, mocker.Mock()) is item
+        update_kwargs = pipeline.release_repo.update_release.call_args.kwargs
+        assert update_kwargs["release_id"] == 2
+        assert update_kwargs["release"].adjusted_release_date == date(2999, 3, 1)
+
+    def test_fall_back_to_product_page(self, mocker: MockerFixture):
+        pipeline = self.make_pipeline(
+            mocker, [self.make_db_release(1), self.make_db_release(2)]
+        )
+        item = ReleaseDelay(
+            url=self.URL, jan="4580000000001", release_date=date(2999, 3, 1)
+        )
+        spider = mocker.Mock()
+
+        with pytest.raises(DropItem):
+            pipeline.process_item(item, spider)
+        pipeline.release_repo.update_release.assert_not_called()
+        spider.product_request.assert_called_once_with(self.URL, "4580000000001")
+        spider.crawler.engine.crawl.assert_called_once()
+
+    def test_fill_in_the_missing_jan(self, mocker: MockerFixture):
+        pipeline = self.make_pipeline(
+            mocker, [self.make_db_release(1, shipped_at=date(2020, 1, 1))]
+        )
+        product = mocker.Mock(id=1, jan=None)
+        pipeline.product_repo.get_product_by_url.return_value = product
+        item = ReleaseDelay(
+            url=self.URL, jan="4580000000001", release_date=date(2999, 3, 1)
+        )
+
+        with pytest.raises(DropItem):
+            pipeline.process_item(item, mocker.Mock())
+        pipeline.product_repo.update_product_jan.assert_called_once_with(
+            product=product, jan="4580000000001"
+        )
+        assert (
+            pipeline.product_index.get(canonical_product_url(self.URL))
+            is pipeline.product_repo.update_product_jan.return_value
+        )
+
+    def test_fall_back_on_api_errors(self, mocker: MockerFixture):
+        pipeline = self.make_pipeline(mocker, [])
+        pipeline.release_repo.get_releases_by_product_id.side_effect = CircuitOpenError(
+            30
+        )
+        item = ReleaseDelay(
+            url=self.URL, jan="4580000000001", release_date=date(2999, 3, 1)
+        )
+        spider = mocker.Mock()
+
+        with pytest.raises(DropItem):
+            pipeline.process_item(item, spider)
+        spider.product_request.assert_called_once_with(self.URL, "4580000000001")
+
+    def test_products_pass_through(self, mocker: MockerFixture, product_base_factory):
+        pipeline = self.make_pipeline(mocker, [])
+        product = product_base_factory.build()
+        assert pipeline.process_item(product, mocker.Mock()) is product
+
+
+class TestS3ImagePipeline:
+    @pytest.fixture
+    def pipeline(self, tmp_path):
+        settings = Settings(
+            {
+                "CRAWLER_STATE_DIR": str(tmp_path / "state"),
+                "IMAGES_URLS_FIELD": "images",
+            }
+        )
+        return S3ImagePipeline(str(tmp_path / "images"), settings=settings)
+
+    @staticmethod
+    def make_image() -> bytes:
+        buf = BytesIO()
+        Image.new("RGB", (8, 8), "red").save(buf, "PNG")
+        return buf.getvalue()
+
+    def download(self, pipeline, url: str, body: bytes, info):
+        return pipeline.image_downloaded(Response(url, body=body), Request(url), info)
+
+    def test_identical_images_are_stored_once(self, pipeline, mocker: MockerFixture):
+        persist_file = mocker.spy(pipeline.store, "persist_file")
+        info = mocker.Mock()
+        body = self.make_image()
+
+        checksum = self.download(pipeline, "https://example.com/a.png", body, info)
+        assert (
+            self.download(pipeline, "https://example.com/b.png", body, info) == checksum
+        )
+        persist_file.assert_called_once()
+
+        path = persist_file.call_args.args[0]
+        assert path == f"full/{hashlib.sha1(body).hexdigest()}.jpg"
+
+    def test_indexed_images_are_not_downloaded(self, pipeline, mocker: MockerFixture):
+        request = Request("https://example.com/a.png")
+        info = mocker.Mock()
+        assert pipeline.media_to_download(request, info) is None
+
+        pipeline.image_index.put(request.url, "checksum", "full/abc.jpg")
+        assert pipeline.media_to_download(request, info) == {
+            "url": request.url,
+            "path": "full/abc.jpg",
+            "checksum": "checksum",
+            "status": "uptodate",
+            "derivatives": {},
+        }
+
+    def test_images_saved_in_database_are_not_downloaded_again(
+        self, pipeline, mocker: MockerFixture, product_base_factory
+    ):
+        pipeline.expires = 1
+        product = product_base_factory.build(
+            url="https://www.goodsmile.info/ja/product/1",
+            images=["https://example.com/a.png", "https://example.com/b.png"],
+        )
+        for url, path in zip(product.images, ["full/a.jpg", "full/b.jpg"]):
+            pipeline.image_index.put(url, "checksum", path)
+        mocker.patch("time.time", return_value=time.time() + 2 * 24 * 60 * 60)
+        pipeline.product_index = ProductIndex()
+        pipeline.product_repo = mocker.Mock()
+        pipeline.product_repo.get_product_by_url.return_value = mocker.Mock(
+            official_images=[pipeline.stored_url("full/a.jpg")]
+        )
+
+        pipeline.get_saved_product(product.url, mocker.Mock())
+        [saved, changed] = [
+            pipeline.media_to_download(Request(url), mocker.Mock(), item=product)
+            for url in product.images
+        ]
+        assert saved["path"] == "full/a.jpg"
+        # Expired and not in the database, checked again.
+        assert changed is None
+
+    def test_images_are_replaced_in_place(
+        self, pipeline, tmp_path, mocker: MockerFixture, product_base_factory
+    ):
+        product = product_base_factory.build(
+            images=["https://example.com/a.jpg", "https://example.com/b.jpg"]
+        )
+        requests = pipeline.get_media_requests(product, mocker.Mock())
+        assert [request.url for request in requests] == product.images
+
+        results = [
+            (
+                True,
+                {
+                    "url": "https://example.com/a.jpg",
+                    "path": "full/0.jpg",
+                    "checksum": "0",
+                    "status": "uptodate",
+                },
+            ),
+            (False, Failure(IOError("download failed"))),
+        ]
+        assert pipeline.item_completed(results, product, mocker.Mock()) is product
+        assert product.images == [
+            f'{tmp_path / "images"}/full/0.jpg',
+            "https://example.com/b.jpg",
+        ]
+
+    def test_stored_s3_url(self, pipeline, mocker: MockerFixture):
+        pipeline.store = mocker.Mock(spec=S3FilesStore, bucket="bucket", prefix="hook/")
+        assert (
+            pipeline.stored_url("full/0.jpg")
+            == "https://bucket.s3.amazonaws.com/hook/full/0.jpg"
+        )
+
+    def test_store_derivatives(self, pipeline, tmp_path, mocker: MockerFixture):
+        result = {
+            "url": "https://example.com/a.png",
+            "path": "full/abc.jpg",
+            "checksum": "checksum",
+            "status": "downloaded",
+        }
+        derivatives = [("full", "webp", b"full"), ("small", "webp", b"small")]
+
+        stored = []
+        pipeline.store_derivatives(derivatives, result, mocker.Mock()).addCallback(
+            stored.append
+        )
+        assert stored == [result]
+        assert result["derivatives"] == {
+            "full.webp": "derivatives/abc/full.webp",
+            "small.webp": "derivatives/abc/small.webp",
+        }
+        assert (tmp_path / "images/derivatives/abc/small.webp").read_bytes() == b"small"
+
+        pipeline.image_index.put(result["url"], "checksum", "full/abc.jpg")
+        indexed = pipeline.media_to_download(Request(result["url"]), mocker.Mock())
+        assert indexed["derivatives"] == result["derivatives"]
+
+    def test_close_spider_does_not_wait_for_the_pool(
+        self, pipeline, mocker: MockerFixture
+    ):
+        pool = pipeline.image_pool = mocker.Mock()
+        pipeline.close_spider(mocker.Mock())
+        pool.shutdown.assert_called_once_with(wait=False)
+        assert pipeline.image_pool is None
+
+    def test_near_identical_images_are_stored_once(
+        self, tmp_path, mocker: MockerFixture
+    ):
+        settings = Settings(
+            {
+                "CRAWLER_STATE_DIR": str(tmp_path / "state"),
+                "IMAGES_DHASH_MAX_DISTANCE": 4,
+            }
+        )
+        pipeline = S3ImagePipeline(str(tmp_path / "images"), settings=settings)
+        persist_file = mocker.spy(pipeline.store, "persist_file")
+        info = mocker.Mock()
+
+        def gradient(size: int, fmt: str) -> bytes:
+            buf = BytesIO()
+            gradient = Image.linear_gradient("L").rotate(30).resize((size, size))
+            gradient.convert("RGB").save(buf, fmt)
+            return buf.getvalue()
+
+        def download(url: str, body: bytes):
+            # The fingerprint is computed on the process pool while crawling.
+            request = Request(url)
+            pipeline.match_near_duplicate(fingerprint(body), request)
+            pipeline.image_downloaded(Response(url, body=body), request, info)
+
+        download("https://example.com/a.png", gradient(256, "PNG"))
+        download("https://example.com/b.jpg", gradient(256, "JPEG"))
+        persist_file.assert_called_once()
+
+        # A resized copy is stored on its own.
+        download("https://example.com/c.jpg", gradient(180, "JPEG"))
+        assert persist_file.call_count == 2
@@ -0,0 +1,25 @@
+from hook_crawlers.product_crawler.libs.post_snapshot import PostSnapshotStore
+
+
+def test_new_posts(tmp_path):
+    store = PostSnapshotStore(str(tmp_path / "posts.sqlite"))
+    assert store.is_empty()
+    assert store.new_posts(["a", "b", "a"]) == ["a", "b"]
+
+    store.add(["a", "b"])
+    assert store.new_posts(["c", "a", "b"]) == ["c"]
+
+
+def test_snapshot_is_bounded(tmp_path):
+    store = PostSnapshotStore(str(tmp_path / "posts.sqlite"), max_posts=2)
+    store.add(["a"])
+    store.add(["b", "c"])
+    assert len(store) == 2
+    assert store.new_posts(["a", "b", "c"]) == ["a"]
+
+
+def test_validators(tmp_path):
+    store = PostSnapshotStore(str(tmp_path / "posts.sqlite"))
+    assert store.get_validators("https://example.com/") == (None, None)
+    store.set_validators("https://example.com/", '"v1"', None)
+    assert store.get_validators("https://example.com/") == ('"v1"', None)
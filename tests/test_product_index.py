@@ -0,0 +1,40 @@
+from hook_crawlers.product_crawler.libs.product_index import ProductIndex
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_least_recently_used_products_go_first():
+    index = ProductIndex(max_size=2)
+    index.put("https://a", 1)
+    index.put("https://b", 2)
+    assert index.get("https://a") == 1
+    index.put("https://c", 3)
+
+    assert len(index) == 2
+    assert "https://b" not in index
+    assert index.get("https://a") == 1
+
+
+def test_products_expire():
+    clock = FakeClock()
+    index = ProductIndex(ttl=60, clock=clock)
+    index.put("https://a", 1)
+    clock.now = 59
+    assert index.get("https://a") == 1
+
+    clock.now = 60
+    assert index.get("https://a") is None
+    assert len(index) == 0
+
+
+def test_no_limit_by_default():
+    index = ProductIndex()
+    for i in range(100):
+        index.put(f"https://{i}", i)
+    assert len(index) == 100
@@ -0,0 +1,76 @@
+import pytest
+from scrapy import Request
+from scrapy.utils.test import get_crawler
+
+from hook_crawlers.product_crawler.fingerprinter import CanonicalUrlRequestFingerprinter
+from hook_crawlers.product_crawler.libs.product_urls import canonical_product_url
+
+
+@pytest.mark.parametrize(
+    "url, expected",
+    [
+        (
+            "https://www.goodsmile.info/ja/product/10419/x.html",
+            "https://www.goodsmile.info/ja/product/10419",
+        ),
+        (
+            "https://www.goodsmile.info/en/product/10419/y.html?from=post#main",
+            "https://www.goodsmile.info/en/product/10419",
+        ),
+        (
+            "http://www.goodsmile.info/product/10419",
+            "https://www.goodsmile.info/ja/product/10419",
+        ),
+        (
+            "https://www.alter-web.jp/products/498/?ref=top",
+            "https://www.alter-web.jp/products/498/",
+        ),
+        (
+            "https://www.native-web.jp/creators/4891",
+            "https://www.native-web.jp/creators/4891/",
+        ),
+        # Not product pages.
+        (
+            "https://www.native-web.jp/creators/page/4/",
+            "https://www.native-web.jp/creators/page/4/",
+        ),
+        (
+            "https://www.goodsmile.info/ja/products/category/scale",
+            "https://www.goodsmile.info/ja/products/category/scale",
+        ),
+        (
+            "http://amakuni.info/item/2023/022.php",
+            "http://amakuni.info/item/2023/022.php",
+        ),
+    ],
+)
+def test_canonical_product_url(url, expected):
+    assert canonical_product_url(url) == expected
+
+
+def test_fingerprint_product_variants_once():
+    fingerprinter = CanonicalUrlRequestFingerprinter.from_crawler(get_crawler())
+
+    def fingerprint(url: str) -> bytes:
+        return fingerprinter.fingerprint(Request(url))
+
+    assert fingerprint("https://www.goodsmile.info/ja/product/1/a.html") == fingerprint(
+        "https://www.goodsmile.info/ja/product/1/b.html?from=post"
+    )
+    # The pages of each language are cached on their own.
+    assert fingerprint("https://www.goodsmile.info/ja/product/1/a.html") != fingerprint(
+        "https://www.goodsmile.info/en/product/1/a.html"
+    )
+    assert fingerprint("https://www.goodsmile.info/ja/product/1/a.html") != fingerprint(
+        "https://www.goodsmile.info/ja/product/2/a.html"
+    )
+
+
+def test_fingerprint_dont_canonicalize():
+    fingerprinter = CanonicalUrlRequestFingerprinter.from_crawler(get_crawler())
+    canonical = Request("https://www.goodsmile.info/ja/product/1")
+    slugged = Request(
+        "https://www.goodsmile.info/ja/product/1/a.html",
+        meta={"dont_canonicalize": True},
+    )
+    assert fingerprinter.fingerprint(canonical) != fingerprinter.fingerprint(slugged)
@@ -0,0 +1,65 @@
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+
+from hook_crawlers.product_crawler.libs.quarantine import Quarantine
+
+
+def test_latest_failure_per_url_and_stage(tmp_path):
+    quarantine = Quarantine(str(tmp_path / "quarantine.sqlite"))
+    quarantine.add("https://a", "validation", "gsc_product", [("jan", "required")])
+    quarantine.add("https://a", "validation", "gsc_product", [("name", "required")])
+    quarantine.add("https://b", "validation", "alter_product", "error", {"jan": 1})
+
+    assert len(quarantine) == 2
+    [entry] = quarantine.entries(spider="alter_product")
+    assert (entry.url, entry.error, entry.payload) == (
+        "https://b",
+        "error",
+        '{"jan": 1}',
+    )
+    [entry] = quarantine.entries(stage="validation", spider="gsc_product")
+    assert entry.error == '[["name", "required"]]'
+
+
+def test_body_and_discard(tmp_path):
+    quarantine = Quarantine(str(tmp_path / "quarantine.sqlite"))
+    url = "https://www.native-web.jp/creators/1/"
+    quarantine.add(url, "parse", "native_product", "error", body=b"<html></html>")
+    quarantine.add(url, "save", "native_product", "error")
+
+    assert quarantine.body(url, "parse") == b"<html></html>"
+    assert quarantine.body(url, "save") is None
+    quarantine.discard(url)
+    assert len(quarantine) == 0
+
+
+def test_add_columns_to_an_older_quarantine(tmp_path):
+    path = str(tmp_path / "quarantine.sqlite")
+    db = sqlite3.connect(path)
+    db.execute(
+        "CREATE TABLE quarantine (url TEXT NOT NULL, stage TEXT NOT NULL, spider TEXT NOT NULL,"
+        " error TEXT NOT NULL, payload TEXT, quarantined_at REAL NOT NULL, PRIMARY KEY (url, stage))"
+    )
+    db.execute(
+        "INSERT INTO quarantine VALUES ('https://a', 'validation', 's', 'e', NULL, 0)"
+    )
+    db.commit()
+    db.close()
+
+    quarantine = Quarantine(path)
+    quarantine.add("https://b", "parse", "s", "e", callback="parse_product")
+    assert [e.callback for e in quarantine.entries()] == [None, "parse_product"]
+
+
+def test_add_from_many_threads(tmp_path):
+    quarantine = Quarantine(str(tmp_path / "quarantine.sqlite"))
+    with ThreadPoolExecutor(8) as executor:
+        list(
+            executor.map(
+                lambda i: quarantine.add(
+                    f"https://{i}", "save", "gsc_product", "error"
+                ),
+                range(200),
+            )
+        )
+    assert len(quarantine) == 200
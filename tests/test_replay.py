@@ -0,0 +1,61 @@
+import time
+
+from scrapy.settings import Settings
+
+from hook_crawlers.product_crawler.httpcache import ArchivedResponse, ResponseArchive
+from hook_crawlers.product_crawler.replay import (
+    Replayer,
+    ReplayFilter,
+    offline_pipelines,
+)
+
+
+def test_replay_filter(tmp_path):
+    archive = ResponseArchive(str(tmp_path))
+    for url, callback in [
+        ("https://www.goodsmile.info/ja/product/1", "parse_product"),
+        ("https://www.goodsmile.info/ja/product/2", "parse_product"),
+        ("https://www.goodsmile.info/ja/products/category/scale", "parse"),
+    ]:
+        archive.put(
+            ArchivedResponse(
+                fingerprint=url,
+                run_id="run",
+                url=url,
+                method="GET",
+                status=200,
+                response_url=url,
+                headers=b"",
+                blob=archive.put_blob(url.encode()),
+                callback=callback,
+                cb_kwargs="{}",
+                timestamp=time.time(),
+            )
+        )
+
+    selected = ReplayFilter(url_pattern=r"/product/1$").select(archive)
+    assert [entry.url for entry in selected] == [
+        "https://www.goodsmile.info/ja/product/1"
+    ]
+    assert len(list(ReplayFilter().select(archive))) == 2
+    assert not list(ReplayFilter(archived_in=2000).select(archive))
+    archive.close()
+
+
+def test_offline_pipelines():
+    settings = Settings(
+        {
+            "ITEM_PIPELINES": {
+                "scrapy.pipelines.images.ImagesPipeline": 100,
+                "hook_crawlers.product_crawler.pipelines.SaveProductInDatabasePipeline": 400,
+            }
+        }
+    )
+    assert list(offline_pipelines(settings)) == [
+        "hook_crawlers.product_crawler.pipelines.SaveProductInDatabasePipeline"
+    ]
+
+
+def test_replay_saves_items_on_its_thread():
+    replayer = Replayer(Settings({"HOOK_API_WRITE_CONCURRENCY": 4}))
+    assert replayer.settings.getint("HOOK_API_WRITE_CONCURRENCY") == 0
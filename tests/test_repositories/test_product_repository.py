@@ -1,4 +1,10 @@
+import pytest
+from pytest_mock import MockerFixture
+
+from hook_crawlers.product_crawler.libs.openapi import OpenApiSchemas
+from hook_crawlers.product_crawler.repositories.exceptions import PayloadValidationError
 from hook_crawlers.product_crawler.repositories.product_repository import (
+    ProductRepository,
     product_base_to_product_create,
     product_base_to_product_update,
 )
@@ -12,3 +18,45 @@ def test_product_base_to_product_create(product_base_factory):
 def test_product_base_to_product_update(product_base_factory):
     product = product_base_factory.build()
     product_base_to_product_update(product_base=product, product_checksum="123")
+
+
+def test_get_product_by_url_falls_back_to_the_url_as_is(mocker: MockerFixture):
+    repo = ProductRepository(mocker.Mock())
+    product = mocker.Mock()
+    lookup = mocker.patch.object(
+        repo, "_get_product_by_url", side_effect=[None, product]
+    )
+
+    url = "https://www.goodsmile.info/ja/product/1/a.html"
+    assert repo.get_product_by_url(source_url=url) is product
+    assert [c.args[0] for c in lookup.call_args_list] == [
+        "https://www.goodsmile.info/ja/product/1",
+        url,
+    ]
+
+
+def test_invalid_payload_is_not_sent(mocker: MockerFixture):
+    schemas = OpenApiSchemas(
+        {
+            "components": {
+                "schemas": {
+                    "ProductCreate": {
+                        "type": "object",
+                        "properties": {"jan": {"type": "string", "maxLength": 13}},
+                    }
+                }
+            }
+        }
+    )
+    repo = ProductRepository(mocker.Mock(), schemas=schemas)
+    module = "hook_crawlers.product_crawler.repositories.product_repository"
+    mocker.patch(
+        f"{module}.product_base_to_product_create",
+        return_value=mocker.Mock(to_dict=lambda: {"jan": "45800000000012"}),
+    )
+    post = mocker.patch(f"{module}.create_product_api_v1_products_post")
+
+    with pytest.raises(PayloadValidationError) as e:
+        repo.create_product(product_base=mocker.Mock(), checksum="abc")
+    assert e.value.errors == [("jan", "longer than 13")]
+    post.sync_detailed.assert_not_called()
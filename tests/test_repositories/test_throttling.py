@@ -0,0 +1,123 @@
+import httpx
+import pytest
+from pytest_mock import MockerFixture
+
+from hook_crawlers.product_crawler.repositories.exceptions import CircuitOpenError
+from hook_crawlers.product_crawler.repositories.throttling import (
+    ApiCallPolicy,
+    CircuitBreaker,
+    TokenBucket,
+    parse_retry_after,
+)
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+        self.slept = []
+
+    def __call__(self) -> float:
+        return self.now
+
+    def sleep(self, secs: float):
+        self.slept.append(secs)
+        self.now += secs
+
+
+def make_policy(clock: FakeClock, rate=0, failure_threshold=0, **kwargs):
+    return ApiCallPolicy(
+        TokenBucket(rate, burst=1, clock=clock, sleep=clock.sleep),
+        CircuitBreaker(failure_threshold, reset_secs=30, clock=clock),
+        sleep=clock.sleep,
+        **kwargs,
+    )
+
+
+def response(mocker: MockerFixture, status_code: int, headers=None):
+    return mocker.Mock(status_code=status_code, headers=headers or {})
+
+
+def test_parse_retry_after():
+    assert parse_retry_after({"Retry-After": "3"}) == 3
+    assert parse_retry_after({"Retry-After": "Wed, 21 Oct 2015 07:28:00 GMT"}) == 0
+    assert parse_retry_after({"Retry-After": "soon"}) is None
+    assert parse_retry_after({}) is None
+
+
+def test_token_bucket_paces_calls():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=2, burst=1, clock=clock, sleep=clock.sleep)
+    for _ in range(3):
+        bucket.acquire()
+    assert clock.slept == [0.5, 0.5]
+
+    bucket.pause(10)
+    bucket.acquire()
+    assert clock.now == pytest.approx(11)
+
+
+def test_retry_after_is_honored(mocker: MockerFixture):
+    clock = FakeClock()
+    policy = make_policy(clock)
+    send = mocker.Mock(
+        side_effect=[
+            response(mocker, 429, {"Retry-After": "5"}),
+            response(mocker, 201),
+        ]
+    )
+
+    # A 429 is retried even for calls that aren't idempotent.
+    assert policy.call(send, idempotent=False).status_code == 201
+    assert clock.now == 5
+
+
+def test_retry_after_beyond_the_max_fails_the_call(mocker: MockerFixture):
+    clock = FakeClock()
+    policy = make_policy(clock, retry_after_max=60)
+    send = mocker.Mock(return_value=response(mocker, 429, {"Retry-After": "86400"}))
+
+    assert policy.call(send, idempotent=True).status_code == 429
+    send.assert_called_once()
+    assert policy.bucket.paused_until == 0
+    assert clock.now == 0
+
+
+def test_only_idempotent_calls_are_retried_on_errors(mocker: MockerFixture):
+    clock = FakeClock()
+    policy = make_policy(clock, retry_times=2)
+
+    send = mocker.Mock(return_value=response(mocker, 503))
+    assert policy.call(send, idempotent=False).status_code == 503
+    assert send.call_count == 1
+
+    send = mocker.Mock(
+        side_effect=[
+            httpx.ConnectError("down"),
+            response(mocker, 503),
+            response(mocker, 503),
+        ]
+    )
+    assert policy.call(send, idempotent=True).status_code == 503
+    assert send.call_count == 3
+    assert len(clock.slept) == 2
+
+    with pytest.raises(httpx.ConnectError):
+        policy.call(
+            mocker.Mock(side_effect=httpx.ConnectError("down")), idempotent=False
+        )
+
+
+def test_circuit_opens_after_failures_in_a_row(mocker: MockerFixture):
+    clock = FakeClock()
+    policy = make_policy(clock, failure_threshold=2, retry_times=0)
+    failing = mocker.Mock(return_value=response(mocker, 500))
+
+    policy.call(failing, idempotent=True)
+    policy.call(failing, idempotent=True)
+    with pytest.raises(CircuitOpenError):
+        policy.call(failing, idempotent=True)
+    assert failing.call_count == 2
+
+    clock.now += 30
+    assert policy.call(mocker.Mock(return_value=response(mocker, 200)), idempotent=True)
+    assert not policy.breaker.is_open
@@ -0,0 +1,28 @@
+import os
+
+from scrapy import Request, Spider
+from scrapy.utils.test import get_crawler
+
+from hook_crawlers.product_crawler.scheduler import MemoryBoundedScheduler
+
+
+def test_memory_queue_overflows_to_disk():
+    crawler = get_crawler(Spider, {"SCHEDULER_MEMORY_QUEUE_LIMIT": 2})
+    spider = Spider.from_crawler(crawler, name="test")
+    scheduler = MemoryBoundedScheduler.from_crawler(crawler)
+    scheduler.open(spider)
+
+    for n in range(5):
+        assert scheduler.enqueue_request(Request(f"https://example.com/{n}"))
+    assert not scheduler.enqueue_request(Request("https://example.com/0"))
+    assert len(scheduler.mqs) == 2
+    assert len(scheduler.dqs) == 3
+
+    urls = set()
+    while scheduler.has_pending_requests():
+        urls.add(scheduler.next_request().url)
+    assert len(urls) == 5
+
+    tmp_jobdir = scheduler._tmp_jobdir
+    scheduler.close("finished")
+    assert not os.path.exists(tmp_jobdir)
@@ -0,0 +1,52 @@
+import pytest
+from scrapy.settings import Settings
+
+from hook_crawlers.product_crawler.services import (
+    get_api_client,
+    get_general_factory,
+    get_product_repository,
+    get_release_repository,
+    get_url_locks,
+)
+
+
+def test_general_factory_is_built_once():
+    assert get_general_factory() is get_general_factory()
+
+
+def test_repositories_share_api_client():
+    settings = Settings({"HOOK_API_HOST": "http://hook", "HOOK_API_ACCESS_TOKEN": "t"})
+    product_repo = get_product_repository(settings)
+    release_repo = get_release_repository(settings)
+
+    assert product_repo is get_product_repository(settings)
+    assert product_repo.api_client is release_repo.api_client
+    assert product_repo.api_client is get_api_client(settings)
+
+
+def test_repositories_share_api_call_policy():
+    settings = Settings({"HOOK_API_HOST": "http://hook", "HOOK_API_RATE_LIMIT": 5})
+    product_repo = get_product_repository(settings)
+    release_repo = get_release_repository(settings)
+
+    assert product_repo.call_policy is release_repo.call_policy
+    assert product_repo.call_policy.bucket.rate == 5
+
+
+def test_url_locks_are_shared_by_the_crawlers():
+    assert get_url_locks() is get_url_locks()
+
+
+def test_a_missing_openapi_spec_is_an_error(tmp_path):
+    settings = Settings(
+        {
+            "HOOK_API_HOST": "http://hook",
+            "HOOK_API_OPENAPI_PATH": str(tmp_path / "openapi.json"),
+        }
+    )
+    with pytest.raises(FileNotFoundError):
+        get_product_repository(settings)
+    assert (
+        get_product_repository(Settings({"HOOK_API_HOST": "http://hook"})).schemas
+        is None
+    )
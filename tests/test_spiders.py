@@ -1,17 +1,27 @@
 import re
 from datetime import date
+from urllib.parse import quote
 
 import pytest
 import requests as rq
 from figure_parser import ProductBase
 from pytest_mock import MockerFixture
+from scrapy import Request
+from scrapy.core.scheduler import Scheduler
 from scrapy.http import HtmlResponse
+from scrapy.utils.test import get_crawler
+from twisted.internet.defer import Deferred, maybeDeferred
 
+from hook_crawlers.product_crawler.fingerprinter import CanonicalUrlRequestFingerprinter
+from hook_crawlers.product_crawler.items import ReleaseDelay
 from hook_crawlers.product_crawler.spiders import (
+    ALTER_LISTING,
+    NATIVE_LISTING,
     AlterProductSpider,
     AmakuniProductSpider,
     GSCProductSpider,
     NativeProductSpider,
+    merge_translation,
 )
 
 
@@ -51,6 +61,13 @@ def make_scrapy_response(url):
     return scrapy_response
 
 
+def fired_result(deferred: Deferred):
+    results = []
+    deferred.addCallback(results.append)
+    [result] = results
+    return result
+
+
 class TestGscSpider:
     @pytest.fixture
     def spider(self):
@@ -82,6 +99,93 @@ class TestGscSpider:
         [product, *_] = result
         assert type(product) is ProductBase
 
+    def test_start_request_for_many_categories(self):
+        spider = GSCProductSpider(
+            begin_year=2021, end_year=2022, lang="ja,en", category="scale,figma"
+        )
+        assert [r.url for r in spider.start_requests()] == [
+            "https://www.goodsmile.info/ja/products/category/scale/announced/2021",
+            "https://www.goodsmile.info/ja/products/category/scale/announced/2022",
+            "https://www.goodsmile.info/ja/products/category/figma/announced/2021",
+            "https://www.goodsmile.info/ja/products/category/figma/announced/2022",
+        ]
+
+    def test_merge_product_pages_in_every_language(
+        self, mocker: MockerFixture, product_base_factory
+    ):
+        spider = GSCProductSpider(lang="ja,en,zh")
+        product = product_base_factory.build(
+            url="https://www.goodsmile.info/ja/product/11942/a.html", jan=None
+        )
+        translation = product_base_factory.build(jan="4580000000001")
+        mocker.patch(
+            "hook_crawlers.product_crawler.spiders.create_product",
+            side_effect=[product, translation, ValueError("Unexpected layout")],
+        )
+
+        def response(url: str, meta=None):
+            return HtmlResponse(
+                url=url, body=b"<html></html>", request=Request(url, meta=meta)
+            )
+
+        listing_meta = {
+            "listing_url": product.url,
+            "listing_checksum": "checksum",
+        }
+        [en_request] = spider.parse_product(response(product.url, listing_meta))
+        assert en_request.url == "https://www.goodsmile.info/en/product/11942"
+        assert en_request.meta.items() >= listing_meta.items()
+
+        [zh_request] = spider.parse_translation(
+            response(en_request.url, en_request.meta), **en_request.cb_kwargs
+        )
+        assert zh_request.url == "https://www.goodsmile.info/zh/product/11942"
+        # The merged item is scraped with the last response, it records the listing.
+        assert zh_request.meta.items() >= listing_meta.items()
+
+        [merged] = spider.parse_translation(
+            response(zh_request.url), **zh_request.cb_kwargs
+        )
+        assert merged is product
+        assert merged.jan == "4580000000001"
+        assert merged.name != translation.name
+
+    def test_translation_to_the_default_language_is_scheduled(
+        self, mocker: MockerFixture, product_base_factory
+    ):
+        crawler = get_crawler(
+            GSCProductSpider,
+            {"REQUEST_FINGERPRINTER_CLASS": CanonicalUrlRequestFingerprinter},
+        )
+        spider = GSCProductSpider.from_crawler(crawler, lang="en,ja")
+        scheduler = Scheduler.from_crawler(crawler)
+        scheduler.open(spider)
+        url = "https://www.goodsmile.info/en/product/11942/a.html"
+        mocker.patch(
+            "hook_crawlers.product_crawler.spiders.create_product",
+            return_value=product_base_factory.build(url=url),
+        )
+        request = Request(url, callback=spider.parse_product)
+        assert scheduler.enqueue_request(request)
+
+        [ja_request] = spider.parse_product(
+            HtmlResponse(url=url, body=b"<html></html>", request=request)
+        )
+        assert ja_request.url == "https://www.goodsmile.info/ja/product/11942"
+        assert scheduler.enqueue_request(ja_request)
+        scheduler.close("finished")
+
+
+def test_merge_translation(product_base_factory):
+    product = product_base_factory.build(jan=None, sculptors=[])
+    translation = product_base_factory.build()
+    name = product.name
+
+    merge_translation(product, translation)
+    assert product.jan == translation.jan
+    assert product.sculptors == translation.sculptors
+    assert product.name == name
+
 
 class TestGscDelaySpider:
     def test_year_range_regex_transformation(self):
@@ -99,6 +203,10 @@ class TestGscDelaySpider:
             "fetch_gsc_products_by_official_id",
             new_callable=lambda: lambda x: set(x),
         )
+        mocker.patch(
+            "hook_crawlers.product_crawler.spiders.gsc_post.deferToThread",
+            maybeDeferred,
+        )
         # =========mocker setting=========
 
         scrapy_response = make_scrapy_response(
@@ -108,15 +216,76 @@ class TestGscDelaySpider:
             "%E5%BB%B6%E6%9C%9F%E9%80%A3%E7%B5%A1%E3%81%A8%E3%81%8A%E8%A9%AB%E3%81%B3.html"
         )
 
-        results = spider.parse_delay_post(scrapy_response)
-        results = [r for r in results]
+        results = fired_result(spider.parse_delay_post(scrapy_response))
         assert len(results)
         pattern = r"https://.*\.?goodsmile.info/ja/product/.*"
         for r in results:
-            assert "jan" in r.cb_kwargs, "Should call callback with `jan` argument."
+            if isinstance(r, ReleaseDelay):
+                assert r.jan and r.release_date
+            else:
+                assert "jan" in r.cb_kwargs, "Should call callback with `jan` argument."
             assert re.match(pattern, r.url), "Not a valid url."
             assert type(r.url) is str
 
+    def test_parse_new_release_date_from_post(self, mocker: MockerFixture):
+        from hook_crawlers.product_crawler.spiders.gsc_post import GscDelayPostSpider
+
+        spider = GscDelayPostSpider(begin_year=2022, end_year=2022)
+        mocker.patch.object(
+            spider,
+            "fetch_gsc_products_by_official_id",
+            new_callable=lambda: lambda x: set(x),
+        )
+        mocker.patch(
+            "hook_crawlers.product_crawler.spiders.gsc_post.deferToThread",
+            maybeDeferred,
+        )
+        body = """
+        <html><body><div class="content">
+        <p>発売月変更のお知らせ<br>
+        「<a href="https://www.goodsmile.info/ja/product/1234/a.html">A</a>」JAN：4580000000001<br>
+        2021年1月 → 2021年3月<br>
+        「<a href="https://www.goodsmile.info/ja/product/5678/b.html">B</a>」JAN：4580000000002<br>
+        2021年1月より発売延期<br>
+        「<a href="https://www.goodsmile.info/ja/product/9012/c.html">C</a>」JAN：4580000000003<br>
+        2021年1月 → 2021年7月～8月
+        </p></div></body></html>
+        """
+        response = HtmlResponse(
+            url="https://www.goodsmile.info/ja/post/1/a.html",
+            body=body.encode(),
+            encoding="utf-8",
+        )
+
+        results = {r.url: r for r in fired_result(spider.parse_delay_post(response))}
+        delay = results["https://www.goodsmile.info/ja/product/1234/a.html"]
+        assert delay == ReleaseDelay(
+            url="https://www.goodsmile.info/ja/product/1234/a.html",
+            jan="4580000000001",
+            release_date=date(2021, 3, 1),
+        )
+        request = results["https://www.goodsmile.info/ja/product/5678/b.html"]
+        assert request.cb_kwargs == {"jan": "4580000000002"}
+        # A range of months doesn't tell the new release month.
+        request = results["https://www.goodsmile.info/ja/product/9012/c.html"]
+        assert request.cb_kwargs == {"jan": "4580000000003"}
+
+    def test_fetch_products_by_official_id(self, tmp_path, mocker: MockerFixture):
+        from hook_crawlers.product_crawler.spiders.gsc_post import GscDelayPostSpider
+
+        crawler = get_crawler(GscDelayPostSpider, {"CRAWLER_STATE_DIR": str(tmp_path)})
+        spider = GscDelayPostSpider.from_crawler(crawler)
+        spider.official_id_index.add("https://www.goodsmile.info/ja/product/1/a.html")
+        lookup = mocker.patch.object(spider, "_is_product_in_db", return_value=False)
+
+        products = {
+            "1": "https://www.goodsmile.info/ja/product/1/a.html",
+            "2": "https://www.goodsmile.info/ja/product/2/b.html",
+        }
+        assert spider.fetch_gsc_products_by_official_id(products) == {"1"}
+        assert spider.fetch_gsc_products_by_official_id(products) == {"1"}
+        lookup.assert_called_once_with(products["2"])
+
     def test_product_parsing(self):
         from hook_crawlers.product_crawler.spiders.gsc_post import GscDelayPostSpider
 
@@ -130,6 +299,46 @@ class TestGscDelaySpider:
         assert product.jan == jan, "JAN didn't match with input value."
 
 
+class TestGscDelayPostWatchSpider:
+    INDEX_URL = "https://www.goodsmile.info/ja/posts/category/information/date/"
+
+    def make_index(self, *post_ids, status=200, headers=None):
+        links = "".join(
+            f'<a href="/ja/post/{post_id}/{quote("発売延期")}.html">post</a>'
+            for post_id in post_ids
+        )
+        return HtmlResponse(
+            url=self.INDEX_URL,
+            status=status,
+            headers=headers or {},
+            body=f"<html><body>{links}</body></html>".encode(),
+        )
+
+    def test_polling_only_follows_new_posts(self, tmp_path):
+        from hook_crawlers.product_crawler.spiders.gsc_post import (
+            GscDelayPostWatchSpider,
+        )
+
+        crawler = get_crawler(
+            GscDelayPostWatchSpider, {"CRAWLER_STATE_DIR": str(tmp_path)}
+        )
+        spider = GscDelayPostWatchSpider.from_crawler(crawler)
+        crawler.stats.open_spider(spider)
+
+        first_poll = self.make_index(1, 2, headers={"ETag": '"v1"'})
+        assert list(spider.parse_index(first_poll)) == []
+
+        request = spider.index_request()
+        assert request.headers["If-None-Match"] == b'"v1"'
+        not_modified = self.make_index(status=304)
+        assert list(spider.parse_index(not_modified)) == []
+
+        [post_request] = spider.parse_index(self.make_index(3, 1, 2))
+        assert "/ja/post/3/" in post_request.url
+        assert post_request.callback == spider.parse_delay_post
+        assert list(spider.parse_index(self.make_index(3, 1, 2))) == []
+
+
 class TestAlterSpider:
     @pytest.fixture
     def spider(self):
@@ -161,6 +370,56 @@ class TestAlterSpider:
         [product, *_] = result
         assert type(product) is ProductBase
 
+    def test_resume_from_checkpoint(self, tmp_path, product_base_factory):
+        settings = {
+            "CRAWL_CHECKPOINTS_ENABLED": True,
+            "CRAWLER_STATE_DIR": str(tmp_path),
+        }
+        spider = AlterProductSpider.from_crawler(
+            get_crawler(AlterProductSpider, settings), begin_year=2021, end_year=2022
+        )
+        [listing_2021, listing_2022] = spider.start_requests()
+        listing = HtmlResponse(
+            url=listing_2021.url,
+            body=b"""<html><body>
+            <figure><a href="/products/1/">one</a></figure>
+            <figure><a href="/products/2/">two</a></figure>
+            </body></html>""",
+            request=listing_2021,
+        )
+        [first, second] = spider.product_requests(listing, ALTER_LISTING)
+
+        spider.checkpoint_item(
+            product_base_factory.build(url=first.url), response=None, spider=spider
+        )
+        assert spider.checkpoint_job == "alter_product?begin_year=2021&end_year=2022"
+        assert not spider.checkpoint.is_unit_done(
+            spider.checkpoint_job, listing_2021.url
+        )
+        spider.close_checkpoint(spider, "shutdown")
+
+        restarted = AlterProductSpider.from_crawler(
+            get_crawler(AlterProductSpider, settings), begin_year=2021, end_year=2022
+        )
+        [listing_2021, _] = restarted.start_requests()
+        listing = listing.replace(request=listing_2021)
+        assert [r.url for r in restarted.product_requests(listing, ALTER_LISTING)] == [
+            second.url
+        ]
+
+        restarted.checkpoint_item(
+            product_base_factory.build(url=second.url), response=None, spider=restarted
+        )
+        assert [r.url for r in restarted.start_requests()] == [listing_2022.url]
+        # Crawls of other years don't resume from this one.
+        other_years = AlterProductSpider.from_crawler(
+            get_crawler(AlterProductSpider, settings), begin_year=2021, end_year=2021
+        )
+        assert [r.url for r in other_years.start_requests()] == [listing_2021.url]
+
+        restarted.close_checkpoint(restarted, "finished")
+        assert restarted.checkpoint.progress(restarted.checkpoint_job) == (0, 0)
+
 
 class TestNativeSpider:
     @pytest.fixture
@@ -218,6 +477,59 @@ class TestNativeSpider:
         for r in results:
             assert re.match(product_pattern, r.url)
 
+    def test_full_mode_skips_unchanged_products(self, tmp_path):
+        crawler = get_crawler(
+            NativeProductSpider,
+            {
+                "LISTING_CHANGE_DETECTION_ENABLED": True,
+                "LISTING_RECRAWL_DAYS": 7,
+                "CRAWLER_STATE_DIR": str(tmp_path),
+            },
+        )
+        spider = NativeProductSpider.from_crawler(crawler)
+        crawler.stats.open_spider(spider)
+        response = HtmlResponse(
+            url="https://www.native-web.jp/creators/page/1/",
+            body=b'<html><body><section><a href="/creators/1/">one</a></section>'
+            b'<section><a href="/creators/2/">two</a></section></body></html>',
+        )
+        spider.listing_store.record(
+            "https://www.native-web.jp/creators/1/",
+            NATIVE_LISTING.extract_summaries(response)[
+                "https://www.native-web.jp/creators/1/"
+            ],
+        )
+
+        [request] = spider.parse_product_urls(response)
+        assert request.url == "https://www.native-web.jp/creators/2/"
+        assert crawler.stats.get_value("listing/unchanged_skipped") == 1
+
+    def test_incremental_stops_after_known_pages(self, tmp_path):
+        crawler = get_crawler(
+            NativeProductSpider,
+            {
+                "LISTING_CHANGE_DETECTION_ENABLED": True,
+                "LISTING_RECRAWL_DAYS": 7,
+                "CRAWLER_STATE_DIR": str(tmp_path),
+            },
+        )
+        spider = NativeProductSpider.from_crawler(
+            crawler, incremental="true", stop_after_known_pages=1, end_page=5
+        )
+        spider.max_page = 5
+        response = HtmlResponse(
+            url="https://www.native-web.jp/creators/page/1/",
+            body=b'<html><body><section><a href="/creators/1/">one</a></section></body></html>',
+        )
+
+        [product_request, next_page] = spider.parse_product_urls(response, page_num=1)
+        assert product_request.url == "https://www.native-web.jp/creators/1/"
+        assert next_page.cb_kwargs == {"page_num": 2}
+
+        for url, checksum in NATIVE_LISTING.extract_summaries(response).items():
+            spider.listing_store.record(url, checksum)
+        assert list(spider.parse_product_urls(response, page_num=2)) == []
+
 
 class TestAmakuniSpider:
     @pytest.fixture
@@ -245,3 +557,63 @@ class TestAmakuniSpider:
         result = spider.parse_product(resp)
         product, *_ = result
         assert isinstance(product, ProductBase)
+
+
+class TestRetryFailedSpider:
+    def test_retry_with_the_failed_callback(self, tmp_path, mocker: MockerFixture):
+        from hook_crawlers.product_crawler.services import get_quarantine
+        from hook_crawlers.product_crawler.spiders.retry_failed import RetryFailedSpider
+
+        settings = {
+            "CRAWLER_STATE_DIR": str(tmp_path),
+            "SPIDER_MODULES": ["hook_crawlers.product_crawler.spiders"],
+        }
+        quarantine = get_quarantine(get_crawler(settings_dict=settings).settings)
+        url = "https://www.goodsmile.info/ja/product/1/a.html"
+        quarantine.add(
+            url,
+            "parse",
+            "gsc_delay_post",
+            "error",
+            callback="parse_product",
+            cb_kwargs={"jan": "4580000000001"},
+        )
+        quarantine.add(
+            "https://www.native-web.jp/creators/2/", "save", "native_product", "error"
+        )
+
+        crawler = get_crawler(RetryFailedSpider, settings)
+        spider = RetryFailedSpider.from_crawler(crawler, spider="gsc_delay_post")
+        crawler.stats.open_spider(spider)
+        [request] = spider.start_requests()
+        assert request.url == url
+        assert request.cookies == {"age_verification_ok": "true"}
+
+        delegate = spider.delegate("gsc_delay_post")
+        product = mocker.Mock()
+        parse_product = mocker.patch.object(
+            delegate, "parse_product", return_value=iter([product])
+        )
+        response = HtmlResponse(url, body=b"<html></html>", request=request)
+        assert list(spider.parse_failed(response, **request.cb_kwargs)) == [product]
+        parse_product.assert_called_once_with(response, jan="4580000000001")
+
+        assert [entry.url for entry in quarantine.entries()] == [
+            "https://www.native-web.jp/creators/2/"
+        ]
+        assert spider.failure_origin(response) == (
+            "gsc_delay_post",
+            "parse_product",
+            {"jan": "4580000000001"},
+        )
+
+        # A request scheduled by the retried callback is quarantined as the delegate's.
+        follow_up = Request(
+            url, callback=delegate.parse_delay_post, cb_kwargs={"jan": "4580000000002"}
+        )
+        follow_up_response = HtmlResponse(url, body=b"<html></html>", request=follow_up)
+        assert spider.failure_origin(follow_up_response) == (
+            "gsc_delay_post",
+            "parse_delay_post",
+            {"jan": "4580000000002"},
+        )
@@ -0,0 +1,65 @@
+import os
+import socket
+
+import pytest
+
+from hook_crawlers.product_crawler.warm_pool import (
+    is_trusted_peer,
+    make_private_dir,
+    recv_exit_code,
+    recv_job,
+    send_exit_code,
+    send_job,
+)
+from hook_crawlers.product_crawler.warm_pool.runner import connect_pool
+
+
+def test_job_handover():
+    runner_sock, worker_sock = socket.socketpair()
+    read_fd, write_fd = os.pipe()
+    job = {"argv": ["runner", "crawl", "gsc_product"], "env": {"A": "1"}, "cwd": "/"}
+
+    send_job(runner_sock, job, fds=(read_fd, write_fd, write_fd))
+    received_job, fds = recv_job(worker_sock)
+    assert received_job == job
+    assert len(fds) == 3
+
+    os.write(fds[1], b"log")
+    assert os.read(read_fd, 3) == b"log"
+
+    send_exit_code(worker_sock, 2)
+    assert recv_exit_code(runner_sock) == 2
+
+    for fd in (read_fd, write_fd, *fds):
+        os.close(fd)
+    runner_sock.close()
+    worker_sock.close()
+
+
+def test_make_private_dir(tmp_path):
+    path = tmp_path / "pool"
+    make_private_dir(str(path))
+    assert path.stat().st_mode & 0o777 == 0o700
+
+    path.chmod(0o755)
+    with pytest.raises(PermissionError):
+        make_private_dir(str(path))
+
+
+def test_runner_only_connects_through_a_private_dir(tmp_path):
+    path = tmp_path / "pool"
+    make_private_dir(str(path))
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(str(path / "warm-pool.sock"))
+    listener.listen(1)
+
+    sock = connect_pool(str(path / "warm-pool.sock"))
+    assert sock is not None
+    conn, _ = listener.accept()
+    assert is_trusted_peer(conn) and is_trusted_peer(sock)
+    for s in (sock, conn):
+        s.close()
+
+    path.chmod(0o777)
+    assert connect_pool(str(path / "warm-pool.sock")) is None
+    listener.close()